@@ -1,69 +1,86 @@
-from multiprocessing import Manager
 import os
-import time
 import json
 
 from src.wikidataDumpReader import WikidataDumpReader
-from src.wikidataItemDB import WikidataItem
+from src.wikidataEntityFields import clean_label_description
+from src.wikidataItemDB import engine
+from src.sqliteWriter import SQLiteWriter
 
 FILEPATH = os.getenv("FILEPATH", '../data/Wikidata/latest-all.json.bz2')
 PUSH_SIZE = int(os.getenv("PUSH_SIZE", 20000))
 QUEUE_SIZE = int(os.getenv("QUEUE_SIZE", 15000))
 NUM_PROCESSES = int(os.getenv("NUM_PROCESSES", 4))
 SKIPLINES = int(os.getenv("SKIPLINES", 0))
+READ_BATCH_SIZE = int(os.getenv("READ_BATCH_SIZE", 100))
+DECOMPRESS_PROCESSES = int(os.getenv("DECOMPRESS_PROCESSES", 0))
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", None)
+START_OFFSET = os.getenv("START_OFFSET", None)
+START_OFFSET = int(START_OFFSET) if START_OFFSET else None
+END_OFFSET = os.getenv("END_OFFSET", None)
+END_OFFSET = int(END_OFFSET) if END_OFFSET else None
 LANGUAGE = os.getenv("LANGUAGE", 'en')
+ROWS_PER_TRANSACTION = int(os.getenv("ROWS_PER_TRANSACTION", 200000))
+WRITER_QUEUE_SIZE = int(os.getenv("WRITER_QUEUE_SIZE", 16))
 
+# Same statement as WikidataItem.add_bulk_items, with positional rows
+INSERT_SQL = """
+    INSERT INTO item (id, labels, descriptions, in_wikipedia)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(id) DO NOTHING
+"""
 
-def save_items_to_sqlite(item, data_batch, sqlitDBlock):
-    if (item is not None):
-        labels = WikidataItem.clean_label_description(item['labels'])
-        descriptions = WikidataItem.clean_label_description(
-            item['descriptions']
-        )
+
+def save_items_to_sqlite(items, writer):
+    """Processes a batch of items from the dump file and sends the rows to the SQLite writer process.
+
+    Args:
+        items (list[dict]): Items as JSON extracted from the dump file by one consumer process.
+        writer (SQLiteWriter): The single process writing to the SQLite database.
+    """
+    rows = []
+    for item in items:
+        # Lexemes have lemmas instead of labels and descriptions
+        labels = clean_label_description(item.get('labels', {}))
+        descriptions = clean_label_description(item.get('descriptions', {}))
         labels = json.dumps(labels, separators=(',', ':'))
         descriptions = json.dumps(descriptions, separators=(',', ':'))
-        in_wikipedia = WikidataItem.is_in_wikipedia(item)
-        data_batch.append({
-            'id': item['id'],
-            'labels': labels,
-            'descriptions': descriptions,
-            'in_wikipedia': in_wikipedia,
-        })
+        rows.append((item['id'], labels, descriptions, item['in_wikipedia']))
 
-        with sqlitDBlock:
-            if len(data_batch) > PUSH_SIZE:
-                worked = WikidataItem.add_bulk_items(list(
-                    data_batch[:PUSH_SIZE]
-                ))
-                if worked:
-                    del data_batch[:PUSH_SIZE]
+    writer.put(rows)
 
 
 if __name__ == "__main__":
-    multiprocess_manager = Manager()
-    sqlitDBlock = multiprocess_manager.Lock()
-    data_batch = multiprocess_manager.list()
+    writer = SQLiteWriter(
+        engine,
+        INSERT_SQL,
+        rows_per_transaction=ROWS_PER_TRANSACTION,
+        queue_size=WRITER_QUEUE_SIZE
+    )
+    writer.start()
 
     wikidata = WikidataDumpReader(
         FILEPATH,
         num_processes=NUM_PROCESSES,
         queue_size=QUEUE_SIZE,
-        skiplines=SKIPLINES
+        skiplines=SKIPLINES,
+        batch_size=READ_BATCH_SIZE,
+        decompress_processes=DECOMPRESS_PROCESSES,
+        checkpoint_path=CHECKPOINT_PATH,
+        keys=['id', 'labels', 'descriptions'],
+        # Sitelinks come after the claims, checking them on the raw line lets the line be cut before the aliases
+        line_fields={'in_wikipedia': WikidataDumpReader.has_wikipedia_sitelink}
     )
 
-    wikidata.run(
-        lambda item: save_items_to_sqlite(
-            item,
-            data_batch,
-            sqlitDBlock
-        ),
-        max_iterations=None,
-        verbose=True
-    )
-
-    while len(data_batch) > 0:
-        worked = WikidataItem.add_bulk_items(list(data_batch))
-        if worked:
-            del data_batch[:PUSH_SIZE]
-        else:
-            time.sleep(1)
+    # The writer is stopped even if the reader fails, after committing the
+    # rows it received (close() raises if the writer itself failed)
+    try:
+        wikidata.run_batched(
+            lambda items: save_items_to_sqlite(items, writer),
+            batch_size=PUSH_SIZE,
+            max_iterations=None,
+            verbose=True,
+            start_offset=START_OFFSET,
+            end_offset=END_OFFSET
+        )
+    finally:
+        writer.close()
@@ -1,75 +1,98 @@
-from multiprocessing import Manager
 import os
-import time
 
 from src.wikidataDumpReader import WikidataDumpReader
 from src.wikidataLangDB import create_wikidatalang_db
+from src.sqliteWriter import SQLiteWriter
 
 FILEPATH = os.getenv("FILEPATH", '../data/Wikidata/latest-all.json.bz2')
 PUSH_SIZE = int(os.getenv("PUSH_SIZE", 2000))
 QUEUE_SIZE = int(os.getenv("QUEUE_SIZE", 1500))
 NUM_PROCESSES = int(os.getenv("NUM_PROCESSES", 8))
 SKIPLINES = int(os.getenv("SKIPLINES", 0))
+READ_BATCH_SIZE = int(os.getenv("READ_BATCH_SIZE", 100))
+DECOMPRESS_PROCESSES = int(os.getenv("DECOMPRESS_PROCESSES", 0))
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", None)
+START_OFFSET = os.getenv("START_OFFSET", None)
+START_OFFSET = int(START_OFFSET) if START_OFFSET else None
+END_OFFSET = os.getenv("END_OFFSET", None)
+END_OFFSET = int(END_OFFSET) if END_OFFSET else None
 LANGUAGE = os.getenv("LANGUAGE", 'en')
 
+ROWS_PER_TRANSACTION = int(os.getenv("ROWS_PER_TRANSACTION", 50000))
+WRITER_QUEUE_SIZE = int(os.getenv("WRITER_QUEUE_SIZE", 16))
+
 DB_PATH = os.getenv("DB_PATH", f'sqlite_{LANGUAGE}wiki.db')
+CLAIMS_STORAGE = os.getenv("CLAIMS_STORAGE", 'json')
+
+# Same statement as WikidataLang.add_bulk_entities, with positional rows
+INSERT_SQL = """
+    INSERT INTO wikidata (id, label, description, claims, aliases)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO NOTHING
+"""
 
-WikidataLang = create_wikidatalang_db(db_filname=DB_PATH)
+WikidataLang = create_wikidatalang_db(
+    db_filname=DB_PATH,
+    storage=CLAIMS_STORAGE
+)
 
-def save_entities_to_sqlite(item, data_batch, sqliteDBlock):
-    """Processes items from the dump file and batch stores them in a SQLite database.
+def save_entities_to_sqlite(items, writer):
+    """Processes a batch of items from the dump file and sends the rows to the SQLite writer process.
 
     Args:
-        item (dict): An item as JSON extracted from the dump file
-        data_batch (list): a list shared across multiple processes, that stores the processed items.
-        sqliteDBlock (Lock): a multiprocessing lock that is used when the a batch is ready to be pushed to the SQLite database.
+        items (list[dict]): Items as JSON extracted from the dump file by one consumer process.
+        writer (SQLiteWriter): The single process writing to the SQLite database.
     """
-    if item is not None:
-        # Check if the item is a valid entity
-        return
-
-    lang_in_wp = WikidataLang.is_in_wikipedia(item, language=LANGUAGE)
-    if not lang_in_wp:
-        # If the entity is not in the specified language Wikipedia, skip
-        return
+    rows = []
+    for item in items:
+        lang_in_wp = WikidataLang.is_in_wikipedia(item, language=LANGUAGE)
+        if not lang_in_wp:
+            # If the entity is not in the specified language Wikipedia, skip
+            continue
 
-    item = WikidataLang.normalise_item(item, language=LANGUAGE)
-    data_batch.append(item)
+        entity = WikidataLang.normalise_item(item, language=LANGUAGE)
+        rows.append((
+            entity['id'],
+            entity['label'],
+            entity['description'],
+            entity['claims'],
+            entity['aliases']
+        ))
 
-    with sqliteDBlock:
-        if len(data_batch) > PUSH_SIZE:
-            worked = WikidataLang.add_bulk_entities(list(
-                data_batch[:PUSH_SIZE]
-            ))
-            if worked:
-                del data_batch[:PUSH_SIZE]
+    writer.put(rows)
 
 
 if __name__ == "__main__":
-    multiprocess_manager = Manager()
-    sqliteDBlock = multiprocess_manager.Lock()
-    data_batch = multiprocess_manager.list()
+    writer = SQLiteWriter(
+        WikidataLang.get_engine(),
+        INSERT_SQL,
+        rows_per_transaction=ROWS_PER_TRANSACTION,
+        queue_size=WRITER_QUEUE_SIZE
+    )
+    writer.start()
 
     wikidata = WikidataDumpReader(
         FILEPATH,
         num_processes=NUM_PROCESSES,
         queue_size=QUEUE_SIZE,
-        skiplines=SKIPLINES
-    )
-
-    wikidata.run(
-        lambda item: save_entities_to_sqlite(
-            item,
-            data_batch,
-            sqliteDBlock
-        ),
-        max_iterations=None,
-        verbose=True
+        skiplines=SKIPLINES,
+        batch_size=READ_BATCH_SIZE,
+        decompress_processes=DECOMPRESS_PROCESSES,
+        checkpoint_path=CHECKPOINT_PATH,
+        # Skip entities without a Wikipedia sitelink in the language before parsing
+        line_filters=[f'"{LANGUAGE}wiki":']
     )
 
-    while len(data_batch) > 0:
-        worked = WikidataLang.add_bulk_entities(list(data_batch))
-        if worked:
-            del data_batch[:PUSH_SIZE]
-        else:
-            time.sleep(1)
+    # The writer is stopped even if the reader fails, after committing the
+    # rows it received (close() raises if the writer itself failed)
+    try:
+        wikidata.run_batched(
+            lambda items: save_entities_to_sqlite(items, writer),
+            batch_size=PUSH_SIZE,
+            max_iterations=None,
+            verbose=True,
+            start_offset=START_OFFSET,
+            end_offset=END_OFFSET
+        )
+    finally:
+        writer.close()
@@ -1,12 +1,12 @@
 import json
 import os
 import pickle
-import hashlib
 
 from datetime import datetime
 from tqdm import tqdm
 
 from src.wikidataLangDB import create_wikidatalang_db
+from src.wikidataTextCache import create_text_cache_db
 from src.wikidataEmbed import WikidataTextifier
 from src.wikidataRetriever import AstraDBConnect, KeywordSearchConnect
 
@@ -18,13 +18,26 @@ SAMPLE_PATH = os.getenv(
 EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 100))
 QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", 1000))
 OFFSET = int(os.getenv("OFFSET", 0))
+NUM_SHARDS = int(os.getenv("NUM_SHARDS", 1))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", 0))
 API_KEY_FILENAME = os.getenv("API_KEY", None)
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 LANGUAGE = os.getenv("LANGUAGE", 'en')
 TEXTIFIER_LANGUAGE = os.getenv("TEXTIFIER_LANGUAGE", None)
 DUMPDATE = os.getenv("DUMPDATE", '09/18/2024')
+LABEL_MAP_PATH = os.getenv("LABEL_MAP_PATH", None)
 
 DB_PATH = os.getenv("DB_PATH", f'sqlite_{LANGUAGE}wiki.db')
+CLAIMS_STORAGE = os.getenv("CLAIMS_STORAGE", 'json')
+
+# Store of the textified chunks, reused by re-runs and other collections.
+TEXT_CACHE_DB = os.getenv("TEXT_CACHE_DB", None)
+
+# Last processed entity ID, so that restarts resume right after it.
+CURSOR_PATH = os.getenv(
+    "CURSOR_PATH",
+    f"../data/Wikidata/cursor_{COLLECTION_NAME}_{LANGUAGE}_{SHARD_INDEX}of{NUM_SHARDS}.json"
+)
 
 # Run Keyword search with an elastic search database instead of a vector search.
 ELASTICSEARCH_URL = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
@@ -41,10 +54,18 @@ if not API_KEY_FILENAME:
 
 textifier = WikidataTextifier(
     language=LANGUAGE,
-    langvar_filename=TEXTIFIER_LANGUAGE
+    langvar_filename=TEXTIFIER_LANGUAGE,
+    label_map_path=LABEL_MAP_PATH
+)
+
+WikidataLang = create_wikidatalang_db(
+    db_filname=DB_PATH,
+    storage=CLAIMS_STORAGE
 )
 
-WikidataLang = create_wikidatalang_db(db_filname=DB_PATH)
+text_cache = None
+if TEXT_CACHE_DB:
+    text_cache = create_text_cache_db(db_filname=TEXT_CACHE_DB)
 
 
 if ELASTICSEARCH:
@@ -65,111 +86,186 @@ else:
     )
 
 
+def load_cursor():
+    """Returns the last processed entity ID saved in CURSOR_PATH, or None to start from the beginning.
+
+    Returns:
+        str or None: The last processed ID.
+    """
+    if not CURSOR_PATH or not os.path.exists(CURSOR_PATH):
+        return None
+    with open(CURSOR_PATH) as cursor_file:
+        return json.load(cursor_file)['last_id']
+
+
+def save_cursor(last_id):
+    """Saves the last processed entity ID to CURSOR_PATH. The file is replaced atomically so a crash never leaves it half written.
+
+    Args:
+        last_id (str): ID of the last entity pushed to the database.
+    """
+    if not CURSOR_PATH:
+        return
+    tmp_path = f"{CURSOR_PATH}.tmp"
+    with open(tmp_path, "w") as cursor_file:
+        json.dump({
+            'last_id': last_id,
+            'shard': SHARD_INDEX,
+            'num_shards': NUM_SHARDS
+        }, cursor_file)
+    os.replace(tmp_path, CURSOR_PATH)
+
+
 def get_data_generator():
-    """Returns an entity generator function and the total number of entities.
+    """Returns an entity generator function and the number of entities left to process.
 
+    Entities are processed in ID order, restricted to the ID range of the shard SHARD_INDEX out of NUM_SHARDS, and starting after the ID saved in CURSOR_PATH.
+    The first OFFSET entities are skipped in the order used before the ID order: the storage order of the database, or the order of the sample file in SAMPLE mode.
     Depending on whether SAMPLE mode is enabled, the function either:
     - Loads a sample dataset and prepares an entity generator for it.
     - Uses the full dataset and prepares an entity generator for all entities.
 
     Returns:
         tuple:
-            - function: A generator function (`get_entity(session)`) that yields entities from the database.
-            - int: The total number of entities.
+            - function: A generator function (`get_entity()`) that yields entities from the database.
+            - int: The number of entities left to process.
 
     Yields:
-        Entity: An entity object retrieved from the database.
+        LazyWikidataEntity: An entity from the database, its aliases and claims are decoded when first accessed.
     """
+    after_id, end_id = WikidataLang.get_shard_bounds(NUM_SHARDS)[SHARD_INDEX]
+    last_id = load_cursor()
+
     if SAMPLE:
         sample_ids = pickle.load(open(SAMPLE_PATH, "rb"))
         sample_ids = sample_ids[sample_ids['In Wikipedia']]
-        total_entities = len(sample_ids)
-
-        def get_entity(session):
-            sample_qids = list(sample_ids['QID'].values)[OFFSET:]
-            sample_qid_batches = [
-                sample_qids[i:i + QUERY_BATCH_SIZE]
-                for i in range(0, len(sample_qids), QUERY_BATCH_SIZE)
-            ]
-
-            # For each batch of sample QIDs, fetch the entities from the database
-            for qid_batch in sample_qid_batches:
-                entities = session.query(WikidataLang).filter(
-                        WikidataLang.id.in_(qid_batch)
-                    ).yield_per(QUERY_BATCH_SIZE)
-
+        sample_qids = sorted(list(sample_ids['QID'].values)[OFFSET:])
+        if last_id is not None:
+            sample_qids = [qid for qid in sample_qids if qid > last_id]
+
+        sample_qids = [
+            qid for qid in sample_qids
+            if ((after_id is None) or (qid > after_id))
+            and ((end_id is None) or (qid <= end_id))
+        ]
+        total_entities = len(sample_qids)
+
+        def get_entity():
+            # Fetch the sample entities from the database in batches
+            for i in range(0, len(sample_qids), QUERY_BATCH_SIZE):
+                qid_batch = sample_qids[i:i + QUERY_BATCH_SIZE]
+                entities = sorted(
+                    WikidataLang.iter_lazy_entities(ids=qid_batch),
+                    key=lambda entity: entity.id
+                )
                 for entity in entities:
                     yield entity
     else:
-        total_entities = 9203786
-
-        def get_entity(session):
-            entities = session.query(
-                WikidataLang).offset(
-                    OFFSET
-                ).yield_per(QUERY_BATCH_SIZE)
-
-            for entity in entities:
+        after_rowid = None
+        if OFFSET > 0:
+            # The skipped rows are spread over the ID order, so they are
+            # filtered out by rowid on every run, cursor or not
+            after_rowid = WikidataLang.get_rowid_at_offset(OFFSET - 1)
+            if after_rowid is None:
+                print(f"OFFSET {OFFSET} is past the last entity")
+                return (lambda: iter(())), 0
+
+        if (last_id is not None) and ((after_id is None) or (last_id > after_id)):
+            after_id = last_id
+        total_entities = WikidataLang.count_entities(after_id, end_id, after_rowid)
+
+        def get_entity():
+            for entity in WikidataLang.iter_entities_by_id(
+                after_id=after_id,
+                end_id=end_id,
+                batch_size=QUERY_BATCH_SIZE,
+                after_rowid=after_rowid
+            ):
                 yield entity
 
     return get_entity, total_entities
 
 
+def push_entities(entities):
+    """Textifies and chunks a batch of entities, and adds the chunks to the database.
+
+    Args:
+        entities (list): Entity objects retrieved from the database.
+    """
+    entity_chunks, entity_md5s = textifier.cached_chunk_texts(
+        entities,
+        [entity.content_hash() for entity in entities],
+        text_cache=text_cache,
+        tokenizer=None if ELASTICSEARCH else graph_store.tokenizer,
+        max_length=None if ELASTICSEARCH else graph_store.max_token_size
+    )
+
+    for entity, chunks, md5s in zip(entities, entity_chunks, entity_md5s):
+        for chunk_i in range(len(chunks)):
+            md5_hash = md5s[chunk_i]
+
+            metadata = {
+                "MD5": md5_hash,
+                "Label": entity.label,
+                "Description": entity.description,
+                "Aliases": entity.aliases,
+                "Date": datetime.now().isoformat(),
+                "QID": entity.id,
+                "ChunkID": chunk_i+1,
+                "Language": LANGUAGE,
+                "IsItem": ('Q' in entity.id),
+                "IsProperty": ('P' in entity.id),
+                "DumpDate": DUMPDATE
+            }
+            graph_store.add_document(
+                id=f"{entity.id}_{LANGUAGE}_{chunk_i+1}",
+                text=chunks[chunk_i],
+                metadata=metadata
+            )
+
+
 def add_items_to_db():
     """Embed each Wikidata items and push the content to the database.
     """
     get_entity, total_entities = get_data_generator()
 
-    with tqdm(total=total_entities-OFFSET) as progressbar:
-        with WikidataLang.get_session() as session:
-            entity_generator = get_entity(session)
-
-            for entity in entity_generator:
-                progressbar.update(1)
-                if ELASTICSEARCH:
-                    chunks = [textifier.entity_to_text(entity)]
-                else:
-                    chunks = textifier.chunk_text(
-                        entity,
-                        graph_store.tokenizer,
-                        max_length=graph_store.max_token_size
-                    )
-
-                for chunk_i in range(len(chunks)):
-                    md5_hash = hashlib.md5(
-                        chunks[chunk_i].encode('utf-8')
-                    ).hexdigest()
-
-                    metadata = {
-                        "MD5": md5_hash,
-                        "Label": entity.label,
-                        "Description": entity.description,
-                        "Aliases": entity.aliases,
-                        "Date": datetime.now().isoformat(),
-                        "QID": entity.id,
-                        "ChunkID": chunk_i+1,
-                        "Language": LANGUAGE,
-                        "IsItem": ('Q' in entity.id),
-                        "IsProperty": ('P' in entity.id),
-                        "DumpDate": DUMPDATE
-                    }
-                    graph_store.add_document(
-                        id=f"{entity.id}_{LANGUAGE}_{chunk_i+1}",
-                        text=chunks[chunk_i],
-                        metadata=metadata
-                    )
-
-                # tqdm is not working in docker compose.
-                # This is the alternative
-                tqdm.write(
-                    progressbar.format_meter(
-                        progressbar.n,
-                        progressbar.total,
-                        progressbar.format_dict["elapsed"]
-                    )
-                )
+    with tqdm(total=total_entities) as progressbar:
+        entity_generator = get_entity()
+
+        # Entities are chunked in batches to tokenize them together
+        entities = []
+        for entity in entity_generator:
+            entities.append(entity)
+            if len(entities) < EMBED_BATCH_SIZE:
+                continue
 
+            push_entities(entities)
+            # Documents still batched in the graph store are pushed
+            # first, so the cursor never gets ahead of the database
             graph_store.push_batch()
+            save_cursor(entities[-1].id)
+            progressbar.update(len(entities))
+            entities = []
+
+            # tqdm is not working in docker compose.
+            # This is the alternative
+            tqdm.write(
+                progressbar.format_meter(
+                    progressbar.n,
+                    progressbar.total,
+                    progressbar.format_dict["elapsed"]
+                )
+            )
+
+        if len(entities) > 0:
+            push_entities(entities)
+            progressbar.update(len(entities))
+
+        graph_store.push_batch()
+        if len(entities) > 0:
+            save_cursor(entities[-1].id)
+
+    print("Label cache:", textifier.label_cache.stats())
 
 if __name__ == "__main__":
     add_items_to_db()
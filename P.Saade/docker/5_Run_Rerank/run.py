@@ -4,7 +4,8 @@ import os
 import pickle
 
 from src.wikidataLangDB import create_wikidatalang_db
-from src.wikidataEmbed import WikidataTextifier
+from src.wikidataEmbed import WikidataTextifier, LabelCache
+from src.wikidataTextCache import create_text_cache_db
 from src.JinaAI import JinaAIReranker
 
 
@@ -14,6 +15,9 @@ RETRIEVAL_FILENAME = os.getenv("RETRIEVAL_FILENAME")
 LANGUAGE = os.getenv("LANGUAGE", 'en')
 QUERY_COL = os.getenv("QUERY_COL")
 RESTART = os.getenv("RESTART", "false").lower() == "true"
+CLAIMS_STORAGE = os.getenv("CLAIMS_STORAGE", 'json')
+TEXT_CACHE_MB = int(os.getenv("TEXT_CACHE_MB", 256))
+TEXT_CACHE_DB = os.getenv("TEXT_CACHE_DB", None)
 
 textifier = WikidataTextifier(language=LANGUAGE)
 reranker = JinaAIReranker()
@@ -23,13 +27,64 @@ pkl_fpath = f"../data/Evaluation Data/{RETRIEVAL_FILENAME}.pkl"
 with open(pkl_fpath, "rb") as pkl_file:
     eval_data = pickle.load(pkl_file)
 
-WikidataLang = create_wikidatalang_db(db_filname=f"sqlite_{LANGUAGE}wiki.db")
+WikidataLang = create_wikidatalang_db(
+    db_filname=f"sqlite_{LANGUAGE}wiki.db",
+    storage=CLAIMS_STORAGE
+)
+
+# Textified entities, shared by the queries retrieving the same QIDs
+text_cache = LabelCache(max_bytes=TEXT_CACHE_MB * 1024 * 1024)
+
+# Textified entities stored across runs
+text_store = None
+if TEXT_CACHE_DB:
+    text_store = create_text_cache_db(db_filname=TEXT_CACHE_DB)
+
+def get_entity_texts(qids, textifier):
+    """
+    Textifies the entities of the QIDs, fetching the ones missing from the cache with a single query.
+
+    Parameters:
+    - qids (list[str]): The QIDs of all the candidates of a batch of queries.
+    - textifier (WikidataTextifier): Converts the entities to text.
+
+    Returns:
+    - dict: A mapping of {qid: text}. Missing entities have an empty text.
+    """
+    texts = {}
+    to_fetch = []
+    for qid in dict.fromkeys(qids):
+        found, entity_text = text_cache.get(qid)
+        if found:
+            texts[qid] = entity_text
+        else:
+            to_fetch.append(qid)
+
+    if to_fetch:
+        entities, missing_ids = WikidataLang.get_entities(to_fetch)
+        if missing_ids:
+            print(f"{len(missing_ids)} QIDs missing from the database: {missing_ids[:10]}")
+
+        fetched = [entity for entity in entities if entity is not None]
+        chunks, _ = textifier.cached_chunk_texts(
+            fetched,
+            [entity.content_hash() for entity in fetched],
+            text_cache=text_store
+        )
+        found_texts = {
+            entity.id: entity_chunks[0]
+            for entity, entity_chunks in zip(fetched, chunks)
+        }
+
+        for qid in to_fetch:
+            entity_text = found_texts.get(qid, '')
+            text_cache.put(qid, entity_text)
+            texts[qid] = entity_text
+    return texts
 
 # Rerank the QIDs
-def rerank_qids(query, qids, reranker, textifier):
-    entities = [WikidataLang.get_entity(qid) for qid in qids]
-    texts = [textifier.entity_to_text(entity) for entity in entities]
-    scores = reranker.rank(query, texts)
+def rerank_qids(query, qids, reranker, texts):
+    scores = reranker.rank(query, [texts[qid] for qid in qids])
 
     score_zip = zip(scores, qids)
     score_zip = sorted(score_zip, key=lambda x: -x[0])
@@ -43,24 +98,29 @@ if __name__ == "__main__":
 
         row_to_process = pd.isna(eval_data['Reranked QIDs'])
         progressbar.update((~row_to_process).sum())
-        for i in range(0, row_to_process.sum()):
-            row = eval_data[row_to_process].iloc[i]
-
-            # Rerank the QIDs
-            ranked_qids = rerank_qids(
-                row[QUERY_COL],
-                row['Retrieval QIDs'],
-                reranker,
-                textifier
-            )
-
-            eval_data.loc[[row.index], 'Reranked QIDs'] = pd.Series(
-                ranked_qids
-            ).values
+        rows = eval_data[row_to_process]
+        for i in range(0, len(rows), BATCH_SIZE):
+            batch = rows.iloc[i:i+BATCH_SIZE]
+
+            # Fetch and textify the candidates of the whole batch at once
+            batch_qids = [
+                qid for qids in batch['Retrieval QIDs'] for qid in qids
+            ]
+            texts = get_entity_texts(batch_qids, textifier)
+
+            for index, row in batch.iterrows():
+                # Rerank the QIDs
+                ranked_qids = rerank_qids(
+                    row[QUERY_COL],
+                    row['Retrieval QIDs'],
+                    reranker,
+                    texts
+                )
+                eval_data.at[index, 'Reranked QIDs'] = ranked_qids
 
             # TODO: create new function to update tqdm progressbar
             # tqdm is not working in docker compose. This is the alternative
-            progressbar.update(1)
+            progressbar.update(len(batch))
             tqdm.write(
                 progressbar.format_meter(
                     progressbar.n,
@@ -68,12 +128,14 @@ if __name__ == "__main__":
                     progressbar.format_dict["elapsed"]
                 )
             )
-            if progressbar.n % 100 == 0:
-                pkl_fpath = f"../data/Evaluation Data/{RETRIEVAL_FILENAME}.pkl"
-                with open(pkl_fpath, "wb") as pkl_file:
-                    pickle.dump(eval_data, pkl_file, "wb")
+            pkl_fpath = f"../data/Evaluation Data/{RETRIEVAL_FILENAME}.pkl"
+            with open(pkl_fpath, "wb") as pkl_file:
+                pickle.dump(eval_data, pkl_file)
+
+        stats = text_cache.stats()
+        print(f"Text cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%})")
 
         # TODO: Why is this definition and open twice at the end?
         pkl_fpath = f"../data/Evaluation Data/{RETRIEVAL_FILENAME}.pkl"
         with open(pkl_fpath, "wb") as pkl_file:
-            pickle.dump(eval_data, pkl_file, "wb")
+            pickle.dump(eval_data, pkl_file)
@@ -13,6 +13,9 @@ from datasets import Dataset, load_dataset_builder
 QUEUE_SIZE = int(os.getenv("QUEUE_SIZE", 5000))
 NUM_PROCESSES = int(os.getenv("NUM_PROCESSES", 4))
 SKIPLINES = int(os.getenv("SKIPLINES", 0))
+READ_BATCH_SIZE = int(os.getenv("READ_BATCH_SIZE", 100))
+DECOMPRESS_PROCESSES = int(os.getenv("DECOMPRESS_PROCESSES", 0))
+LABEL_BATCH_SIZE = int(os.getenv("LABEL_BATCH_SIZE", 1000))
 API_KEY_FILENAME = os.getenv("API_KEY", "huggingface_api.json")
 ITERATION = int(os.getenv("ITERATION", 0))
 
@@ -21,13 +24,19 @@ with open(api_key_fpath) as f_in:
     api_key = json.load(open(f_in))['API_KEY']
 
 
-def save_to_queue(item, data_queue):
-    """Processes and puts cleaned item into the multiprocessing queue."""
-    if (item is not None) and (WikidataItem.is_in_wikipedia(item)):
-        claims = WikidataItem.add_labels_batched(
-            item['claims'],
-            query_batch=100
-        )
+def save_batch_to_queue(items, data_queue):
+    """Processes a batch of items and puts the cleaned items into the multiprocessing queue.
+
+    The labels of the IDs in the claims of the whole batch are fetched with a single query.
+    """
+    items = [
+        item for item in items
+        if (item is not None) and (WikidataItem.is_in_wikipedia(item))
+    ]
+    claims_list = WikidataItem.add_labels_batched_entities(
+        [item['claims'] for item in items]
+    )
+    for item, claims in zip(items, claims_list):
         data_queue.put({
             'id': item['id'],
             'labels': json.dumps(item['labels'], separators=(',', ':')),
@@ -41,7 +50,9 @@ def save_to_queue(item, data_queue):
         })
 
 
-def chunk_generator(filepath, num_processes=2, queue_size=5000, skip_lines=0):
+def chunk_generator(filepath, num_processes=2, queue_size=5000, skip_lines=0,
+                    read_batch_size=100, decompress_processes=0,
+                    label_batch_size=1000):
     """
     A generator function that reads a chunk file with WikidataDumpReader,
     processes each item, and yields the result. It uses a multiprocessing
@@ -56,13 +67,16 @@ def chunk_generator(filepath, num_processes=2, queue_size=5000, skip_lines=0):
         filepath,
         num_processes=num_processes,
         queue_size=queue_size,
-        skiplines=skip_lines
+        skiplines=skip_lines,
+        batch_size=read_batch_size,
+        decompress_processes=decompress_processes
     )
 
     # Define a function to feed items into the queue
     def run_reader():
-        wikidata.run(
-            lambda item: save_to_queue(item, data_queue),
+        wikidata.run_batched(
+            lambda items: save_batch_to_queue(items, data_queue),
+            batch_size=label_batch_size,
             max_iterations=None,
             verbose=True
         )
@@ -110,7 +124,10 @@ if __name__ == "__main__":
                 filepath,
                 num_processes=NUM_PROCESSES,
                 queue_size=QUEUE_SIZE,
-                skip_lines=SKIPLINES
+                skip_lines=SKIPLINES,
+                read_batch_size=READ_BATCH_SIZE,
+                decompress_processes=DECOMPRESS_PROCESSES,
+                label_batch_size=LABEL_BATCH_SIZE
             ))
 
             # Push each chunk as a separate "split" under the same dataset repo
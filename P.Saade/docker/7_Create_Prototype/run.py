@@ -1,16 +1,19 @@
 import json
 import os
-import hashlib
 import time
 
 from datasets import load_dataset
 from datetime import datetime
+from functools import partial
 from multiprocessing import Process, Queue, Manager
 from tqdm import tqdm
 from types import SimpleNamespace
 
+from src.embeddingService import EmbeddingService, split_cpu_groups
+from src.JinaAI import JinaAIEmbedder, get_inference_backend
 from src.wikidataEmbed import WikidataTextifier
 from src.wikidataRetriever import AstraDBConnect
+from src.wikidataTextCache import create_text_cache_db, content_hash
 
 MODEL = os.getenv("MODEL", "jinaapi")
 NUM_PROCESSES = int(os.getenv("NUM_PROCESSES", 4))
@@ -27,6 +30,16 @@ CHUNK_SIZES_PATH = os.getenv("CHUNK_SIZES_PATH",
                              "Wikidata/wikidata_chunk_sizes_2024-09-18.json")
 CHUNK_NUM = os.getenv("CHUNK_NUM")
 
+# Store of the textified chunks, reused by re-runs and other collections.
+TEXT_CACHE_DB = os.getenv("TEXT_CACHE_DB", None)
+
+# With MODEL=jina, the NUM_PROCESSES textifier processes share a pool of
+# EMBED_WORKERS inference workers instead of loading one model each.
+# EMBED_CPU_GROUPS sets the CPUs of each worker, e.g. "0-15;16-31" for one
+# worker per NUMA node, otherwise the CPUs are split evenly between them.
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 1))
+EMBED_CPU_GROUPS = os.getenv("EMBED_CPU_GROUPS", None)
+
 assert CHUNK_NUM is not None, (
     "Please provide `CHUNK_NUM` env var at docker run"
 )
@@ -58,32 +71,13 @@ dataset = load_dataset(
 )
 
 
-def process_items(queue, progress_bar):
-    """Worker function that processes items from the queue
-        and adds them to AstraDB.
+def push_items(items, graph_store, textifier, text_cache):
+    """Textifies and chunks a batch of dataset items, and adds the chunks to AstraDB.
+    The chunks of the items already in the text cache are not computed again.
     """
-    with open(f"../API_tokens/{DB_API_KEY_FILENAME}") as json_in:
-        datastax_token = json.load(json_in)
-
-    graph_store = AstraDBConnect(
-        datastax_token,
-        COLLECTION_NAME,
-        model=MODEL,
-        batch_size=EMBED_BATCH_SIZE,
-        cache_embeddings="wikidata_prototype"
-    )
-    textifier = WikidataTextifier(
-        language=LANGUAGE,
-        langvar_filename=TEXTIFIER_LANGUAGE
-    )
-
-    while True:
-        item = queue.get()
-        progress_bar.value += 1
-        if item is None:
-            # Exit condition for worker processes
-            break
-
+    entities = []
+    hashes = []
+    for item in items:
         item_id = item['id']
 
         item_label = textifier.get_label(
@@ -108,35 +102,85 @@ def process_items(queue, progress_bar):
         entity_obj.description = item_description
         entity_obj.aliases = item_aliases
         entity_obj.claims = json.loads(item['claims'])
+        entities.append(entity_obj)
+        hashes.append(content_hash(
+            item_id, item['labels'], item['descriptions'],
+            item['aliases'], item['claims']
+        ))
+
+    entity_chunks, entity_md5s = textifier.cached_chunk_texts(
+        entities,
+        hashes,
+        text_cache=text_cache,
+        tokenizer=graph_store.tokenizer,
+        max_length=graph_store.max_token_size
+    )
 
-        chunks = textifier.chunk_text(
-            entity_obj,
-            graph_store.tokenizer,
-            max_length=graph_store.max_token_size
-        )
-
+    for entity, chunks, md5s in zip(entities, entity_chunks, entity_md5s):
         for chunk_i, chunk in enumerate(chunks):
-            md5_hash = hashlib.md5(chunk.encode('utf-8')).hexdigest()
             metadata = {
-                "MD5": md5_hash,
-                "Label": item_label,
-                "Description": item_description,
-                "Aliases": item_aliases,
+                "MD5": md5s[chunk_i],
+                "Label": entity.label,
+                "Description": entity.description,
+                "Aliases": entity.aliases,
                 "Date": datetime.now().isoformat(),
-                "QID": item_id,
+                "QID": entity.id,
                 "ChunkID": chunk_i + 1,
                 "Language": LANGUAGE,
-                "IsItem": ('Q' in item_id),
-                "IsProperty": ('P' in item_id),
+                "IsItem": ('Q' in entity.id),
+                "IsProperty": ('P' in entity.id),
                 "DumpDate": DUMPDATE
             }
 
             graph_store.add_document(
-                id=f"{item_id}_{LANGUAGE}_{chunk_i+1}",
+                id=f"{entity.id}_{LANGUAGE}_{chunk_i+1}",
                 text=chunk,
                 metadata=metadata
             )
 
+
+def process_items(queue, progress_bar, embeddings=None):
+    """Worker function that processes items from the queue
+        and adds them to AstraDB.
+        embeddings is the client of the embedding service, if any.
+    """
+    with open(f"../API_tokens/{DB_API_KEY_FILENAME}") as json_in:
+        datastax_token = json.load(json_in)
+
+    graph_store = AstraDBConnect(
+        datastax_token,
+        COLLECTION_NAME,
+        model=MODEL,
+        batch_size=EMBED_BATCH_SIZE,
+        cache_embeddings="wikidata_prototype",
+        embeddings=embeddings
+    )
+    textifier = WikidataTextifier(
+        language=LANGUAGE,
+        langvar_filename=TEXTIFIER_LANGUAGE
+    )
+
+    text_cache = None
+    if TEXT_CACHE_DB:
+        text_cache = create_text_cache_db(db_filname=TEXT_CACHE_DB)
+
+    # Items are chunked in batches to share the tokenizer calls
+    # and the lookups in the text cache
+    batch = []
+    while True:
+        item = queue.get()
+        progress_bar.value += 1
+        if item is not None:
+            batch.append(item)
+            if len(batch) < EMBED_BATCH_SIZE:
+                continue
+
+        push_items(batch, graph_store, textifier, text_cache)
+        batch = []
+        if item is None:
+            # Exit condition for worker processes
+            break
+
     graph_store.push_all()
 
 
@@ -144,10 +188,24 @@ if __name__ == "__main__":
     queue = Queue(maxsize=QUEUE_SIZE)
     progress_bar = Manager().Value("i", 0)
 
+    service = None
+    clients = [None] * NUM_PROCESSES
+    if MODEL == "jina":
+        backend = get_inference_backend()
+        service = EmbeddingService(
+            partial(JinaAIEmbedder, embedding_dim=1024, backend=backend),
+            split_cpu_groups(EMBED_WORKERS, EMBED_CPU_GROUPS),
+            # Forked workers can only share the weights of the PyTorch CPU backends
+            share_model=(backend in ('cpu', 'int8')),
+            max_batch_size=EMBED_BATCH_SIZE
+        )
+        clients = [service.client() for _ in range(NUM_PROCESSES)]
+        service.start()
+
     with tqdm(total=total_entities) as pbar:
         processes = []
-        for _ in range(NUM_PROCESSES):
-            p = Process(target=process_items, args=(queue, progress_bar))
+        for client in clients:
+            p = Process(target=process_items, args=(queue, progress_bar, client))
             p.start()
             processes.append(p)
 
@@ -164,3 +222,6 @@ if __name__ == "__main__":
 
         for p in processes:
             p.join()
+
+    if service is not None:
+        service.stop()
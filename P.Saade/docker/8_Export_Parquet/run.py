@@ -0,0 +1,143 @@
+import glob
+import os
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from multiprocessing import Value
+
+from src.wikidataDumpReader import WikidataDumpReader
+from src.wikidataEntityFields import clean_label_description, is_in_wikipedia
+
+FILEPATH = os.getenv("FILEPATH", '../data/Wikidata/latest-all.json.bz2')
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", '../data/Wikidata/parquet')
+ROW_GROUP_SIZE = int(os.getenv("ROW_GROUP_SIZE", 50000))
+QUEUE_SIZE = int(os.getenv("QUEUE_SIZE", 15000))
+NUM_PROCESSES = int(os.getenv("NUM_PROCESSES", 4))
+SKIPLINES = int(os.getenv("SKIPLINES", 0))
+READ_BATCH_SIZE = int(os.getenv("READ_BATCH_SIZE", 100))
+DECOMPRESS_PROCESSES = int(os.getenv("DECOMPRESS_PROCESSES", 0))
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", None)
+START_OFFSET = os.getenv("START_OFFSET", None)
+START_OFFSET = int(START_OFFSET) if START_OFFSET else None
+END_OFFSET = os.getenv("END_OFFSET", None)
+END_OFFSET = int(END_OFFSET) if END_OFFSET else None
+LANGUAGES = os.getenv("LANGUAGES", 'en').split(',')
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", 3))
+
+# Flat label/description columns of the LANGUAGES are stored next to the
+# full maps, so that readers can filter on them with row group statistics.
+SCHEMA = pa.schema(
+    [
+        ('id', pa.string()),
+        ('labels', pa.map_(pa.string(), pa.string())),
+        ('descriptions', pa.map_(pa.string(), pa.string())),
+        ('sitelinks', pa.map_(pa.string(), pa.string())),
+        ('in_wikipedia', pa.bool_()),
+        ('claims', pa.binary()),
+    ]
+    + [(f'label_{lang}', pa.string()) for lang in LANGUAGES]
+    + [(f'description_{lang}', pa.string()) for lang in LANGUAGES]
+)
+
+# Parquet writer of the current consumer process, opened on its first batch
+parquet_writer = None
+
+# Number of part files opened so far, shared by the consumer processes
+part_counter = Value('i', 0)
+PART_PREFIX = f'part-{START_OFFSET or 0}-'
+
+
+def get_parquet_writer():
+    """Returns the Parquet writer of the current consumer process, creating its part file if needed.
+
+    Part files are numbered from 0 in the order the processes open them, so a re-run overwrites the files of the previous run.
+
+    Returns:
+        pq.ParquetWriter: Writer of a part file owned by this process only.
+    """
+    global parquet_writer
+    if parquet_writer is None:
+        with part_counter.get_lock():
+            part = part_counter.value
+            part_counter.value += 1
+        filename = f'{PART_PREFIX}{part}.parquet'
+        parquet_writer = pq.ParquetWriter(
+            os.path.join(OUTPUT_DIR, filename),
+            SCHEMA,
+            compression='zstd',
+            compression_level=COMPRESSION_LEVEL,
+        )
+    return parquet_writer
+
+
+def save_items_to_parquet(items):
+    """Converts a batch of items from the dump file to Arrow columns and writes them as one row group.
+
+    Args:
+        items (list[dict]): Items as JSON extracted from the dump file by one consumer process.
+    """
+    columns = {name: [] for name in SCHEMA.names}
+    for item in items:
+        labels = clean_label_description(item.get('labels', {}))
+        descriptions = clean_label_description(item.get('descriptions', {}))
+        sitelinks = {
+            site: sitelink['title']
+            for site, sitelink in item.get('sitelinks', {}).items()
+        }
+
+        columns['id'].append(item['id'])
+        columns['labels'].append(list(labels.items()))
+        columns['descriptions'].append(list(descriptions.items()))
+        columns['sitelinks'].append(list(sitelinks.items()))
+        columns['in_wikipedia'].append(is_in_wikipedia(item))
+        columns['claims'].append(orjson.dumps(item.get('claims', {})))
+        for lang in LANGUAGES:
+            columns[f'label_{lang}'].append(labels.get(lang))
+            columns[f'description_{lang}'].append(descriptions.get(lang))
+
+    table = pa.Table.from_pydict(columns, schema=SCHEMA)
+    get_parquet_writer().write_table(table, row_group_size=len(items))
+
+
+def close_parquet_writer():
+    """Writes the footer of the part file of the current consumer process."""
+    global parquet_writer
+    if parquet_writer is not None:
+        parquet_writer.close()
+        parquet_writer = None
+
+
+def remove_stale_parts():
+    """Removes the part files left in OUTPUT_DIR by a previous run of the same START_OFFSET, so that they aren't read as part of the dataset."""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    stale_paths = glob.glob(os.path.join(OUTPUT_DIR, f'{PART_PREFIX}*.parquet'))
+    for path in stale_paths:
+        os.remove(path)
+    if stale_paths:
+        print(f"Removed {len(stale_paths)} part files of a previous run from {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    remove_stale_parts()
+
+    wikidata = WikidataDumpReader(
+        FILEPATH,
+        num_processes=NUM_PROCESSES,
+        queue_size=QUEUE_SIZE,
+        skiplines=SKIPLINES,
+        batch_size=READ_BATCH_SIZE,
+        decompress_processes=DECOMPRESS_PROCESSES,
+        checkpoint_path=CHECKPOINT_PATH
+    )
+
+    wikidata.run_batched(
+        save_items_to_parquet,
+        batch_size=ROW_GROUP_SIZE,
+        max_iterations=None,
+        verbose=True,
+        start_offset=START_OFFSET,
+        end_offset=END_OFFSET,
+        finish_handler=close_parquet_writer
+    )
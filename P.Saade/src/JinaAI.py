@@ -1,19 +1,311 @@
 import json
+import os
+import time
 import requests
 import numpy as np
 import base64
 
-# import torch  # torch no long imported
-
-
+# torch, transformers and onnxruntime are imported by the backends using them
+from contextlib import nullcontext
+from types import SimpleNamespace
 from typing import List
+from src.backoff import backoff_delay
 from src.wikidataCache import create_cache_embedding_db
 
+JINA_API_URL = 'https://api.jina.ai/v1/embeddings'
+
+# Inference backends of JinaAIEmbedder and JinaAIReranker:
+# - cuda: PyTorch on GPU
+# - cpu: PyTorch on CPU, fp32
+# - int8: PyTorch on CPU, linear layers dynamically quantized to int8
+# - onnx: ONNX Runtime on CPU, with the ONNX export published with the model
+# - onnx-int8: ONNX Runtime on CPU, export dynamically quantized to int8
+INFERENCE_BACKENDS = ('cuda', 'cpu', 'int8', 'onnx', 'onnx-int8')
+
+
+def get_inference_backend(backend=None):
+    """
+    Returns the inference backend, from the INFERENCE_BACKEND environment variable if not given.
+
+    Parameters:
+    - backend (str or None): One of INFERENCE_BACKENDS. None reads INFERENCE_BACKEND (default 'cuda').
+
+    Returns:
+    - str: The backend name.
+    """
+    if backend is None:
+        backend = os.getenv("INFERENCE_BACKEND", 'cuda')
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {INFERENCE_BACKENDS}")
+    return backend
+
+
+def parse_cpus(cpus):
+    """Parses a list of CPUs such as '0-7,16-23'."""
+    cpu_set = set()
+    for part in cpus.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            cpu_set.update(range(int(first), int(last) + 1))
+        elif part.strip():
+            cpu_set.add(int(part))
+    return cpu_set
+
+
+def pin_cpu_threads(num_threads=None, cpus=None):
+    """
+    Pins the process to a set of CPUs and sets the number of PyTorch threads, so that workers sharing a node don't compete for the same cores.
+
+    Parameters:
+    - num_threads (int or None): Number of intra-op threads. None reads INFERENCE_THREADS, and defaults to the number of CPUs the process can run on.
+    - cpus (str or None): CPUs to run on, e.g. '0-7,16-23'. None reads INFERENCE_CPUS, and keeps the current affinity if unset.
+
+    Returns:
+    - int: The number of threads.
+    """
+    cpus = cpus if cpus is not None else os.getenv("INFERENCE_CPUS")
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, parse_cpus(cpus))
+
+    if num_threads is None:
+        num_threads = os.getenv("INFERENCE_THREADS")
+    if num_threads is None:
+        num_threads = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    num_threads = int(num_threads)
+
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    return num_threads
+
+
+def load_torch_model(model_class, model_name, backend):
+    """
+    Loads a Hugging Face model for a PyTorch backend.
+
+    Parameters:
+    - model_class: The transformers class (e.g. AutoModel).
+    - model_name (str): The model name on Hugging Face.
+    - backend (str): 'cuda', 'cpu' or 'int8'.
+
+    Returns:
+    - The model in evaluation mode.
+    """
+    model = model_class.from_pretrained(model_name, trust_remote_code=True)
+    if backend == 'cuda':
+        return model.to('cuda').eval()
+
+    model = model.to('cpu').eval()
+    if backend == 'int8':
+        import torch
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model
+
+
+def create_onnx_session(model_name, backend, num_threads, onnx_path=None):
+    """
+    Creates an ONNX Runtime session on CPU.
+
+    Parameters:
+    - model_name (str): The model name on Hugging Face, used to download its ONNX export (onnx/model.onnx) when onnx_path is None.
+    - backend (str): 'onnx' or 'onnx-int8'. With 'onnx-int8', the export is quantized once and saved next to it as model_int8.onnx.
+    - num_threads (int): Number of intra-op threads.
+    - onnx_path (str or None): Path to an ONNX export of the model (default=None).
+
+    Returns:
+    - onnxruntime.InferenceSession: The session.
+    """
+    import onnxruntime
+
+    if onnx_path is None:
+        from huggingface_hub import snapshot_download
+        model_dir = snapshot_download(model_name, allow_patterns=['onnx/model.onnx*'])
+        onnx_path = os.path.join(model_dir, 'onnx', 'model.onnx')
+
+    if backend == 'onnx-int8':
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantized_path = f"{os.path.splitext(onnx_path)[0]}_int8.onnx"
+        if not os.path.exists(quantized_path):
+            quantize_dynamic(
+                onnx_path,
+                quantized_path,
+                weight_type=QuantType.QInt8,
+                use_external_data_format=True
+            )
+        onnx_path = quantized_path
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = num_threads
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return onnxruntime.InferenceSession(
+        onnx_path, options, providers=['CPUExecutionProvider']
+    )
+
+
+def cosine_agreement(embeddings, reference):
+    """
+    Compares embeddings with reference embeddings of the same texts, e.g. from another backend.
+
+    Parameters:
+    - embeddings (np.ndarray): Embeddings of shape (n, d).
+    - reference (np.ndarray): Reference embeddings of shape (n, d).
+
+    Returns:
+    - np.ndarray: The cosine similarity of each pair of rows.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    reference = np.asarray(reference, dtype=np.float32)
+    dot = np.einsum('ij,ij->i', embeddings, reference)
+    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference, axis=1)
+    return dot / np.maximum(norms, 1e-12)
+
+
+class OnnxEmbeddingModel:
+    """
+    Runs the ONNX export of jina-embeddings-v3 with the same encode interface as the PyTorch model: mean pooling of the token embeddings, truncation to truncate_dim and L2 normalization.
+    """
+    def __init__(self, session, tokenizer, tasks):
+        """
+        Parameters:
+        - session (onnxruntime.InferenceSession): The session from create_onnx_session.
+        - tokenizer: The tokenizer of the model.
+        - tasks (list[str]): The LoRA adaptations of the model (config.lora_adaptations), the task_id input is the index of the task.
+        """
+        self.session = session
+        self.tokenizer = tokenizer
+        self.tasks = list(tasks)
+        self.device = SimpleNamespace(type='cpu')
+
+    def encode(self, sentences, task, truncate_dim=None, batch_size=32, max_length=8192):
+        """
+        Embeds texts.
+
+        Parameters:
+        - sentences (list[str]): The texts.
+        - task (str): The task (e.g. 'retrieval.passage').
+        - truncate_dim (int or None): Number of dimensions kept (Matryoshka embeddings).
+        - batch_size (int): Number of texts per inference call.
+        - max_length (int): Maximum number of tokens per text.
+
+        Returns:
+        - np.ndarray: The float32 embeddings, one row per text.
+        """
+        task_id = np.array(self.tasks.index(task), dtype=np.int64)
+        embeddings = []
+        for i in range(0, len(sentences), batch_size):
+            tokens = self.tokenizer(
+                sentences[i:i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+                return_tensors='np'
+            )
+            attention_mask = tokens['attention_mask'].astype(np.int64)
+            token_embeddings = self.session.run(None, {
+                'input_ids': tokens['input_ids'].astype(np.int64),
+                'attention_mask': attention_mask,
+                'task_id': task_id,
+            })[0]
+
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if truncate_dim is not None:
+                pooled = pooled[:, :truncate_dim]
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            embeddings.append(pooled.astype(np.float32))
+
+        return np.concatenate(embeddings, axis=0)
+
+
+class OnnxRerankerModel:
+    """
+    Runs the ONNX export of jina-reranker-v2 with the same compute_score interface as the PyTorch model.
+    """
+    def __init__(self, session, tokenizer):
+        """
+        Parameters:
+        - session (onnxruntime.InferenceSession): The session from create_onnx_session.
+        - tokenizer: The tokenizer of the model.
+        """
+        self.session = session
+        self.tokenizer = tokenizer
+        self.device = SimpleNamespace(type='cpu')
+
+    def compute_score(self, sentence_pairs, max_length=1024, batch_size=32):
+        """
+        Scores (query, document) pairs.
+
+        Parameters:
+        - sentence_pairs (list[list[str]]): The pairs.
+        - max_length (int): Maximum number of tokens per pair.
+        - batch_size (int): Number of pairs per inference call.
+
+        Returns:
+        - list[float]: The relevance score (sigmoid of the logit) of each pair.
+        """
+        scores = []
+        for i in range(0, len(sentence_pairs), batch_size):
+            batch = sentence_pairs[i:i + batch_size]
+            tokens = self.tokenizer(
+                [pair[0] for pair in batch],
+                [pair[1] for pair in batch],
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+                return_tensors='np'
+            )
+            logits = self.session.run(None, {
+                'input_ids': tokens['input_ids'].astype(np.int64),
+                'attention_mask': tokens['attention_mask'].astype(np.int64),
+            })[0].reshape(-1)
+            scores.extend((1 / (1 + np.exp(-logits))).tolist())
+        return scores
+
+
+def plan_token_batches(lengths, max_batch_tokens=16384, max_batch_size=128):
+    """
+    Groups texts of similar token lengths into batches under a token budget, so that little compute goes to padding.
+
+    The texts are sorted from the longest to the shortest and added to a batch while its padded size (number of texts times the longest length) stays within max_batch_tokens.
+
+    Parameters:
+    - lengths (list[int]): The number of tokens of each text.
+    - max_batch_tokens (int): Maximum padded size of a batch. A text longer than it gets a batch of its own (default=16384).
+    - max_batch_size (int): Maximum number of texts per batch (default=128).
+
+    Returns:
+    - list[list[int]]: The indices of the texts of each batch, longest batches first.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+
+    batches = []
+    batch = []
+    for i in order:
+        # Sorted by length, so the first text is the longest of the batch
+        if batch and (
+                (len(batch) + 1) * lengths[batch[0]] > max_batch_tokens
+                or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+
+    if batch:
+        batches.append(batch)
+    return batches
+
 
 class JinaAIEmbedder:
     def __init__(
             self, passage_task="retrieval.passage",
-            query_task="retrieval.query", embedding_dim=1024, cache=None):
+            query_task="retrieval.query", embedding_dim=1024, cache=None,
+            max_batch_tokens=16384, max_batch_size=128, max_length=8192,
+            backend=None, num_threads=None, cpus=None, onnx_path=None,
+            dtype=np.float32):
         """
         Initializes the JinaAIEmbedder class with the model, tokenizer,
         and task identifiers.
@@ -26,41 +318,91 @@ class JinaAIEmbedder:
         - embedding_dim (int): Dimensionality of the embeddings.
             Defaults to 1024.
         - cache (str): Name of caching table.
-        - api_key_path (str): Path to the JSON file containing the
-            Jina API key. Defaults to "../API_tokens/jina_api.json".
+        - max_batch_tokens (int): Token budget of a batch of documents,
+            counting the padding. Defaults to 16384.
+        - max_batch_size (int): Maximum number of documents per batch.
+            Defaults to 128.
+        - max_length (int): Maximum number of tokens of a document,
+            longer documents are truncated. Defaults to 8192.
+        - backend (str): Inference backend, one of INFERENCE_BACKENDS.
+            Defaults to the INFERENCE_BACKEND env var, else 'cuda'.
+        - num_threads (int): Number of inference threads of the CPU
+            backends. Defaults to INFERENCE_THREADS, else all the CPUs
+            of the process (see pin_cpu_threads).
+        - cpus (str): CPUs the CPU backends are pinned to, e.g. '0-7'.
+            Defaults to the INFERENCE_CPUS env var.
+        - onnx_path (str): Path to an ONNX export of the model for the
+            onnx backends. Defaults to the export published with the model.
+        - dtype (np.dtype): Type of the returned embeddings, np.float32 or
+            np.float16. Defaults to np.float32.
         """
-        from transformers import AutoModel, AutoTokenizer
+        from transformers import AutoModel, AutoTokenizer, AutoConfig
 
         self.passage_task = passage_task
         self.query_task = query_task
         self.embedding_dim = embedding_dim
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_length = max_length
+        self.dtype = np.dtype(dtype)
 
-        self.model = AutoModel.from_pretrained(
-            "jinaai/jina-embeddings-v3",
-            trust_remote_code=True
-        ).to('cuda')
+        # Totals of the batches of documents: texts, tokens, padded tokens and seconds
+        self.batch_stats = {'texts': 0, 'tokens': 0, 'padded_tokens': 0, 'seconds': 0.0}
+
+        self.backend = get_inference_backend(backend)
         self.tokenizer = AutoTokenizer.from_pretrained(
             "jinaai/jina-embeddings-v3",
             trust_remote_code=True
         )
 
+        if self.backend != 'cuda':
+            num_threads = pin_cpu_threads(num_threads, cpus=cpus)
+
+        if self.backend.startswith('onnx'):
+            config = AutoConfig.from_pretrained(
+                "jinaai/jina-embeddings-v3",
+                trust_remote_code=True
+            )
+            self.model = OnnxEmbeddingModel(
+                create_onnx_session(
+                    "jinaai/jina-embeddings-v3",
+                    self.backend,
+                    num_threads,
+                    onnx_path=onnx_path
+                ),
+                self.tokenizer,
+                config.lora_adaptations
+            )
+        else:
+            self.model = load_torch_model(
+                AutoModel, "jinaai/jina-embeddings-v3", self.backend
+            )
+
         self.cache = (cache is not None)
         if self.cache:
             self.cache_model = create_cache_embedding_db(table_name=cache)
 
-    def _cache_embedding(self, text: str, embedding: List[float]):
+    def _inference_context(self):
+        """
+        Returns the context in which the model runs: torch.inference_mode for the PyTorch backends, nothing for ONNX Runtime.
+        """
+        if self.backend.startswith('onnx'):
+            return nullcontext()
+        import torch
+        return torch.inference_mode()
+
+    def _cache_embedding(self, text: str, embedding: np.ndarray):
         """
         Caches the text and its embedding in the SQLite database.
 
         Parameters:
         - text (str): The text string.
-        - embedding (List[float]): The embedding vector for the text.
+        - embedding (np.ndarray): The embedding vector for the text.
         """
         if self.cache:
-            embedding = embedding.tolist()
             self.cache_model.add_cache(id=text, embedding=embedding)
 
-    def _get_cached_embedding(self, text: str) -> List[float]:
+    def _get_cached_embedding(self, text: str) -> np.ndarray:
         """
         Retrieves a previously cached embedding for the specified text.
 
@@ -68,16 +410,23 @@ class JinaAIEmbedder:
         - text (str): The text string.
 
         Returns:
-        - List[float] or None: The embedding if found in cache, otherwise None.
+        - np.ndarray or None: The embedding if found in cache, otherwise None.
         """
         if self.cache:
-            return self.cache_model.get_cache(id=text)
+            embedding = self.cache_model.get_cache(id=text)
+            if embedding is not None:
+                return embedding.astype(self.dtype, copy=False)
         return None
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
         """
         Generates embeddings for a list of document (passage) texts.
 
+        The texts are tokenized once to get their length, then embedded
+        in batches of similar lengths under the token budget
+        (see plan_token_batches). On CPU, the tokens/sec and the share
+        of padding tokens are printed.
+
         Caching is not used here by default to avoid storing
         large numbers of document embeddings.
 
@@ -85,20 +434,73 @@ class JinaAIEmbedder:
         - texts (List[str]): A list of document texts to embed.
 
         Returns:
-        - List[List[float]]: A list of embedding vectors, each corresponding
-        to a document.
+        - np.ndarray: The embedding vectors, one row per document in the
+        same order as texts.
         """
+        if len(texts) == 0:
+            return np.zeros((0, self.embedding_dim), dtype=self.dtype)
 
-        with torch.no_grad():
-            embeddings = self.model.encode(
+        lengths = [
+            len(input_ids) for input_ids in self.tokenizer(
                 texts,
-                task=self.passage_task,
-                truncate_dim=self.embedding_dim
-            )
+                truncation=True,
+                max_length=self.max_length
+            )['input_ids']
+        ]
+        batches = plan_token_batches(
+            lengths,
+            max_batch_tokens=self.max_batch_tokens,
+            max_batch_size=self.max_batch_size
+        )
 
+        start_time = time.perf_counter()
+        embeddings = None
+        with self._inference_context():
+            for batch in batches:
+                batch_embeddings = self.model.encode(
+                    [texts[i] for i in batch],
+                    task=self.passage_task,
+                    truncate_dim=self.embedding_dim,
+                    batch_size=len(batch),
+                    max_length=self.max_length
+                )
+                if embeddings is None:
+                    embeddings = np.empty(
+                        (len(texts), batch_embeddings.shape[1]),
+                        dtype=self.dtype
+                    )
+                # Back to the order of the texts
+                embeddings[batch] = batch_embeddings
+
+        self._update_batch_stats(
+            lengths, batches, time.perf_counter() - start_time
+        )
         return embeddings
 
-    def embed_query(self, text: str) -> List[float]:
+    def _update_batch_stats(self, lengths, batches, seconds):
+        """
+        Adds a call of embed_documents to batch_stats, and prints the tokens/sec and padding waste when the model runs on CPU.
+
+        Parameters:
+        - lengths (list[int]): The number of tokens of each text.
+        - batches (list[list[int]]): The batches from plan_token_batches.
+        - seconds (float): The inference time.
+        """
+        tokens = sum(lengths)
+        padded_tokens = sum(len(batch) * lengths[batch[0]] for batch in batches)
+        self.batch_stats['texts'] += len(lengths)
+        self.batch_stats['tokens'] += tokens
+        self.batch_stats['padded_tokens'] += padded_tokens
+        self.batch_stats['seconds'] += seconds
+
+        if self.model.device.type == 'cpu':
+            print(
+                f"Embedded {len(lengths)} documents in {len(batches)} batches "
+                f"| {tokens / seconds if seconds > 0 else 0.0:.0f} tokens/sec "
+                f"| padding waste {1 - tokens / padded_tokens:.1%}"
+            )
+
+    def embed_query(self, text: str) -> np.ndarray:
         """
         Generates an embedding for a single query string, optionally using
         and updating the cache.
@@ -107,31 +509,33 @@ class JinaAIEmbedder:
         - text (str): The query text to embed.
 
         Returns:
-        - List[float]: The embedding vector corresponding to the query.
+        - np.ndarray: The embedding vector corresponding to the query.
         """
         cached_embedding = self._get_cached_embedding(text)
-        if cached_embedding:
+        if cached_embedding is not None:
             return cached_embedding
 
-        with torch.no_grad():
-            embedding = self.model.encode(
+        with self._inference_context():
+            embedding = np.asarray(self.model.encode(
                 [text],
                 task=self.query_task,
                 truncate_dim=self.embedding_dim
-            )[0]
+            )[0], dtype=self.dtype)
 
-            self._cache_embedding(text, embedding)
-            return embedding
+        self._cache_embedding(text, embedding)
+        return embedding
 
 
 class JinaAIAPIEmbedder:
     def __init__(
             self, passage_task="retrieval.passage",
             query_task="retrieval.query", embedding_dim=1024,
-            api_key_path="../API_tokens/jina_api.json"):  # cache=False,
+            api_key_path="../API_tokens/jina_api.json", url=JINA_API_URL,
+            max_concurrency=4, max_batch_inputs=512, max_batch_chars=500000,
+            max_retries=8, timeout=120, dtype=np.float32):
         """
-        Initializes the JinaAIEmbedder class with the model, tokenizer,
-        and task identifiers.
+        Initializes the JinaAIAPIEmbedder with a pooled HTTP session
+        and the task identifiers.
 
         Parameters:
         - passage_task (str): Task identifier for embedding documents.
@@ -140,37 +544,80 @@ class JinaAIAPIEmbedder:
             Defaults to "retrieval.query".
         - embedding_dim (int): Dimensionality of the embeddings.
             Defaults to 1024.
-        - cache (str): Name of caching table.  # BUG: cache is unused
         - api_key_path (str): Path to the JSON file containing
             the Jina API key. Defaults to "../API_tokens/jina_api.json".
+        - url (str): URL of the embeddings endpoint. Defaults to the
+            Jina API, a local stub server can be used for testing.
+        - max_concurrency (int): Maximum number of requests in flight.
+            Defaults to 4.
+        - max_batch_inputs (int): Maximum number of texts per request,
+            larger calls are split. Defaults to 512.
+        - max_batch_chars (int): Maximum number of characters per request.
+            Defaults to 500000.
+        - max_retries (int): Number of retries of a request on rate limits
+            (429), server errors and connection errors. Defaults to 8.
+        - timeout (float): Timeout of a request in seconds. Defaults to 120.
+        - dtype (np.dtype): Type of the returned embeddings, np.float32 or
+            np.float16. Defaults to np.float32.
         """
+        from concurrent.futures import ThreadPoolExecutor
+        from requests.adapters import HTTPAdapter
+
         self.passage_task = passage_task
         self.query_task = query_task
         self.embedding_dim = embedding_dim
+        self.url = url
+        self.max_batch_inputs = max_batch_inputs
+        self.max_batch_chars = max_batch_chars
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.dtype = np.dtype(dtype)
 
         self.api_key = json.load(open(api_key_path, 'r+'))['API_KEY']
 
-    def api_embed(self, texts, task="retrieval.query"):
-        """
-        Generates an embedding for the given text using the Jina Embeddings API
+        # Keep-alive connections, one per request in flight
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.api_key}'
+        })
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
 
-        Parameters:
-        - text (str): The text to embed.
-        - task (str): The task identifier
-            (e.g., "retrieval.query" or "retrieval.passage").
+    def _split_batches(self, texts):
+        """
+        Splits texts into consecutive requests under max_batch_inputs
+        texts and max_batch_chars characters.
 
         Returns:
-        - np.ndarray: The resulting embedding vector as a NumPy array.
+        - list[tuple[int, int]]: The (start, end) positions of each request.
         """
-        url = 'https://api.jina.ai/v1/embeddings'
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {self.api_key}'
-        }
-
-        if type(texts) is str:
-            texts = [texts]
+        batches = []
+        start = 0
+        chars = 0
+        for i, text in enumerate(texts):
+            if (i > start) and (
+                    (i - start >= self.max_batch_inputs) or
+                    (chars + len(text) > self.max_batch_chars)):
+                batches.append((start, i))
+                start = i
+                chars = 0
+            chars += len(text)
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _post(self, texts, task):
+        """
+        Sends one request, retrying with exponential backoff on rate limits,
+        server errors and connection errors. The Retry-After header of the
+        response is used when present.
 
+        Returns:
+        - dict: The JSON response.
+        """
         data = {
             "model": "jina-embeddings-v3",
             "dimensions": self.embedding_dim,
@@ -180,20 +627,84 @@ class JinaAIAPIEmbedder:
             "input": texts
         }
 
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()  # Ensure request was successful
-        response_data = response.json()
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = self.session.post(
+                    self.url, json=data, timeout=self.timeout
+                )
+                if response.status_code not in (429, 500, 502, 503, 504):
+                    response.raise_for_status()
+                    return response.json()
+                error = f"Jina API error {response.status_code}"
+                retry_after = response.headers.get('Retry-After')
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise RuntimeError(f"{error} after {self.max_retries} retries")
+            delay = backoff_delay(attempt, retry_after=retry_after)
+            print(f"{error} (retrying in {delay:.1f}s)")
+            time.sleep(delay)
+
+    def _embed_batch(self, texts, task, embeddings, start):
+        """
+        Embeds texts and writes their embeddings in embeddings[start:].
+        A request rejected as too large (413) is split in two.
+        """
+        try:
+            response_data = self._post(texts, task)
+        except requests.HTTPError as e:
+            if (e.response.status_code != 413) or (len(texts) == 1):
+                raise
+            half = len(texts) // 2
+            self._embed_batch(texts[:half], task, embeddings, start)
+            self._embed_batch(texts[half:], task, embeddings, start + half)
+            return
+
+        for i, item in enumerate(response_data['data']):
+            # float32 little endian, decoded straight into its row (cast to dtype)
+            embeddings[start + item.get('index', i)] = np.frombuffer(
+                base64.b64decode(item['embedding']), dtype='<f4'
+            )
 
-        embeddings = []
-        for item in response_data['data']:
-            binary_data = base64.b64decode(item['embedding'])
-            # Ensure float32 format for compatibility across models
-            embedding_array = np.frombuffer(binary_data, dtype='<f4')
-            embeddings.append(embedding_array.tolist())
+    def api_embed(self, texts, task="retrieval.query"):
+        """
+        Generates embeddings for the given texts using the Jina Embeddings API.
+        The texts are split in requests under the input limits, sent
+        concurrently (up to max_concurrency in flight).
 
+        Parameters:
+        - texts (list[str] or str): The texts to embed.
+        - task (str): The task identifier
+            (e.g., "retrieval.query" or "retrieval.passage").
+
+        Returns:
+        - np.ndarray: The embeddings of shape (len(texts), embedding_dim),
+            of type dtype.
+        """
+        if type(texts) is str:
+            texts = [texts]
+
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=self.dtype)
+        batches = self._split_batches(texts)
+        if len(batches) == 1:
+            self._embed_batch(texts, task, embeddings, 0)
+            return embeddings
+
+        futures = [
+            self.executor.submit(
+                self._embed_batch, texts[start:end], task, embeddings, start
+            )
+            for start, end in batches
+        ]
+        for future in futures:
+            future.result()  # Raises the error of a failed request
         return embeddings
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
         """
         Generates embeddings for a list of document (passage) texts.
 
@@ -204,29 +715,25 @@ class JinaAIAPIEmbedder:
         - texts (List[str]): A list of document texts to embed.
 
         Returns:
-        - List[List[float]]: A list of embedding vectors, each corresponding
-        to a document.
+        - np.ndarray: The embedding vectors, one row per document.
         """
-        embeddings = self.api_embed(texts, task=self.passage_task)
-        return embeddings
+        return self.api_embed(texts, task=self.passage_task)
 
-    def embed_query(self, text: str) -> List[float]:
+    def embed_query(self, text: str) -> np.ndarray:
         """
-        Generates an embedding for a single query string, optionally using
-        and updating the cache.
+        Generates an embedding for a single query string.
 
         Parameters:
         - text (str): The query text to embed.
 
         Returns:
-        - List[float]: The embedding vector corresponding to the query.
+        - np.ndarray: The embedding vector corresponding to the query.
         """
-        embedding = self.api_embed([text], task=self.query_task)
-        return embedding
+        return self.api_embed([text], task=self.query_task)[0]
 
 
 class JinaAIReranker:
-    def __init__(self, max_tokens=1024):
+    def __init__(self, max_tokens=1024, backend=None, num_threads=None, cpus=None, onnx_path=None):
         """
         Initializes the JinaAIReranker with a maximum token length
         and the Jina Reranker model.
@@ -234,20 +741,46 @@ class JinaAIReranker:
         Parameters:
         - max_tokens (int): Maximum sequence length for the reranker
         (must be <= 1024).
+        - backend (str): Inference backend, one of INFERENCE_BACKENDS
+        (default: the INFERENCE_BACKEND env var, else 'cuda').
+        - num_threads (int): Number of inference threads of the CPU backends
+        (default: INFERENCE_THREADS, else all the CPUs of the process).
+        - cpus (str): CPUs the CPU backends are pinned to, e.g. '0-7'
+        (default: INFERENCE_CPUS, else the current affinity).
+        - onnx_path (str): Path to an ONNX export of the model for the onnx
+        backends (default: the export published with the model).
 
         Raises:
         - ValueError: If max_tokens is greater than 1024.
         """
-        from transformers import AutoModelForSequenceClassification
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
 
         if max_tokens > 1024:
             raise ValueError("Max token should be less than or equal to 1024")
 
         self.max_tokens = max_tokens
-        self.model = AutoModelForSequenceClassification.from_pretrained(
-            'jinaai/jina-reranker-v2-base-multilingual',
-            trust_remote_code=True
-        ).to('cuda')
+        self.backend = get_inference_backend(backend)
+        if self.backend != 'cuda':
+            num_threads = pin_cpu_threads(num_threads, cpus=cpus)
+
+        if self.backend.startswith('onnx'):
+            self.model = OnnxRerankerModel(
+                create_onnx_session(
+                    'jinaai/jina-reranker-v2-base-multilingual',
+                    self.backend,
+                    num_threads,
+                    onnx_path=onnx_path
+                ),
+                AutoTokenizer.from_pretrained(
+                    'jinaai/jina-reranker-v2-base-multilingual'
+                )
+            )
+        else:
+            self.model = load_torch_model(
+                AutoModelForSequenceClassification,
+                'jinaai/jina-reranker-v2-base-multilingual',
+                self.backend
+            )
 
     def rank(self, query: str, texts: List[str]) -> List[float]:
         """
@@ -263,7 +796,14 @@ class JinaAIReranker:
         """
         sentence_pairs = [[query, doc] for doc in texts]
 
-        with torch.no_grad():
+        if self.backend.startswith('onnx'):
+            return self.model.compute_score(
+                sentence_pairs,
+                max_length=self.max_tokens
+            )
+
+        import torch
+        with torch.inference_mode():
             return self.model.compute_score(
                 sentence_pairs,
                 max_length=self.max_tokens
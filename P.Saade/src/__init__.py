@@ -1,20 +1,25 @@
-from .wikidataDumpReader import WikidataDumpReader
-from .wikidataLangDB import create_wikidatalang_db
-from .wikidataCache import create_cache_embedding_db
-from .wikidataItemDB import WikidataItem
-from .wikidataEmbed import WikidataTextifier
-from .JinaAI import JinaAIEmbedder, JinaAIReranker, JinaAIAPIEmbedder
-from .wikidataRetriever import AstraDBConnect, KeywordSearchConnect
+import importlib
 
-__all__ = [
-    "WikidataDumpReader",
-    "create_wikidatalang_db",
-    "create_cache_embedding_db",
-    "WikidataItem",
-    "WikidataTextifier",
-    "JinaAIEmbedder",
-    "JinaAIReranker",
-    "JinaAIAPIEmbedder",
-    "AstraDBConnect",
-    "KeywordSearchConnect",
-]
\ No newline at end of file
+# Exported names and their modules, imported on first access: the database
+# modules create their SQLite files on import, which a stage importing only
+# src.wikidataDumpReader must not trigger.
+_EXPORTS = {
+    "WikidataDumpReader": ".wikidataDumpReader",
+    "create_wikidatalang_db": ".wikidataLangDB",
+    "create_cache_embedding_db": ".wikidataCache",
+    "WikidataItem": ".wikidataItemDB",
+    "WikidataTextifier": ".wikidataEmbed",
+    "JinaAIEmbedder": ".JinaAI",
+    "JinaAIReranker": ".JinaAI",
+    "JinaAIAPIEmbedder": ".JinaAI",
+    "AstraDBConnect": ".wikidataRetriever",
+    "KeywordSearchConnect": ".wikidataRetriever",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,58 @@
+"""
+Retries with exponential backoff, for the calls to external services
+(embedding APIs, AstraDB) that fail under rate limits or transient errors.
+"""
+
+import random
+import time
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0, retry_after=None):
+    """
+    Returns how long to wait before the next attempt.
+
+    Parameters:
+    - attempt (int): Number of failed attempts so far (starting at 1).
+    - base_delay (float): Delay after the first failure, in seconds (default=1.0).
+    - max_delay (float): Maximum delay, in seconds (default=60.0).
+    - retry_after (str, float or None): Delay requested by the server (Retry-After header), used instead of the exponential delay when given in seconds (default=None).
+
+    Returns:
+    - float: The delay in seconds.
+    """
+    if retry_after is not None:
+        try:
+            return min(max(float(retry_after), 0.0), max_delay)
+        except ValueError:
+            pass  # HTTP date, fall back to the exponential delay
+
+    delay = min(base_delay * 2 ** (attempt - 1), max_delay)
+    # Full jitter, so that concurrent clients do not retry in lockstep
+    return random.uniform(delay / 2, delay)
+
+
+def call_with_backoff(func, max_retries=None, base_delay=1.0, max_delay=60.0, retry_on=(Exception,)):
+    """
+    Calls func until it succeeds, waiting longer after each failure.
+
+    Parameters:
+    - func (callable): Called without arguments.
+    - max_retries (int or None): Number of retries before the last error is raised. None retries forever (default=None).
+    - base_delay (float): Delay after the first failure, in seconds (default=1.0).
+    - max_delay (float): Maximum delay, in seconds (default=60.0).
+    - retry_on (tuple): Exceptions that are retried, others are raised (default=(Exception,)).
+
+    Returns:
+    - The result of func.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except retry_on as e:
+            attempt += 1
+            if (max_retries is not None) and (attempt > max_retries):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            print(f"{e} (retrying in {delay:.1f}s)")
+            time.sleep(delay)
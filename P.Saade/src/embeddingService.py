@@ -0,0 +1,287 @@
+"""
+Embedding service shared by the textifier processes of a container.
+
+Instead of each process loading its own copy of the embedding model, a fixed
+pool of inference workers (e.g. one per NUMA node or group of cores, each
+pinned to its CPUs with as many intra-op threads) embeds the texts of all the
+processes. The textifier processes hold an EmbeddingClient, with the same
+embed_documents and embed_query methods as the embedders of src.JinaAI, that
+sends the texts over a queue and waits for the embeddings. The number of
+textifier processes and of inference workers can then be set independently.
+
+With share_model, the model is loaded once before the workers are forked, so
+the workers read the same copy of the weights (copy-on-write). This is only
+safe for the PyTorch CPU backends: CUDA and ONNX Runtime sessions do not
+survive a fork, so each worker then loads its own model.
+
+If a worker fails to load its model or stops on an error, the error is sent
+to all the clients, and the clients stop waiting once no worker is running.
+"""
+
+from multiprocessing import Process, Queue, Value
+from queue import Empty, Full
+
+import os
+import threading
+import time
+
+
+def split_cpu_groups(num_groups, cpus=None):
+    """
+    Splits CPUs into groups of about the same size, one per inference worker.
+
+    Parameters:
+    - num_groups (int): Number of groups.
+    - cpus (str or None): Groups separated by ';', e.g. '0-15;16-31' for two NUMA nodes, returned as is. None splits the CPUs the process can run on in num_groups contiguous groups.
+
+    Returns:
+    - list[str]: The CPUs of each group, e.g. ['0,1,2,3', '4,5,6,7'].
+    """
+    if cpus:
+        return [group.strip() for group in cpus.split(';') if group.strip()]
+
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    num_groups = max(1, min(num_groups, len(available)))
+    size, extra = divmod(len(available), num_groups)
+
+    groups = []
+    start = 0
+    for i in range(num_groups):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(','.join(str(cpu) for cpu in available[start:end]))
+        start = end
+    return groups
+
+
+class EmbeddingClient:
+    def __init__(self, index, requests, responses, workers_alive):
+        """
+        Sends texts to the inference workers of an EmbeddingService. Create it with EmbeddingService.client and give it to one process.
+
+        Parameters:
+        - index (int): Index of the response queue of the client.
+        - requests (Queue): The request queue shared by the clients.
+        - responses (Queue): The response queue of the client.
+        - workers_alive (Value): Number of running inference workers, updated by the service.
+        """
+        self.index = index
+        self.requests = requests
+        self.responses = responses
+        self.workers_alive = workers_alive
+        self.sequence = 0
+
+    def _embed(self, kind, texts):
+        self._put((self.index, self.sequence, kind, texts))
+
+        while True:
+            try:
+                sequence, error, embeddings = self.responses.get(timeout=1)
+            except Empty:
+                self._check_workers()
+                continue
+
+            if sequence is None:
+                # Error of a worker that stopped, sent to all the clients
+                self.sequence += 1
+                raise RuntimeError(f"Embedding worker stopped: {error}")
+            if sequence != self.sequence:
+                continue  # Late response to a request that failed
+            self.sequence += 1
+            if error is not None:
+                raise RuntimeError(f"Embedding service error: {error}")
+            return embeddings
+
+    def _put(self, request):
+        while True:
+            self._check_workers()
+            try:
+                self.requests.put(request, timeout=1)
+                return
+            except Full:
+                continue
+
+    def _check_workers(self):
+        if self.workers_alive.value == 0:
+            self.sequence += 1
+            raise RuntimeError("No embedding worker is running")
+
+    def embed_documents(self, texts):
+        """
+        Embeds document (passage) texts, see JinaAIEmbedder.embed_documents.
+
+        Parameters:
+        - texts (list[str]): The texts.
+
+        Returns:
+        - np.ndarray: One embedding per text.
+        """
+        return self._embed('documents', list(texts))
+
+    def embed_query(self, text):
+        """
+        Embeds a query, see JinaAIEmbedder.embed_query.
+
+        Parameters:
+        - text (str): The query.
+
+        Returns:
+        - np.ndarray: The embedding of the query.
+        """
+        return self._embed('query', text)
+
+
+class EmbeddingService:
+    def __init__(self, create_embedder, cpu_groups, share_model=False, max_batch_size=128, queue_size=None):
+        """
+        Pool of inference workers embedding the texts of EmbeddingClients.
+
+        Parameters:
+        - create_embedder (callable): Returns the embedder of a worker (e.g. functools.partial(JinaAIEmbedder, embedding_dim=1024)). Called with num_threads and cpus in the workers, or once without arguments with share_model.
+        - cpu_groups (list[str]): The CPUs of each worker (see split_cpu_groups). One worker is started per group.
+        - share_model (bool): Load the model once before forking the workers (PyTorch CPU backends only). Default is False.
+        - max_batch_size (int): Maximum number of texts a worker gathers from queued requests to embed at once. Default is 128.
+        - queue_size (int or None): Maximum number of queued requests, default 4 per worker.
+        """
+        self.create_embedder = create_embedder
+        self.cpu_groups = cpu_groups
+        self.share_model = share_model
+        self.max_batch_size = max_batch_size
+        self.requests = Queue(maxsize=queue_size or 4 * len(cpu_groups))
+        self.responses = []
+        self.workers = []
+
+        # Number of running workers, counted by a thread of the parent process
+        # (only the parent can check its child processes)
+        self.workers_alive = Value('i', 0)
+        self.stopped = threading.Event()
+
+    def client(self):
+        """
+        Creates a client. All the clients must be created before start.
+
+        Returns:
+        - EmbeddingClient: The client, to give to one process.
+        """
+        if self.workers:
+            raise RuntimeError("Clients must be created before the service is started")
+        self.responses.append(Queue())
+        return EmbeddingClient(len(self.responses) - 1, self.requests, self.responses[-1], self.workers_alive)
+
+    def start(self):
+        """
+        Starts the inference workers.
+        """
+        embedder = None
+        if self.share_model:
+            # Loading the model may pin this process to INFERENCE_CPUS,
+            # the textifier processes started afterwards should not inherit it
+            affinity = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else None
+            embedder = self.create_embedder()
+            if affinity is not None:
+                os.sched_setaffinity(0, affinity)
+
+        for cpus in self.cpu_groups:
+            worker = Process(
+                target=self._run_worker,
+                args=(embedder, cpus),
+                daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+        self.workers_alive.value = len(self.workers)
+        self.stopped.clear()
+        threading.Thread(target=self._watch_workers, args=(list(self.workers),), daemon=True).start()
+
+    def stop(self):
+        """
+        Stops the inference workers once the queued requests are embedded.
+        """
+        for _ in self.workers:
+            while any(worker.is_alive() for worker in self.workers):
+                try:
+                    self.requests.put(None, timeout=1)
+                    break
+                except Full:
+                    continue
+        for worker in self.workers:
+            worker.join()
+        self.stopped.set()
+        self.workers = []
+
+    def _watch_workers(self, workers):
+        """
+        Updates the number of running workers every second, so that the clients stop waiting once no worker is left.
+        """
+        while not self.stopped.is_set():
+            alive = sum(worker.is_alive() for worker in workers)
+            self.workers_alive.value = alive
+            if alive == 0:
+                break
+            time.sleep(1)
+
+    def _run_worker(self, embedder, cpus):
+        """
+        Worker loop: gathers the queued document requests up to max_batch_size texts, embeds them in one call and sends each client its embeddings.
+        If loading the model or the loop fails, the error is sent to all the clients and the worker stops.
+        """
+        from src.JinaAI import pin_cpu_threads, parse_cpus
+
+        try:
+            num_threads = len(parse_cpus(cpus))
+            if embedder is None:
+                embedder = self.create_embedder(num_threads=num_threads, cpus=cpus)
+            else:
+                pin_cpu_threads(num_threads=num_threads, cpus=cpus)
+
+            stop = False
+            while not stop:
+                request = self.requests.get()
+                if request is None:
+                    break
+
+                requests = [request]
+                num_texts = len(request[3]) if request[2] == 'documents' else 1
+                while num_texts < self.max_batch_size:
+                    try:
+                        request = self.requests.get_nowait()
+                    except Empty:
+                        break
+                    if request is None:
+                        stop = True
+                        break
+                    requests.append(request)
+                    num_texts += len(request[3]) if request[2] == 'documents' else 1
+
+                self._embed_requests(embedder, requests)
+        except Exception as e:
+            print(f"Embedding worker on CPUs {cpus} stopped: {e}")
+            for responses in self.responses:
+                responses.put((None, str(e), None))
+            raise
+
+    def _embed_requests(self, embedder, requests):
+        """
+        Embeds the documents of the requests in one call, then the queries, and sends the results to the clients.
+        """
+        documents = [r for r in requests if r[2] == 'documents']
+        if documents:
+            try:
+                embeddings = embedder.embed_documents(
+                    [text for _, _, _, texts in documents for text in texts]
+                )
+                start = 0
+                for index, sequence, _, texts in documents:
+                    self.responses[index].put((sequence, None, embeddings[start:start + len(texts)]))
+                    start += len(texts)
+            except Exception as e:
+                print(e)
+                for index, sequence, _, _ in documents:
+                    self.responses[index].put((sequence, str(e), None))
+
+        for index, sequence, _, text in (r for r in requests if r[2] == 'query'):
+            try:
+                self.responses[index].put((sequence, None, embedder.embed_query(text)))
+            except Exception as e:
+                print(e)
+                self.responses[index].put((sequence, str(e), None))
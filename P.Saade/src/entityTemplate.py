@@ -0,0 +1,198 @@
+from string import Formatter
+
+"""
+Templates of the text representation of entities, shared by the formats of src/language_variables.
+
+A language declares its phrasing as format strings (e.g. '\n- {property}: "{values}"'),
+checked once when the language is loaded. The renderer goes once over the
+properties and their values, formats each piece and joins the lists of
+pieces, instead of building the text by repeated string concatenation.
+It can also return the span of each property in the text, so that
+WikidataTextifier.chunk_texts cuts the property lines out of the full text
+instead of textifying the entity again for each property.
+"""
+
+class EntityTemplate:
+    def __init__(
+            self, header, aliases, alias_separator,
+            properties_prefix, no_properties, property_line,
+            value, value_separator, qualifiers, qualifier,
+            qualifier_separator, qualifier_value_separator,
+            empty_property_line=None, empty_qualifier=None,
+            value_per_line=False):
+        """
+        Compiles the format strings of a language. Fields are written between braces, as with str.format.
+
+        Parameters:
+        - header (str): Label and description, with the fields {label} and {description}.
+        - aliases (str): Written after the header if the entity has aliases, with the fields {label} and {aliases}.
+        - alias_separator (str): Written between two aliases.
+        - properties_prefix (str): Written after the header and aliases if the entity has properties.
+        - no_properties (str): Written after the header and aliases if the entity has no properties.
+        - property_line (str): A property with values, with the fields {label}, {property} and {values}.
+        - value (str): A value of a property, with the fields {value} and {qualifiers}.
+        - value_separator (str): Written between two values of a property.
+        - qualifiers (str): The qualifiers of a value, with the field {qualifiers}. Only written if a qualifier is written.
+        - qualifier (str): A qualifier with values, with the fields {property} and {values}.
+        - qualifier_separator (str): Written before a qualifier with values that follows another qualifier.
+        - qualifier_value_separator (str): Written between two values of a qualifier.
+        - empty_property_line (str or None): A property whose values were all filtered out, with the fields {label} and {property}. None skips these properties (default=None).
+        - empty_qualifier (str or None): A qualifier whose values were all filtered out, with the field {property}, written without qualifier_separator. None skips these qualifiers (default=None).
+        - value_per_line (bool): If True, a property with qualifiers is written as one property_line per value (default=False).
+        """
+        self.header = self._compile(header, ('label', 'description'))
+        self.aliases = self._compile(aliases, ('label', 'aliases'))
+        self.alias_separator = alias_separator
+        self.properties_prefix = properties_prefix
+        self.no_properties = no_properties
+        self.property_line = self._compile(property_line, ('label', 'property', 'values'))
+        self.value = self._compile(value, ('value', 'qualifiers'))
+        self.value_separator = value_separator
+        self.qualifiers = self._compile(qualifiers, ('qualifiers',))
+        self.qualifier = self._compile(qualifier, ('property', 'values'))
+        self.qualifier_separator = qualifier_separator
+        self.qualifier_value_separator = qualifier_value_separator
+        self.empty_property_line = (
+            self._compile(empty_property_line, ('label', 'property'))
+            if empty_property_line is not None else None
+        )
+        self.empty_qualifier = (
+            self._compile(empty_qualifier, ('property',))
+            if empty_qualifier is not None else None
+        )
+        self.value_per_line = value_per_line
+
+    @staticmethod
+    def _compile(template, fields):
+        """
+        Compiles a format string to a function returning the equivalent f-string, which is faster than str.format since the string is not parsed again for every entity.
+
+        Parameters:
+        - template (str): The format string. Only the plain fields listed in fields are allowed.
+        - fields (tuple[str]): The field names, in the order of the arguments of the compiled function.
+
+        Returns:
+        - function: Takes the field values as positional arguments and returns the formatted text.
+        """
+        for _, field, spec, conversion in Formatter().parse(template):
+            if (field is not None) and (field not in fields or spec or conversion):
+                raise ValueError(f"Unsupported field '{{{field}}}' in '{template}', expected one of {list(fields)}")
+        return eval(f"lambda {', '.join(fields)}: f{template!r}")
+
+    def render(self, label, description, aliases, properties):
+        """
+        Renders the text of an entity.
+
+        Parameters:
+        - label (str): The label of the entity.
+        - description (str): The description of the entity.
+        - aliases (list[str]): The aliases of the entity.
+        - properties (dict): The properties from WikidataTextifier.properties_to_dict, mapping property labels to a list of {'value': str, 'qualifiers': dict}, or None.
+
+        Returns:
+        - str: The text of the entity.
+        """
+        return ''.join(self._entity_parts(label, description, aliases, properties)[0])
+
+    def render_with_spans(self, label, description, aliases, properties):
+        """
+        Renders the text of an entity, with the span of each property in the text.
+
+        Parameters:
+        - label (str): The label of the entity.
+        - description (str): The description of the entity.
+        - aliases (list[str]): The aliases of the entity.
+        - properties (dict): The properties, see render.
+
+        Returns:
+        - tuple: (text, spans). spans holds one (start, end) position in text per property, in the order of properties. The span of a property that is not written is empty.
+        """
+        parts, header_size = self._entity_parts(label, description, aliases, properties)
+
+        spans = []
+        if len(properties) > 0:
+            position = sum(len(part) for part in parts[:header_size])
+            for line in parts[header_size:]:
+                spans.append((position, position + len(line)))
+                position += len(line)
+
+        return ''.join(parts), spans
+
+    def _entity_parts(self, label, description, aliases, properties):
+        """
+        Renders the parts of the text of an entity: the header, then one part per property.
+
+        Returns:
+        - tuple: (parts, header_size). header_size is the number of parts before the properties.
+        """
+        parts = [self.header(label, description)]
+        if len(aliases) > 0:
+            parts.append(self.aliases(label, self.alias_separator.join(aliases)))
+
+        if len(properties) == 0:
+            parts.append(self.no_properties)
+            return parts, len(parts)
+
+        parts.append(self.properties_prefix)
+        header_size = len(parts)
+
+        property_line = self.property_line
+        value = self.value
+        value_separator = self.value_separator
+        qualifiers_text = self._qualifiers_text
+        for property_label, claim_values in properties.items():
+            if claim_values is None:
+                parts.append('')
+
+            elif len(claim_values) == 0:
+                if self.empty_property_line is None:
+                    parts.append('')
+                else:
+                    parts.append(self.empty_property_line(label, property_label))
+
+            else:
+                values = [
+                    value(
+                        claim_value['value'],
+                        qualifiers_text(claim_value['qualifiers'])
+                        if claim_value.get('qualifiers') else ''
+                    )
+                    for claim_value in claim_values
+                ]
+                if self.value_per_line and any(
+                        len(claim_value.get('qualifiers', {})) > 0
+                        for claim_value in claim_values):
+                    # One line per value
+                    parts.append(''.join([
+                        property_line(label, property_label, value_text)
+                        for value_text in values
+                    ]))
+                else:
+                    parts.append(property_line(
+                        label, property_label, value_separator.join(values)
+                    ))
+
+        return parts, header_size
+
+    def _qualifiers_text(self, qualifiers):
+        """
+        Renders the qualifiers of a value, or an empty string if none of them is written.
+        """
+        pieces = []
+        for property_label, qualifier_values in qualifiers.items():
+            if qualifier_values is None:
+                continue
+
+            if len(qualifier_values) > 0:
+                if len(pieces) > 0:
+                    pieces.append(self.qualifier_separator)
+                pieces.append(self.qualifier(
+                    property_label,
+                    self.qualifier_value_separator.join(qualifier_values)
+                ))
+            elif self.empty_qualifier is not None:
+                pieces.append(self.empty_qualifier(property_label))
+
+        if len(pieces) == 0:
+            return ''
+        return self.qualifiers(''.join(pieces))
@@ -0,0 +1,102 @@
+# Benchmark of the inference backends of JinaAIEmbedder and JinaAIReranker
+# (src.JinaAI.INFERENCE_BACKENDS). Embeds the same entity texts with each
+# backend, prints docs/sec and tokens/sec, and checks that the embeddings stay
+# within a cosine tolerance of the reference backend (PyTorch fp32 on CPU).
+# The reranker scores are compared the same way (max absolute difference).
+# Exits with 1 if a backend is outside the tolerance.
+#
+# Run from the P.Saade folder:
+#   python -m src.experimental_functions.benchmark_inference_backends
+#   BACKENDS=cpu,onnx-int8 INFERENCE_THREADS=8 python -m src.experimental_functions.benchmark_inference_backends
+
+import importlib
+import os
+import sys
+import time
+
+import numpy as np
+
+from src.JinaAI import JinaAIEmbedder, JinaAIReranker, cosine_agreement
+from src.experimental_functions.language_templates_fixture import sample_entities
+
+BACKENDS = os.getenv("BACKENDS", 'cpu,int8,onnx,onnx-int8').split(',')
+REFERENCE_BACKEND = os.getenv("REFERENCE_BACKEND", 'cpu')
+NUM_TEXTS = int(os.getenv("NUM_TEXTS", 256))
+NUM_PAIRS = int(os.getenv("NUM_PAIRS", 64))
+COSINE_TOLERANCE = float(os.getenv("COSINE_TOLERANCE", 0.99))  # Minimum cosine to the reference
+SCORE_TOLERANCE = float(os.getenv("SCORE_TOLERANCE", 0.05))  # Maximum reranker score difference
+SKIP_RERANKER = os.getenv("SKIP_RERANKER", "false").lower() == "true"
+
+
+def sample_texts():
+    """Entity texts of the en format, with the lengths and phrasing of stage 3."""
+    langvar = importlib.import_module("src.language_variables.en")
+    return [
+        langvar.merge_entity_text(
+            sample['label'], sample['description'],
+            sample['aliases'], sample['properties']
+        )
+        for sample in sample_entities()[:NUM_TEXTS]
+    ]
+
+
+def benchmark_embedder(backend, texts):
+    embedder = JinaAIEmbedder(backend=backend)
+    embedder.embed_documents(texts[:8])  # Warm-up (ONNX Runtime allocations, int8 kernels)
+    embedder.batch_stats = {'texts': 0, 'tokens': 0, 'padded_tokens': 0, 'seconds': 0.0}
+
+    start = time.perf_counter()
+    embeddings = embedder.embed_documents(texts)
+    elapsed = time.perf_counter() - start
+
+    tokens = embedder.batch_stats['tokens']
+    print(f"{backend} embedder: {len(texts) / elapsed:,.1f} docs/s, {tokens / elapsed:,.0f} tokens/s")
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def benchmark_reranker(backend, query, texts):
+    reranker = JinaAIReranker(backend=backend)
+    reranker.rank(query, texts[:4])
+
+    start = time.perf_counter()
+    scores = reranker.rank(query, texts)
+    elapsed = time.perf_counter() - start
+
+    print(f"{backend} reranker: {len(texts) / elapsed:,.1f} pairs/s")
+    return np.asarray(scores, dtype=np.float32)
+
+
+def main():
+    texts = sample_texts()
+    query = "Who wrote The Hitchhiker's Guide to the Galaxy?"
+    backends = [REFERENCE_BACKEND] + [b for b in BACKENDS if b != REFERENCE_BACKEND]
+
+    embeddings = {}
+    scores = {}
+    for backend in backends:
+        embeddings[backend] = benchmark_embedder(backend, texts)
+        if not SKIP_RERANKER:
+            scores[backend] = benchmark_reranker(backend, query, texts[:NUM_PAIRS])
+
+    passed = True
+    for backend in backends[1:]:
+        cosines = cosine_agreement(embeddings[backend], embeddings[REFERENCE_BACKEND])
+        ok = cosines.min() >= COSINE_TOLERANCE
+        passed = passed and ok
+        print(
+            f"{backend} vs {REFERENCE_BACKEND}: cosine min {cosines.min():.4f}, "
+            f"mean {cosines.mean():.4f} {'OK' if ok else 'FAILED'}"
+        )
+
+        if not SKIP_RERANKER:
+            difference = np.abs(scores[backend] - scores[REFERENCE_BACKEND]).max()
+            ok = difference <= SCORE_TOLERANCE
+            passed = passed and ok
+            print(f"{backend} vs {REFERENCE_BACKEND}: reranker score max difference {difference:.4f} {'OK' if ok else 'FAILED'}")
+
+    return passed
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
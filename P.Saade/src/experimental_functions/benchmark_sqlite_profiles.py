@@ -0,0 +1,101 @@
+# Benchmark of the insert rate of docker stage 1 (WikidataItem.add_bulk_items)
+# with the previous engine settings (SQLite defaults: rollback journal,
+# synchronous=FULL, no mmap, and pool_recycle=10) against the profiles of
+# src.sqliteEngine. Rows mimic the labels & descriptions of the dump.
+#
+# Run from the P.Saade folder: python -m src.experimental_functions.benchmark_sqlite_profiles
+
+import json
+import os
+import random
+import string
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from src.sqliteEngine import create_sqlite_engine
+
+NUM_ROWS = int(os.getenv("NUM_ROWS", 1000000))
+PUSH_SIZE = int(os.getenv("PUSH_SIZE", 20000))  # Default of docker stage 1
+LANGUAGES = ['en', 'de', 'fr', 'es', 'it', 'ar', 'ja', 'ru', 'nl', 'pt']
+
+CREATE_STMT = text(
+    """
+    CREATE TABLE IF NOT EXISTS item (
+        id TEXT PRIMARY KEY, labels TEXT, descriptions TEXT, in_wikipedia BOOLEAN
+    )
+    """
+)
+
+# Same statement as WikidataItem.add_bulk_items
+INSERT_STMT = text(
+    """
+    INSERT INTO item (id, labels, descriptions, in_wikipedia)
+    VALUES (:id, :labels, :descriptions, :in_wikipedia)
+    ON CONFLICT(id) DO NOTHING
+    """
+)
+
+
+def random_text(rng, length):
+    return ''.join(rng.choice(string.ascii_lowercase + ' ') for _ in range(length))
+
+
+def make_rows(num_rows, seed=0):
+    """Rows in the format pushed by docker stage 1, in dump order (QIDs increasing with gaps)."""
+    rng = random.Random(seed)
+    rows = []
+    qid = 1
+    for _ in range(num_rows):
+        qid += rng.randint(1, 3)
+        languages = rng.sample(LANGUAGES, rng.randint(1, len(LANGUAGES)))
+        labels = {lang: random_text(rng, rng.randint(5, 25)) for lang in languages}
+        descriptions = {lang: random_text(rng, rng.randint(10, 60)) for lang in languages}
+        rows.append({
+            'id': f"Q{qid}",
+            'labels': json.dumps(labels, separators=(',', ':')),
+            'descriptions': json.dumps(descriptions, separators=(',', ':')),
+            'in_wikipedia': rng.random() < 0.3,
+        })
+    return rows
+
+
+def legacy_engine(sqldb_path):
+    """Engine settings used by the DB modules before src.sqliteEngine."""
+    return create_engine(
+        f'sqlite:///{sqldb_path}',
+        pool_size=5,
+        max_overflow=10,
+        pool_recycle=10
+    )
+
+
+def run_inserts(engine, rows):
+    """Insert the rows in batches of PUSH_SIZE, one transaction per batch. Returns rows/sec."""
+    with engine.begin() as connection:
+        connection.execute(CREATE_STMT)
+
+    start = time.perf_counter()
+    for i in range(0, len(rows), PUSH_SIZE):
+        with engine.begin() as connection:
+            connection.execute(INSERT_STMT, rows[i:i + PUSH_SIZE])
+    elapsed = time.perf_counter() - start
+    return len(rows) / elapsed
+
+
+if __name__ == "__main__":
+    rows = make_rows(NUM_ROWS)
+    engines = {
+        'previous (SQLite defaults)': legacy_engine,
+        'bulk_load': lambda path: create_sqlite_engine(path, profile='bulk_load'),
+        'read_serving': lambda path: create_sqlite_engine(path, profile='read_serving'),
+    }
+
+    for name, make_engine in engines.items():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sqldb_path = os.path.join(tmp_dir, 'benchmark.db')
+            engine = make_engine(sqldb_path)
+            rate = run_inserts(engine, rows)
+            engine.dispose()
+            size = os.path.getsize(sqldb_path) / 2**20
+            print(f"{name:28s} {rate:10.0f} rows/s  ({size:.0f} MB)")
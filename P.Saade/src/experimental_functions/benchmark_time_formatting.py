@@ -0,0 +1,181 @@
+# Micro-benchmark of WikidataTextifier.time_to_text against the previous
+# implementation (uncompiled regex, datetime objects per Julian conversion
+# and an if/elif chain per precision). Also checks that both give the same
+# text for every precision, calendar model and language.
+#
+# Run from the P.Saade folder: python -m src.experimental_functions.benchmark_time_formatting
+
+import random
+import re
+import time
+
+from datetime import date, datetime
+from src.wikidataEmbed import WikidataTextifier
+
+NUM_VALUES = 200000
+NUM_DISTINCT = 20000  # Time values repeat a lot in the dump
+LANGUAGES = ['en', 'de', 'ar']
+
+GREGORIAN = 'http://www.wikidata.org/entity/Q1985727'
+JULIAN = 'http://www.wikidata.org/entity/Q1985786'
+
+
+def legacy_time_to_text(time_data, langvar):
+    """Previous implementation of WikidataTextifier.time_to_text."""
+    if time_data is None:
+        return None
+
+    time_value = time_data['time']
+    precision = time_data['precision']
+    calendarmodel = time_data.get('calendarmodel', 'http://www.wikidata.org/entity/Q1985786')
+
+    # Use regex to parse the time string
+    pattern = r'([+-])(\d{1,16})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})Z'
+    match = re.match(pattern, time_value)
+
+    if not match:
+        raise ValueError("Malformed time string")
+
+    sign, year_str, month_str, day_str, hour_str, minute_str, second_str = match.groups()
+    year = int(year_str) * (1 if sign == '+' else -1)
+
+    # Convert Julian to Gregorian if necessary
+    if 'Q1985786' in calendarmodel and year > 1 and len(str(abs(year))) <= 4:  # Julian calendar
+        try:
+            month = 1 if month_str == '00' else int(month_str)
+            day = 1 if day_str == '00' else int(day_str)
+            julian_date = date(year, month, day)
+            gregorian_ordinal = julian_date.toordinal() + (datetime(1582, 10, 15).toordinal() - datetime(1582, 10, 5).toordinal())
+            gregorian_date = date.fromordinal(gregorian_ordinal)
+            year, month, day = gregorian_date.year, gregorian_date.month, gregorian_date.day
+        except ValueError:
+            raise ValueError("Invalid date for Julian calendar")
+    else:
+        month = int(month_str) if month_str != '00' else 1
+        day = int(day_str) if day_str != '00' else 1
+
+    month_str = langvar.time_variables['months'][month - 1] if month != 0 else ''
+    ad = langvar.time_variables['AD']
+    bc = langvar.time_variables['BC']
+
+    if precision == 14:
+        return f"{year} {month_str} {day} {hour_str}:{minute_str}:{second_str}"
+    elif precision == 13:
+        return f"{year} {month_str} {day} {hour_str}:{minute_str}"
+    elif precision == 12:
+        return f"{year} {month_str} {day} {hour_str}:00"
+    elif precision == 11:
+        return f"{day} {month_str} {year}"
+    elif precision == 10:
+        return f"{month_str} {year}"
+    elif precision == 9:
+        era = '' if year > 0 else f' {bc}'
+        return f"{abs(year)}{era}"
+    elif precision == 8:
+        decade = (year // 10) * 10
+        decade_suffix = langvar.time_variables['decade']
+        era = ad if year > 0 else bc
+        return f"{abs(decade)}{decade_suffix} {era}"
+    elif precision == 7:
+        century = (abs(year) - 1) // 100 + 1
+        era = ad if year > 0 else bc
+        return f"{century}{langvar.time_variables['century']} {era}"
+    elif precision == 6:
+        millennium = (abs(year) - 1) // 1000 + 1
+        era = ad if year > 0 else bc
+        return f"{millennium}{langvar.time_variables['millennium']} {era}"
+    elif precision == 5:
+        tens_of_thousands = abs(year) // 10000
+        era = ad if year > 0 else bc
+        return f"{tens_of_thousands} {langvar.time_variables['ten thousand years']} {era}"
+    elif precision == 4:
+        hundreds_of_thousands = abs(year) // 100000
+        era = ad if year > 0 else bc
+        return f"{hundreds_of_thousands} {langvar.time_variables['hundred thousand years']} {era}"
+    elif precision == 3:
+        millions = abs(year) // 1000000
+        era = ad if year > 0 else bc
+        return f"{millions} {langvar.time_variables['million years']} {era}"
+    elif precision == 2:
+        tens_of_millions = abs(year) // 10000000
+        era = ad if year > 0 else bc
+        return f"{tens_of_millions} {langvar.time_variables['tens of millions of years']} {era}"
+    elif precision == 1:
+        hundreds_of_millions = abs(year) // 100000000
+        era = ad if year > 0 else bc
+        return f"{hundreds_of_millions} {langvar.time_variables['hundred million years']} {era}"
+    elif precision == 0:
+        billions = abs(year) // 1000000000
+        era = ad if year > 0 else bc
+        return f"{billions} {langvar.time_variables['billion years']} {era}"
+    else:
+        raise ValueError(f"Unknown precision value {precision}")
+
+
+def random_time_value():
+    """Generates a Wikidata time value, mostly recent dates with day/year precision."""
+    precision = random.choice([11, 11, 11, 9, 9, 10, 8, 7, 6, 14, 13, 12, 5, 4, 3, 2, 1, 0])
+    if precision >= 6:
+        year = random.randint(-3000, 2025)
+    else:
+        year = -random.randint(10 ** 4, 10 ** 10)
+    year = year if year != 0 else 1
+    month = random.randint(0 if precision < 10 else 1, 12)
+    day = random.randint(0 if precision < 11 else 1, 28)
+    sign = '+' if year > 0 else '-'
+    return {
+        'time': f"{sign}{abs(year):04d}-{month:02d}-{day:02d}T{random.randint(0, 23):02d}:{random.randint(0, 59):02d}:{random.randint(0, 59):02d}Z",
+        'precision': precision,
+        'calendarmodel': JULIAN if (year < 1582 and random.random() < 0.5) else GREGORIAN,
+    }
+
+
+def run_legacy(values, langvar):
+    return [legacy_time_to_text(value, langvar) for value in values]
+
+
+def run_precompiled(values, textifier):
+    return [
+        textifier._format_time(
+            value['time'], value['precision'], value['calendarmodel']
+        )
+        for value in values
+    ]
+
+
+def run_current(values, textifier):
+    return [textifier.time_to_text(value) for value in values]
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    distinct_values = [random_time_value() for _ in range(NUM_DISTINCT)]
+    values = [random.choice(distinct_values) for _ in range(NUM_VALUES)]
+
+    for language in LANGUAGES:
+        textifier = WikidataTextifier(language=language)
+
+        expected = run_legacy(distinct_values, textifier.langvar)
+        assert run_precompiled(distinct_values, textifier) == expected, \
+            f"Different output for '{language}'"
+
+        start = time.perf_counter()
+        run_legacy(values, textifier.langvar)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_precompiled(values, textifier)
+        uncached_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        texts = run_current(values, textifier)
+        cached_time = time.perf_counter() - start
+        assert texts == run_legacy(values, textifier.langvar), \
+            f"Different cached output for '{language}'"
+
+        print(
+            f"{language}: legacy {NUM_VALUES / legacy_time:,.0f} values/s "
+            f"| precompiled {NUM_VALUES / uncached_time:,.0f} values/s "
+            f"| precompiled + cache {NUM_VALUES / cached_time:,.0f} values/s "
+            f"(hit rate {textifier.format_cache.stats()['hit_rate']:.2f})"
+        )
@@ -0,0 +1,105 @@
+import json
+import sqlite3
+from tqdm import tqdm
+
+from src.wikidataLabelMap import WikidataLabelMap
+
+# Compiles the labels of one language into a memory-mapped label map
+# (src/wikidataLabelMap.py), from the item database (WikidataItem), the
+# compact database (wikidataCompactDB), or a JSON dict of {id: label}
+# (e.g. the label_map_full.json of the Repo scripts). Labels missing in the
+# language are taken from 'mul', like WikidataTextifier.get_label.
+#
+# Run from the P.Saade folder: python -m src.experimental_functions.compile_label_map
+
+# Change these to match your actual source and language
+SOURCE = "item"  # "item", "compact" or "json"
+SOURCE_PATH = "../data/Wikidata/sqlite_wikidata_items.db"
+LANGUAGE = "en"
+OUTPUT_PATH = f"../data/Wikidata/labels_{LANGUAGE}.map"
+BATCH_SIZE = 20000
+
+
+def labels_from_item_db(path, language):
+    """
+    Yields (id, label) pairs from the item table, using keyset pagination on the ID.
+    """
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM item")
+    total = cursor.fetchone()[0]
+
+    last_id = ''
+    with tqdm(total=total) as progressbar:
+        while True:
+            cursor.execute(
+                "SELECT id, labels FROM item WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, BATCH_SIZE)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            for id, labels in rows:
+                labels = json.loads(labels) if labels else {}
+                yield id, labels.get(language, labels.get('mul'))
+
+            last_id = rows[-1][0]
+            progressbar.update(len(rows))
+    conn.close()
+
+
+def labels_from_compact_db(path, language):
+    """
+    Yields (id, label) pairs from the compact label table, already in key order.
+    """
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT id, language, label FROM label
+        WHERE language IN (?, 'mul') AND label IS NOT NULL
+        ORDER BY id
+        """,
+        (language,)
+    )
+
+    # Rows of the same ID are consecutive, keep the language over 'mul'
+    current_key, current_label = None, None
+    for key, lang, label in tqdm(cursor):
+        if key != current_key:
+            if current_key is not None:
+                yield decode_id(current_key), current_label
+            current_key, current_label = key, label
+        elif lang == language:
+            current_label = label
+    if current_key is not None:
+        yield decode_id(current_key), current_label
+    conn.close()
+
+
+def labels_from_json(path):
+    """
+    Yields (id, label) pairs from a JSON dict of {id: label}.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+    yield from labels.items()
+
+
+def decode_id(key):
+    return f"Q{key}" if key > 0 else f"P{-key}"
+
+
+if __name__ == "__main__":
+    if SOURCE == "item":
+        labels = labels_from_item_db(SOURCE_PATH, LANGUAGE)
+    elif SOURCE == "compact":
+        labels = labels_from_compact_db(SOURCE_PATH, LANGUAGE)
+    elif SOURCE == "json":
+        labels = labels_from_json(SOURCE_PATH)
+    else:
+        raise ValueError(f"Unknown source '{SOURCE}'")
+
+    size = WikidataLabelMap.build(OUTPUT_PATH, labels)
+    print(f"Compiled {size} labels to {OUTPUT_PATH}")
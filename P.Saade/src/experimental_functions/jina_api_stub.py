@@ -0,0 +1,180 @@
+# Local stub of the Jina embeddings API, and a check of JinaAIAPIEmbedder
+# against it. The stub answers like https://api.jina.ai/v1/embeddings with
+# base64 float32 embeddings derived from the text (returned out of order),
+# rejects requests with more than STUB_MAX_INPUTS texts (413), answers every
+# RATE_LIMIT_EVERY-th request with 429 and a Retry-After header, and records
+# the number of requests in flight.
+#
+# The check embeds texts with several concurrency limits and verifies the
+# embeddings, their order, the concurrency limit and the retries, then
+# prints the throughput. Exits with 1 on a failure.
+#
+# Run from the P.Saade folder:
+#   python -m src.experimental_functions.jina_api_stub           # check
+#   python -m src.experimental_functions.jina_api_stub serve     # only the stub, on STUB_PORT
+
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src.JinaAI import JinaAIAPIEmbedder
+
+STUB_PORT = int(os.getenv("STUB_PORT", 8765))
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", 0.05))  # Seconds per request
+STUB_MAX_INPUTS = int(os.getenv("STUB_MAX_INPUTS", 100))
+RATE_LIMIT_EVERY = int(os.getenv("RATE_LIMIT_EVERY", 5))  # 0 disables the rate limit
+NUM_TEXTS = int(os.getenv("NUM_TEXTS", 2000))
+EMBEDDING_DIM = 1024
+
+
+def stub_embedding(text, task, dimensions):
+    seed = int.from_bytes(hashlib.md5(f"{task}|{text}".encode('utf-8')).digest()[:8], 'little')
+    return np.random.default_rng(seed).standard_normal(dimensions).astype('<f4')
+
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.too_large = 0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = StubState()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=None):
+        payload = json.dumps(body or {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        state = self.state
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+
+        with state.lock:
+            state.requests += 1
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            rate_limited = (RATE_LIMIT_EVERY > 0) and (state.requests % RATE_LIMIT_EVERY == 0)
+        time.sleep(STUB_LATENCY)
+        status, body, headers = self._respond(data, rate_limited)
+        # Out of flight before replying, the client may send its next request right after
+        with state.lock:
+            state.in_flight -= 1
+        self._reply(status, body, headers)
+
+    def _respond(self, data, rate_limited):
+        state = self.state
+        if len(data['input']) > STUB_MAX_INPUTS:
+            with state.lock:
+                state.too_large += 1
+            return 413, {'detail': 'Too many inputs'}, None
+        if rate_limited:
+            with state.lock:
+                state.rate_limited += 1
+            return 429, {'detail': 'Rate limit'}, {'Retry-After': '0.1'}
+
+        items = [
+            {
+                'object': 'embedding',
+                'index': i,
+                'embedding': base64.b64encode(
+                    stub_embedding(text, data['task'], data['dimensions']).tobytes()
+                ).decode('ascii'),
+            }
+            for i, text in enumerate(data['input'])
+        ]
+        random.Random(len(items)).shuffle(items)  # Order is given by index
+        return 200, {'model': data['model'], 'data': items}, None
+
+
+def start_stub(port=STUB_PORT):
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check():
+    server = start_stub()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/embeddings"
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump({'API_KEY': 'stub'}, f)
+        api_key_path = f.name
+
+    rng = random.Random(1)
+    texts = [f"Q{i} " + "text " * rng.randint(1, 200) for i in range(NUM_TEXTS)]
+    expected = np.stack([stub_embedding(text, 'retrieval.passage', EMBEDDING_DIM) for text in texts])
+
+    passed = True
+    for concurrency in [1, 4, 8]:
+        StubHandler.state = StubState()
+        embedder = JinaAIAPIEmbedder(
+            embedding_dim=EMBEDDING_DIM,
+            api_key_path=api_key_path,
+            url=url,
+            max_concurrency=concurrency,
+            # Above the stub limit, so that requests are split after a 413
+            max_batch_inputs=2 * STUB_MAX_INPUTS,
+        )
+
+        start = time.perf_counter()
+        embeddings = embedder.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+
+        state = StubHandler.state
+        ok = (
+            embeddings.shape == expected.shape
+            and embeddings.dtype == np.float32
+            and np.array_equal(embeddings, expected)
+            and state.max_in_flight <= concurrency
+            and (state.rate_limited > 0 or RATE_LIMIT_EVERY == 0)
+        )
+        passed = passed and ok
+        print(
+            f"concurrency {concurrency}: {len(texts) / elapsed:,.0f} texts/s, "
+            f"{state.requests} requests ({state.rate_limited} rate limited, {state.too_large} too large), "
+            f"max in flight {state.max_in_flight} {'OK' if ok else 'FAILED'}"
+        )
+
+    query = embedder.embed_query("Douglas Adams")
+    ok = np.array_equal(query, stub_embedding("Douglas Adams", 'retrieval.query', EMBEDDING_DIM))
+    passed = passed and ok
+    print(f"query: shape {query.shape} {'OK' if ok else 'FAILED'}")
+
+    server.shutdown()
+    os.remove(api_key_path)
+    return passed
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    if mode == 'serve':
+        print(f"Stub Jina API on http://127.0.0.1:{STUB_PORT}/v1/embeddings")
+        start_stub().serve_forever()
+    elif mode == 'check':
+        if not check():
+            sys.exit(1)
+    else:
+        print(f"Unknown mode '{mode}', use check or serve")
+        sys.exit(1)
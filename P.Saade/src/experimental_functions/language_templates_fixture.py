@@ -0,0 +1,179 @@
+# Records the text produced by the language formats of src/language_variables
+# (merge_entity_text) for a sample of entities, and checks byte for byte
+# that the current formats still produce the same text. Also checks that the
+# property spans of the template formats cut the text into the lines used by
+# WikidataTextifier.chunk_texts, and times the formats.
+#
+# Run from the P.Saade folder:
+#   python -m src.experimental_functions.language_templates_fixture record
+#   python -m src.experimental_functions.language_templates_fixture validate
+#
+# Record the fixture before changing a language format, then validate after.
+
+import importlib
+import json
+import random
+import sys
+import time
+
+FIXTURE_PATH = '../data/Wikidata/language_templates_fixture.jsonl'
+LANGUAGES = ['en', 'de', 'ar', 'rdf', 'json']
+NUM_ENTITIES = 2000
+MAX_MISMATCHES_SHOWN = 10
+
+WORDS = [
+    'Douglas Adams', 'human', 'writer', 'Cambridge', '1952', 'Q42', '',
+    'Berlin', 'Deutschland', 'القاهرة', 'مصر', '"quoted"', 'a, b', 'x (y)',
+    'line\nbreak', '42 kg', '11 Mar 1952', 'München', '«»', ' ; ',
+]
+
+
+def random_text(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+
+def random_value(rng):
+    """Values are never empty, properties_to_dict and qualifiers_to_dict skip them."""
+    return random_text(rng) or rng.choice(WORDS[:6])
+
+
+def random_qualifiers(rng):
+    qualifiers = {}
+    for _ in range(rng.choice([0, 0, 0, 1, 1, 2, 3])):
+        values = rng.choice([
+            None, [], [random_value(rng)],
+            [random_value(rng) for _ in range(rng.randint(2, 4))]
+        ])
+        qualifiers[random_value(rng)] = values
+    return qualifiers
+
+
+def random_properties(rng):
+    """Properties as returned by WikidataTextifier.properties_to_dict, including no value (None) and no kept value ([])."""
+    properties = {}
+    for _ in range(rng.choice([0, 1, 2, 5, 10, 20])):
+        claims = rng.choice([None, [], 'values', 'values', 'values', 'values'])
+        if claims == 'values':
+            claims = [
+                {'value': random_value(rng), 'qualifiers': random_qualifiers(rng)}
+                for _ in range(rng.randint(1, 4))
+            ]
+        properties[random_value(rng)] = claims
+    return properties
+
+
+def sample_entities():
+    """Generates the arguments of merge_entity_text, with the edge cases used by WikidataTextifier (no properties, the {'': None} header of chunk_texts, a description taken from a property)."""
+    rng = random.Random(0)
+    samples = []
+    for i in range(NUM_ENTITIES):
+        properties = random_properties(rng)
+        description = random_text(rng)
+        if (i % 10 == 1) and (len(properties) > 0):
+            description = rng.choice(list(properties.values()))
+        elif i % 10 == 2:
+            description = ''
+        if i % 20 == 3:
+            properties = {'': None}
+
+        aliases = [random_text(rng) for _ in range(rng.choice([0, 0, 1, 3]))]
+        samples.append({
+            'label': random_text(rng),
+            'description': description,
+            'aliases': aliases,
+            'properties': properties,
+        })
+    return samples
+
+
+def render(langvar, sample):
+    return langvar.merge_entity_text(
+        sample['label'], sample['description'],
+        sample['aliases'], sample['properties']
+    )
+
+
+def record():
+    samples = sample_entities()
+    with open(FIXTURE_PATH, 'w', encoding='utf-8') as f:
+        for language in LANGUAGES:
+            langvar = importlib.import_module(f"src.language_variables.{language}")
+            for index, sample in enumerate(samples):
+                f.write(json.dumps({
+                    'language': language,
+                    'index': index,
+                    'text': render(langvar, sample),
+                }, ensure_ascii=False) + '\n')
+    print(f"Recorded {len(samples) * len(LANGUAGES)} texts to {FIXTURE_PATH}")
+
+
+def check_spans(langvar, sample, text):
+    """The lines cut by the spans must be the text each property adds to the header alone."""
+    if getattr(langvar, 'template', None) is None:
+        return True
+
+    rendered, spans = langvar.template.render_with_spans(
+        sample['label'], sample['description'],
+        sample['aliases'], sample['properties']
+    )
+    if rendered != text or len(spans) != len(sample['properties']):
+        return False
+
+    header = langvar.merge_entity_text(
+        sample['label'], sample['description'], sample['aliases'], {'': None}
+    )
+    for (key, value), (start, end) in zip(sample['properties'].items(), spans):
+        line = langvar.merge_entity_text(
+            sample['label'], sample['description'], sample['aliases'], {key: value}
+        )
+        if header + text[start:end] != line:
+            return False
+    return True
+
+
+def validate():
+    samples = sample_entities()
+    with open(FIXTURE_PATH, 'r', encoding='utf-8') as f:
+        fixture = [json.loads(line) for line in f]
+
+    langvars = {
+        language: importlib.import_module(f"src.language_variables.{language}")
+        for language in LANGUAGES
+    }
+
+    mismatches = []
+    span_errors = 0
+    for row in fixture:
+        langvar = langvars[row['language']]
+        sample = samples[row['index']]
+        text = render(langvar, sample)
+        if text != row['text']:
+            mismatches.append((row['language'], row['index'], row['text'], text))
+        elif not check_spans(langvar, sample, text):
+            span_errors += 1
+
+    for language, index, expected, text in mismatches[:MAX_MISMATCHES_SHOWN]:
+        print(f"{language} #{index}:\n  expected: {expected!r}\n  got:      {text!r}")
+    print(f"{len(fixture) - len(mismatches)}/{len(fixture)} identical texts, {span_errors} span errors")
+
+    for language, langvar in langvars.items():
+        start = time.perf_counter()
+        for _ in range(5):
+            for sample in samples:
+                render(langvar, sample)
+        elapsed = time.perf_counter() - start
+        print(f"{language}: {5 * len(samples) / elapsed:,.0f} entities/s")
+
+    return len(mismatches) == 0 and span_errors == 0
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'validate'
+    if mode == 'record':
+        record()
+    elif mode == 'validate':
+        if not validate():
+            sys.exit(1)
+    else:
+        print(f"Unknown mode '{mode}', use record or validate")
+        sys.exit(1)
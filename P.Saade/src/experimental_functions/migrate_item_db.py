@@ -0,0 +1,60 @@
+import sqlite3
+from tqdm import tqdm
+
+from src.wikidataCompactDB import WikidataLabel
+
+# Copies the labels (and descriptions) of the item database (WikidataItem) or
+# of the labels database (WikidataLabels) into the compact database
+# (wikidataCompactDB), with integer IDs and one row per (id, language).
+#
+# Run from the P.Saade folder: python -m src.experimental_functions.migrate_item_db
+
+# Change these to match your actual database path and table
+SOURCE_DB_PATH = "../data/Wikidata/sqlite_wikidata_items.db"
+SOURCE_TABLE = "item"  # "labels" for the labels database
+BATCH_SIZE = 20000  # Process in smaller batches to avoid memory overload
+
+
+def migrate():
+    """
+    Copy all the rows of the source table to the compact database in batches.
+    Uses keyset pagination on the ID so every batch is an index range scan.
+    """
+    conn = sqlite3.connect(SOURCE_DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute(f"PRAGMA table_info({SOURCE_TABLE})")
+    columns = [row[1] for row in cursor.fetchall()]
+    selected = [c for c in ('id', 'labels', 'descriptions', 'in_wikipedia') if c in columns]
+
+    cursor.execute(f"SELECT COUNT(*) FROM {SOURCE_TABLE}")
+    total = cursor.fetchone()[0]
+    print(f"Migrating {total} rows from {SOURCE_DB_PATH} ({', '.join(selected)})...")
+
+    last_id = ''
+    with tqdm(total=total) as progressbar:
+        while True:
+            cursor.execute(
+                f"""
+                SELECT {', '.join(selected)} FROM {SOURCE_TABLE}
+                WHERE id > ? ORDER BY id LIMIT ?
+                """,
+                (last_id, BATCH_SIZE)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            items = [dict(zip(selected, row)) for row in rows]
+            if not WikidataLabel.add_bulk_items(items):
+                raise RuntimeError(f"Failed to insert the batch after ID {last_id}")
+
+            last_id = rows[-1][0]
+            progressbar.update(len(rows))
+
+    conn.close()
+    print("Migration complete!")
+
+
+if __name__ == "__main__":
+    migrate()
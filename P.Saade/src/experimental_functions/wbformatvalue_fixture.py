@@ -0,0 +1,151 @@
+# Records the output of the Wikidata API (wbformatvalue) for a sample of
+# datavalues, and compares it with the local WikidataTextifier.data_to_text.
+#
+# Run from the P.Saade folder:
+#   python -m src.experimental_functions.wbformatvalue_fixture record
+#   python -m src.experimental_functions.wbformatvalue_fixture validate
+#
+# `record` reads the sample datavalues from the claims of the first entities
+# of the dump and needs an internet connection. It overwrites the fixture
+# committed next to this script, which was written by hand from the Wikibase
+# formatters (MwTimeIsoFormatter, QuantityFormatter) and the MediaWiki
+# messages of each language. `validate` runs offline and exits with 1 if a
+# value differs from the fixture.
+
+import json
+import os
+import sys
+from collections import defaultdict
+
+import requests
+
+from src.wikidataDumpReader import WikidataDumpReader
+from src.wikidataEmbed import WikidataTextifier
+
+FILEPATH = '../data/Wikidata/latest-all.json.bz2'
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'wbformatvalue_fixture.jsonl')
+WBFORMATVALUE_URL = 'https://www.wikidata.org/w/api.php'
+LANGUAGES = ['en', 'de', 'ar']
+DATATYPES = ['time', 'quantity', 'globe-coordinate', 'monolingualtext']
+VALUES_PER_DATATYPE = 200
+MAX_MISMATCHES_SHOWN = 10
+
+
+def sample_datavalues():
+    """Gathers up to VALUES_PER_DATATYPE distinct datavalues per datatype from the main snaks of the dump."""
+    samples = defaultdict(dict)
+    wikidata = WikidataDumpReader(FILEPATH, num_processes=1)
+
+    for line in wikidata._read_zipfile() if FILEPATH.endswith(('.bz2', '.gz')) else wikidata._read_jsonfile():
+        entity = wikidata.line_to_entity(line)
+        if entity is None:
+            continue
+
+        for claim in entity.get('claims', {}).values():
+            for statement in claim:
+                mainsnak = statement.get('mainsnak', {})
+                datatype = mainsnak.get('datatype')
+                datavalue = mainsnak.get('datavalue')
+                if (datatype in DATATYPES) and (datavalue is not None):
+                    key = json.dumps(datavalue, sort_keys=True)
+                    if len(samples[datatype]) < VALUES_PER_DATATYPE:
+                        samples[datatype][key] = datavalue
+
+        if all(len(samples[d]) >= VALUES_PER_DATATYPE for d in DATATYPES):
+            break
+
+    return [
+        (datavalue, datatype)
+        for datatype in DATATYPES
+        for datavalue in samples[datatype].values()
+    ]
+
+
+def api_format_value(session, datavalue, datatype, language):
+    """Formats a datavalue with the wbformatvalue endpoint of the Wikidata API, as plain text."""
+    r = session.get(WBFORMATVALUE_URL, params={
+        'action': 'wbformatvalue',
+        'format': 'json',
+        'datavalue': json.dumps(datavalue),
+        'datatype': datatype,
+        'uselang': language,
+        'generate': 'text/plain',
+        'formatversion': 2
+    }, timeout=30)
+    r.raise_for_status()
+    response = r.json()
+    if 'error' in response:
+        raise ValueError(f"wbformatvalue error: {response['error'].get('info', response['error'])}")
+    return response['result']
+
+
+def record_fixture():
+    values = sample_datavalues()
+    session = requests.Session()
+    with open(FIXTURE_PATH, 'w', encoding='utf-8') as f_out:
+        for language in LANGUAGES:
+            textifier = WikidataTextifier(language=language)
+            for datavalue, datatype in values:
+                row = {
+                    'language': language,
+                    'datatype': datatype,
+                    'datavalue': datavalue,
+                    'result': api_format_value(session, datavalue, datatype, language)
+                }
+                # The label of the unit in the SQLite database, which the
+                # validation runs without
+                unit = datavalue['value'].get('unit', '1') if datatype == 'quantity' else '1'
+                if unit != '1':
+                    unit_qid = unit.rsplit('/')[-1]
+                    row['unit_labels'] = {unit_qid: textifier.get_label(unit_qid)}
+                f_out.write(json.dumps(row, ensure_ascii=False) + '\n')
+    print(f"Recorded {len(values) * len(LANGUAGES)} values to {FIXTURE_PATH}")
+
+
+def validate_fixture():
+    """Prints the agreement between the recorded API output and data_to_text, per language and datatype. Returns True if all the values are identical."""
+    if not os.path.exists(FIXTURE_PATH):
+        print(f"No fixture at {FIXTURE_PATH}, run the record mode first")
+        return False
+
+    with open(FIXTURE_PATH, encoding='utf-8') as f_in:
+        fixture = [json.loads(line) for line in f_in]
+
+    passed = True
+    by_language = defaultdict(list)
+    for row in fixture:
+        by_language[row['language']].append(row)
+
+    for language, rows in by_language.items():
+        textifier = WikidataTextifier(language=language)
+        for row in rows:
+            for unit_qid, label in row.get('unit_labels', {}).items():
+                textifier.label_cache.put(('label', unit_qid), label)
+        texts = textifier.data_to_texts(
+            [(row['datavalue'], row['datatype']) for row in rows]
+        )
+
+        matches = defaultdict(int)
+        totals = defaultdict(int)
+        mismatches = []
+        for row, text in zip(rows, texts):
+            totals[row['datatype']] += 1
+            if text == row['result']:
+                matches[row['datatype']] += 1
+            else:
+                mismatches.append((row['datatype'], row['result'], text))
+
+        for datatype in totals:
+            print(f"{language} {datatype}: {matches[datatype]}/{totals[datatype]} identical")
+        for datatype, expected, text in mismatches[:MAX_MISMATCHES_SHOWN]:
+            print(f"    {datatype}: API {expected!r} | data_to_text {text!r}")
+        passed = passed and len(mismatches) == 0
+
+    return passed
+
+
+if __name__ == "__main__":
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'record'):
+        record_fixture()
+    elif not validate_fixture():
+        sys.exit(1)
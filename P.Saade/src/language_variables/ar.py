@@ -1,5 +1,7 @@
 """ العربية """
 
+from src.entityTemplate import EntityTemplate
+
 language = 'ar'
 
 novalue =  'لا قيمة'
@@ -20,6 +22,44 @@ time_variables = {
     'billion years': 'مليار سنة',
 }
 
+# Cardinal directions of globe coordinates
+coordinate_variables = {'N': 'ش', 'S': 'ج', 'E': 'ق', 'W': 'غ'}
+
+# Output of the wbformatvalue endpoint of the Wikidata API (MediaWiki date
+# formats and Wikibase time precision messages), reproduced by
+# WikidataTextifier.data_to_text
+wbformatvalue_variables = {
+    'months': ['يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو', 'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر'],
+    'date': '{day} {month} {year}',
+    'month': '{month} {year}',
+    'BCE': '{} ق.م',
+    '10annum': 'عقد {}',
+    'century': 'القرن {}',
+    'millennium': 'الألفية {}',
+    'annum': '{} سنة',
+    'Mannum': '{} مليون سنة',
+    'Gannum': '{} مليار سنة',
+    'decimal_separator': '٫',
+    'thousands_separator': '٬',
+    'digits': '٠١٢٣٤٥٦٧٨٩',
+}
+
+# Phrasing of the text representation of entities, see src/entityTemplate.py
+template = EntityTemplate(
+    header='{label}، {description}',
+    aliases='، المعروف أيضًا باسم {aliases}',
+    alias_separator='، ',
+    properties_prefix='. السمات تتضمن: ',
+    no_properties='.',
+    property_line='\n- {property}: {values}',
+    value='«{value}{qualifiers}»',
+    value_separator='،\n ',
+    qualifiers=' ({qualifiers})',
+    qualifier='{property}: {values}',
+    qualifier_separator=' ; ',
+    qualifier_value_separator='، ',
+)
+
 def merge_entity_text(label, description, aliases, properties):
     """
     دمج خصائص الكائن (التسمية، الوصف، الألقاب، والخصائص) في نص واحد.
@@ -33,69 +73,4 @@ def merge_entity_text(label, description, aliases, properties):
     الإرجاع:
     - تمثيل سلسلة للكائن، ووصفه، وتسمية، وألقابه، وادعاءاته. إذا لم توجد ادعاءات، ينتهي الوصف بنقطة.
     """
-    text = f"{label}، {description}"
-
-    if len(aliases) > 0:
-        text += f"، المعروف أيضًا باسم {'، '.join(aliases)}"
-
-    if len(properties) > 0:
-        properties_text = properties_to_text(properties)
-        text = f"{text}. السمات تتضمن: {properties_text}"
-    else:
-        text = f"{text}."
-
-    return text
-
-def qualifiers_to_text(qualifiers):
-    """
-    تحويل قائمة المؤهلات إلى سلسلة نصية قابلة للقراءة.
-    توفر المؤهلات معلومات إضافية حول الادعاء.
-
-    المعلمات:
-    - qualifiers: قاموس من المؤهلات مع معرّفات الخصائص كمفاتيح وقيمها كقوائم.
-
-    الإرجاع:
-    - تمثيل سلسلة للمؤهلات.
-    """
-    text = ""
-    for property_label, qualifier_values in qualifiers.items():
-        if (qualifier_values is not None) and len(qualifier_values) > 0:
-            if len(text) > 0:
-                text += f" ; "
-
-            text += f"{property_label}: {'، '.join(qualifier_values)}"
-
-    if len(text) > 0:
-        return f" ({text})"
-    return ""
-
-def properties_to_text(properties):
-    """
-    تحويل قائمة الخصائص (الادعاءات) إلى سلسلة نصية قابلة للقراءة.
-
-    المعلمات:
-    - properties: قاموس من الخصائص (الادعاءات) مع معرّفات الخصائص كمفاتيح.
-
-    الإرجاع:
-    - تمثيل سلسلة للخصائص وقيمها.
-    """
-    properties_text = ""
-    for property_label, claim_values in properties.items():
-        if (claim_values is not None) and (len(claim_values) > 0):
-
-            claims_text = ""
-            for claim_value in claim_values:
-                if len(claims_text) > 0:
-                    claims_text += f"،\n "
-
-                claims_text += f"«{claim_value['value']}"
-
-                qualifiers = claim_value.get('qualifiers', {})
-                if len(qualifiers) > 0:
-                    claims_text += qualifiers_to_text(qualifiers)
-
-                claims_text += f"»"
-
-            properties_text += f'\n- {property_label}: {claims_text}'
-
-    return properties_text
\ No newline at end of file
+    return template.render(label, description, aliases, properties)
@@ -1,5 +1,7 @@
 """ Deutsch """
 
+from src.entityTemplate import EntityTemplate
+
 language = 'de'
 
 novalue = 'kein Wert'
@@ -20,6 +22,48 @@ time_variables = {
     'billion years': 'Milliarden Jahre'
 }
 
+# Cardinal directions of globe coordinates
+coordinate_variables = {'N': 'N', 'S': 'S', 'E': 'O', 'W': 'W'}
+
+# Output of the wbformatvalue endpoint of the Wikidata API (MediaWiki date
+# formats and Wikibase time precision messages), reproduced by
+# WikidataTextifier.data_to_text
+wbformatvalue_variables = {
+    'months': ['Januar', 'Februar', 'März', 'April', 'Mai', 'Juni', 'Juli', 'August', 'September', 'Oktober', 'November', 'Dezember'],
+    'date': '{day}. {month} {year}',
+    'month': '{month} {year}',
+    'BCE': '{} v. Chr.',
+    '10annum': '{}er',
+    'century': '{}. Jahrhundert',
+    'millennium': '{}. Jahrtausend',
+    'annum': '{} Jahre',
+    'Mannum': '{} Millionen Jahre',
+    'Gannum': '{} Milliarden Jahre',
+    'decimal_separator': ',',
+    'thousands_separator': '.',
+    # Four digit numbers are not grouped (1234, but 12.345)
+    'minimum_grouping_digits': 2,
+    'digits': '0123456789',
+}
+
+# Phrasing of the text representation of entities, see src/entityTemplate.py
+template = EntityTemplate(
+    header='{label}, {description}',
+    aliases=', auch bekannt als {aliases}',
+    alias_separator=', ',
+    properties_prefix='. Attribute umfassen: ',
+    no_properties='.',
+    property_line='\n- {property}: „{values}“',
+    empty_property_line='\n- hat {property}',
+    value='{value}{qualifiers}',
+    value_separator=', ',
+    qualifiers=' {qualifiers}',
+    qualifier='({property}: {values})',
+    empty_qualifier='(hat {property})',
+    qualifier_separator=' ',
+    qualifier_value_separator=', ',
+)
+
 def merge_entity_text(label, description, aliases, properties):
     """
     Kombiniert die Entitätsattribute (Label, Beschreibung, Aliase und Eigenschaften) zu einem einzigen Textstring.
@@ -33,73 +77,4 @@ def merge_entity_text(label, description, aliases, properties):
     Rückgabe:
     - Ein String, der die Entität, ihre Beschreibung, das Label, die Aliase und ihre Ansprüche darstellt. Falls keine Ansprüche vorhanden sind, endet die Beschreibung mit einem Punkt.
     """
-    text = f"{label}, {description}"
-
-    if len(aliases) > 0:
-        text += f", auch bekannt als {', '.join(aliases)}"
-
-    if len(properties) > 0:
-        properties_text = properties_to_text(properties)
-        text = f"{text}. Attribute umfassen: {properties_text}"
-    else:
-        text = f"{text}."
-
-    return text
-
-def qualifiers_to_text(qualifiers):
-    """
-    Konvertiert eine Liste von Qualifikatoren in einen lesbaren Textstring.
-    Qualifikatoren bieten zusätzliche Informationen zu einem Anspruch.
-
-    Parameter:
-    - qualifiers: Ein Dictionary von Qualifikatoren mit Eigenschafts-IDs als Schlüsseln und deren Werten als Listen.
-
-    Rückgabe:
-    - Ein String, der die Qualifikatoren darstellt.
-    """
-    text = ""
-    for property_label, qualifier_values in qualifiers.items():
-        if (qualifier_values is not None) and len(qualifier_values) > 0:
-            if len(text) > 0:
-                text += f" "
-
-            text += f"({property_label}: {', '.join(qualifier_values)})"
-
-        elif (qualifier_values is not None):
-            text += f"(hat {property_label})"
-
-    if len(text) > 0:
-        return f" {text}"
-    return ""
-
-def properties_to_text(properties):
-    """
-    Konvertiert eine Liste von Eigenschaften (Ansprüchen) in einen lesbaren Textstring.
-
-    Parameter:
-    - properties: Ein Dictionary von Eigenschaften (Ansprüchen) mit Eigenschafts-IDs als Schlüsseln.
-
-    Rückgabe:
-    - Ein String, der die Eigenschaften und ihre Werte darstellt.
-    """
-    properties_text = ""
-    for property_label, claim_values in properties.items():
-        if (claim_values is not None) and (len(claim_values) > 0):
-
-            claims_text = ""
-            for claim_value in claim_values:
-                if len(claims_text) > 0:
-                    claims_text += f", "
-
-                claims_text += claim_value['value']
-
-                qualifiers = claim_value.get('qualifiers', {})
-                if len(qualifiers) > 0:
-                    claims_text += qualifiers_to_text(qualifiers)
-
-            properties_text += f'\n- {property_label}: „{claims_text}“'
-
-        elif (claim_values is not None):
-            properties_text += f'\n- hat {property_label}'
-
-    return properties_text
\ No newline at end of file
+    return template.render(label, description, aliases, properties)
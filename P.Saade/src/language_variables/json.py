@@ -20,6 +20,28 @@ time_variables = {
     'billion years': 'billion years',
 }
 
+# Cardinal directions of globe coordinates
+coordinate_variables = {'N': 'N', 'S': 'S', 'E': 'E', 'W': 'W'}
+
+# Output of the wbformatvalue endpoint of the Wikidata API (MediaWiki date
+# formats and Wikibase time precision messages), reproduced by
+# WikidataTextifier.data_to_text
+wbformatvalue_variables = {
+    'months': ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'],
+    'date': '{day} {month} {year}',
+    'month': '{month} {year}',
+    'BCE': '{} BCE',
+    '10annum': '{}s',
+    'century': '{}. century',
+    'millennium': '{}. millennium',
+    'annum': '{} years',
+    'Mannum': '{} million years',
+    'Gannum': '{} billion years',
+    'decimal_separator': '.',
+    'thousands_separator': ',',
+    'digits': '0123456789',
+}
+
 def merge_entity_text(label, description, aliases, properties):
     """
     Combines the entity attributes (label, description, aliases, and properties) into a single text string.
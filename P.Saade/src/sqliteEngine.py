@@ -0,0 +1,93 @@
+from sqlalchemy import create_engine, event
+import os
+
+"""
+Shared SQLAlchemy engine factory for the SQLite databases.
+
+Every connection is configured with the PRAGMAs of a profile:
+- 'bulk_load': for the dump processing containers that insert millions of
+  rows. Commits are not fsynced (synchronous=OFF), so a power loss can lose
+  the last transactions, but a crash of the process cannot corrupt the file.
+- 'read_serving': for the containers reading the databases, with a large
+  memory map and durable commits (synchronous=NORMAL is safe in WAL mode).
+The profile defaults to the SQLITE_PROFILE environment variable, else 'read_serving'.
+"""
+
+SQLITE_PROFILES = {
+    'bulk_load': {
+        'page_size': 16384,
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -512000,  # Negative values are in KiB (500 MB)
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 10000,  # Pages, fewer checkpoints while loading
+    },
+    'read_serving': {
+        'page_size': 16384,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -128000,  # 125 MB
+        'mmap_size': 4294967296,  # 4 GB, only the touched pages are loaded
+        'temp_store': 'MEMORY',
+    },
+}
+
+# page_size must be set before the first table is created (or before a VACUUM)
+# and journal_mode persists in the database file, so both come first.
+PRAGMA_ORDER = [
+    'page_size', 'journal_mode', 'synchronous', 'cache_size',
+    'mmap_size', 'temp_store', 'wal_autocheckpoint'
+]
+
+
+def get_sqlite_profile(profile=None):
+    """
+    Resolve the PRAGMAs of a profile.
+
+    Parameters:
+    - profile (str or None): 'bulk_load', 'read_serving', or None to use the SQLITE_PROFILE environment variable (default 'read_serving'). 'default' keeps the SQLite defaults.
+
+    Returns:
+    - dict: The PRAGMA names and values to apply on each connection.
+    """
+    if profile is None:
+        profile = os.getenv("SQLITE_PROFILE", 'read_serving')
+    if profile == 'default':
+        return {}
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(
+            f"Unknown SQLite profile '{profile}', expected one of {list(SQLITE_PROFILES)} or 'default'"
+        )
+    return SQLITE_PROFILES[profile]
+
+
+def create_sqlite_engine(sqldb_path, profile=None):
+    """
+    Create a SQLAlchemy engine for a SQLite database file, with the PRAGMAs of a profile applied to every new connection.
+
+    Parameters:
+    - sqldb_path (str): Path to the database file.
+    - profile (str or None): 'bulk_load', 'read_serving', 'default' (SQLite defaults), or None to use the SQLITE_PROFILE environment variable.
+
+    Returns:
+    - Engine: The SQLAlchemy engine.
+    """
+    pragmas = get_sqlite_profile(profile)
+
+    engine = create_engine(
+        f'sqlite:///{sqldb_path}',
+        pool_size=5,  # Limit the number of open connections
+        max_overflow=10,  # Allow extra connections beyond pool_size
+        pool_pre_ping=True  # Connections are kept, but checked before reuse
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name in PRAGMA_ORDER:
+            if name in pragmas:
+                cursor.execute(f"PRAGMA {name}={pragmas[name]}")
+        cursor.close()
+
+    return engine
@@ -0,0 +1,263 @@
+"""
+Single writer process for loading the dump into SQLite from many consumer processes.
+
+SQLite only allows one writer at a time, so instead of every consumer
+opening its own transaction under a lock, the consumers put batches of
+rows (tuples matching the placeholders of the insert statement) in a
+bounded queue, and a dedicated process inserts them with one long-lived
+connection and one transaction every rows_per_transaction rows.
+When the writer falls behind, the queue fills up and put() blocks the
+consumers, which in turn stops the dump reader. When the writer stops on an
+error or is killed, put() raises in the consumers, which stops the dump
+reader too (see WikidataDumpReader._run).
+"""
+
+from multiprocessing import Process, Queue, Value
+from multiprocessing.connection import wait
+from queue import Empty, Full
+import sqlite3
+import threading
+import time
+
+from src.backoff import backoff_delay
+
+
+class SQLiteWriter:
+    def __init__(
+            self, engine, insert_sql, rows_per_transaction=100000,
+            queue_size=16, report_per_s=10, max_retries=10):
+        """
+        Initializes the writer. The writer process is started with start().
+
+        Parameters:
+        - engine (Engine): The SQLAlchemy engine of the database (see src.sqliteEngine.create_sqlite_engine). Its PRAGMAs are applied to the writer connection.
+        - insert_sql (str): The insert statement, with ? placeholders, executed for every row (e.g. "INSERT INTO item (id, labels) VALUES (?, ?) ON CONFLICT(id) DO NOTHING").
+        - rows_per_transaction (int): Number of rows inserted between two commits (default=100000).
+        - queue_size (int): Maximum number of row batches waiting to be written. Consumers block once it's full (default=16).
+        - report_per_s (int or None): Number of seconds between two reports of the rows/sec and queue depth. None disables the reports (default=10).
+        - max_retries (int): Number of times an insert or commit is retried while the database is locked or busy, before the writer stops (default=10). Other errors stop the writer at once.
+        """
+        self.engine = engine
+        self.insert_sql = insert_sql
+        self.rows_per_transaction = rows_per_transaction
+        self.queue_size = queue_size
+        self.report_per_s = report_per_s
+        self.max_retries = max_retries
+
+        # Multiprocessing Variables:
+        # - queue: batches of rows put by the consumers, None to stop the writer
+        # - failed: 1 => the writer process stopped on an error or was killed
+        # - rows_written: number of rows inserted by the writer
+        self.queue = Queue(maxsize=max(1, queue_size))
+        self.failed = Value('i', 0)
+        self.rows_written = Value('q', 0)
+        self.process = None
+        self.closing = threading.Event()
+
+    def start(self):
+        """
+        Starts the writer process. Must be called before the consumer processes are spawned so that they share the queue.
+        """
+        self.closing.clear()
+        self.process = Process(target=self._writer)
+        self.process.start()
+        threading.Thread(target=self._watch_writer, args=(self.process,), daemon=True).start()
+
+    def _watch_writer(self, process):
+        """
+        Marks the writer as failed if its process exits before close() is called, e.g. when it's killed and cannot set 'failed' itself, so that the consumers stop waiting in put().
+        """
+        wait([process.sentinel])
+        if not self.closing.is_set():
+            with self.failed.get_lock():
+                self.failed.value = 1
+
+    def put(self, rows):
+        """
+        Sends a batch of rows to the writer. Blocks while the queue is full (backpressure).
+
+        Parameters:
+        - rows (list[tuple]): Rows matching the placeholders of insert_sql.
+        """
+        if len(rows) == 0:
+            return
+
+        while True:
+            if self.failed.value == 1:
+                # The rows already queued will never be read, don't wait for
+                # them to be flushed when the process exits
+                self.queue.cancel_join_thread()
+                raise RuntimeError("The SQLite writer process stopped")
+            try:
+                self.queue.put(rows, timeout=1)
+                return
+            except Full:
+                continue
+
+    def close(self):
+        """
+        Waits for the queued rows to be written and committed, then stops the writer process.
+
+        Returns:
+        - int: The total number of rows written.
+
+        Raises:
+        - RuntimeError: If the writer process stopped on an error, the rows of the last transaction are then not committed.
+        """
+        if self.process is not None:
+            self.closing.set()
+            # A stopped writer no longer empties the queue
+            while self.failed.value == 0:
+                try:
+                    self.queue.put(None, timeout=1)
+                    break
+                except Full:
+                    continue
+            self.process.join()
+            self.process = None
+
+        if self.failed.value == 1:
+            raise RuntimeError("The SQLite writer process stopped on an error")
+        return self.rows_written.value
+
+    def queue_depth(self):
+        """
+        Number of row batches waiting in the queue.
+
+        Returns:
+        - int or None: The queue depth, None if the platform doesn't support it (macOS).
+        """
+        try:
+            return self.queue.qsize()
+        except NotImplementedError:
+            return None
+
+    def _writer(self):
+        """
+        Writer process loop: inserts the queued batches and commits every rows_per_transaction rows, until close() is called.
+        """
+        # Connections must not be shared with the parent process
+        self.engine.dispose(close=False)
+        connection = None
+        cursor = None
+
+        # Batches of the open transaction, re-inserted if the commit fails
+        pending = []
+        pending_rows = 0
+        start_time = time.time()
+        last_report = start_time
+
+        try:
+            connection = self._connect()
+            cursor = connection.cursor()
+
+            while True:
+                try:
+                    rows = self.queue.get(timeout=1)
+                except Empty:
+                    rows = False  # Nothing to write yet
+
+                if rows is None:
+                    break
+
+                if rows:
+                    pending.append(rows)
+                    pending_rows += len(rows)
+                    self._execute(connection, cursor, pending, [rows])
+                    with self.rows_written.get_lock():
+                        self.rows_written.value += len(rows)
+
+                if pending_rows >= self.rows_per_transaction:
+                    self._commit(connection, cursor, pending)
+                    pending = []
+                    pending_rows = 0
+
+                if self.report_per_s and time.time() - last_report >= self.report_per_s:
+                    last_report = time.time()
+                    self._report(start_time)
+
+            self._commit(connection, cursor, pending)
+
+            # Move the WAL content to the database file and truncate it
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            if self.report_per_s:
+                self._report(start_time)
+        except Exception as e:
+            print(f"SQLite writer stopped: {e}")
+            with self.failed.get_lock():
+                self.failed.value = 1
+            raise
+        finally:
+            if cursor is not None:
+                cursor.close()
+            if connection is not None:
+                connection.close()
+
+    def _connect(self):
+        """
+        Opens the writer connection, applying the PRAGMAs of the engine. Retried up to max_retries times if the database is locked or busy.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.engine.raw_connection()
+            except sqlite3.OperationalError as e:
+                attempt = self._retry_if_busy(None, e, attempt)
+
+    def _execute(self, connection, cursor, pending, batches):
+        """
+        Inserts batches of rows in the open transaction. If the database is locked or busy (e.g. another process writes to it), the transaction is rolled back and all pending batches are inserted again, up to max_retries times. Other errors are raised.
+        """
+        attempt = 0
+        while True:
+            try:
+                for rows in batches:
+                    cursor.executemany(self.insert_sql, rows)
+                return
+            except sqlite3.OperationalError as e:
+                attempt = self._retry_if_busy(connection, e, attempt)
+                batches = pending
+
+    def _commit(self, connection, cursor, pending):
+        """
+        Commits the open transaction. If the database is locked or busy, the pending batches are inserted again and the commit retried, up to max_retries times. Other errors are raised.
+        """
+        attempt = 0
+        while True:
+            try:
+                connection.commit()
+                return
+            except sqlite3.OperationalError as e:
+                attempt = self._retry_if_busy(connection, e, attempt)
+                self._execute(connection, cursor, pending, pending)
+
+    def _retry_if_busy(self, connection, error, attempt):
+        """
+        Rolls back the transaction (if a connection is given) and waits before a retry if the error is a locked or busy database, raises the error otherwise or after max_retries retries.
+
+        Returns:
+        - int: The number of attempts so far.
+        """
+        message = str(error).lower()
+        attempt += 1
+        if ('locked' not in message and 'busy' not in message) or (attempt > self.max_retries):
+            raise error
+        delay = backoff_delay(attempt, base_delay=0.5, max_delay=10.0)
+        print(f"{error} (retrying in {delay:.1f}s)")
+        if connection is not None:
+            connection.rollback()
+        time.sleep(delay)
+        return attempt
+
+    def _report(self, start_time):
+        """
+        Prints the number of written rows, the writing rate and the queue depth.
+        """
+        elapsed = time.time() - start_time
+        rows_written = self.rows_written.value
+        rate = rows_written / elapsed if elapsed > 0 else 0.0
+        print(
+            f"SQLite writer: {rows_written} rows written "
+            f"| {rate:.0f} rows/sec "
+            f"| queue depth {self.queue_depth()}/{self.queue_size} batches"
+        )
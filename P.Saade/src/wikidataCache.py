@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Text, create_engine, text
+from sqlalchemy import Column, Text, text, bindparam
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.types import TypeDecorator
+from src.sqliteEngine import create_sqlite_engine
 
 import os
 import base64
@@ -18,29 +19,27 @@ class EmbeddingType(TypeDecorator):
     impl = Text
 
     def process_bind_param(self, value, dialect):
-        """Convert a list of floats (embedding) to a Base64 string before storing."""
-        if value is not None and isinstance(value, list):
-            # Convert list to binary
-            binary_data = np.array(value, dtype=np.float32).tobytes()
+        """Convert an embedding (NumPy array, or list of floats) to a Base64 string of float32 before storing."""
+        if value is not None and isinstance(value, (list, np.ndarray)):
+            # No copy for a contiguous float32 array, float16 is upcast
+            binary_data = np.ascontiguousarray(value, dtype=np.float32).tobytes()
             # Encode to Base64 string
             return base64.b64encode(binary_data).decode('utf-8')
         return None
 
     def process_result_value(self, value, dialect):
-        """Convert a Base64 string back to a list of floats when retrieving."""
+        """Convert a Base64 string back to a float32 NumPy array when retrieving."""
         if value is not None:
-            # Decode Base64
-            binary_data = base64.b64decode(value)
-            # Convert back to float32 list
-            embedding_array = np.frombuffer(binary_data, dtype=np.float32)
-            return embedding_array.tolist()
+            # Read-only view on the decoded bytes, no copy
+            return np.frombuffer(base64.b64decode(value), dtype=np.float32)
         return None
 
 def create_cache_embedding_db(
         db_filname="wikidata_cache.db",
-        table_name="wikidata_prototype"
+        table_name="wikidata_prototype",
+        profile=None
     ):
-    """Factory function to create a dynamic CacheEmbeddings model."""
+    """Factory function to create a dynamic CacheEmbeddings model. The profile ('bulk_load' or 'read_serving') sets the SQLite PRAGMAs, see src.sqliteEngine."""
 
     wikidata_cache_dir = os.path.abspath("../data/Wikidata")
     wikidata_cache_path = os.path.join(wikidata_cache_dir, db_filname)
@@ -48,12 +47,7 @@ def create_cache_embedding_db(
     # Safe directory creation if it's missing
     os.makedirs(wikidata_cache_dir, exist_ok=True)
 
-    engine = create_engine(
-        f'sqlite:///{wikidata_cache_path}',
-        pool_size=5,       # Limit the number of open connections
-        max_overflow=10,   # Allow extra connections beyond pool_size
-        pool_recycle=10    # Recycle connections every 10 seconds
-    )
+    engine = create_sqlite_engine(wikidata_cache_path, profile=profile)
 
     Base = declarative_base()
     Session = sessionmaker(bind=engine)
@@ -97,16 +91,45 @@ def create_cache_embedding_db(
                     return cached.embedding
                 return None
 
+        @staticmethod
+        def get_bulk_cache(ids):
+            """
+            Retrieve the cached embeddings of many IDs with one query.
+
+            Parameters:
+            - ids (list[str]): The IDs.
+
+            Returns:
+            - dict: A mapping of {id: np.ndarray} for the cached IDs, each embedding a float32 view.
+            """
+            embeddingtype = EmbeddingType()
+            query = text(
+                f"""
+                SELECT id, embedding FROM {CacheEmbeddings.__tablename__}
+                WHERE id IN :ids
+                """
+            ).bindparams(bindparam('ids', expanding=True))
+
+            found = {}
+            with engine.connect() as connection:
+                # SQLite limits the number of variables of a query (32766)
+                for i in range(0, len(ids), 30000):
+                    rows = connection.execute(query, {'ids': ids[i:i + 30000]})
+                    for id, embedding in rows:
+                        if embedding is not None:
+                            found[id] = embeddingtype.process_result_value(embedding, None)
+            return found
+
         @staticmethod
         def add_bulk_cache(data):
             """
-            Insert multiple label records in bulk. If a record with the same
+            Insert multiple embeddings in bulk. If a record with the same
             ID exists,
             it is ignored (no update is performed).
 
             Parameters:
-            - data (list[dict]): A list of dictionaries, each containing 'id',
-            'labels', 'descriptions', and 'in_wikipedia' keys.
+            - data (list[dict]): A list of dictionaries, each containing 'id'
+            and 'embedding' (np.ndarray, e.g. a row of the embedding matrix) keys.
 
             Returns:
             - bool: True if the operation was successful, False otherwise.
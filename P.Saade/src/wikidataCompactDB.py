@@ -0,0 +1,281 @@
+from sqlalchemy import Column, Text, Integer, text
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import Boolean
+from src.sqliteEngine import create_sqlite_engine
+import json
+
+"""
+Compact SQLite database for Wikidata labels & descriptions.
+
+Entities are keyed by an integer (QIDs as positive and PIDs as negative
+numbers) and labels are stored one row per (id, language), in tables
+WITHOUT ROWID, so that a label in one language is a single index probe
+without decoding the JSON of all the other languages.
+"""
+
+SQLITEDB_PATH = '../data/Wikidata/sqlite_wikidata_compact.db'
+engine = create_sqlite_engine(SQLITEDB_PATH)
+
+Base = declarative_base()
+
+
+class WikidataEntity(Base):
+    """ Represents a Wikidata entity by its integer ID."""
+
+    __tablename__ = 'entity'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    id = Column(Integer, primary_key=True)
+    in_wikipedia = Column(Boolean, default=False)
+
+
+class WikidataLabel(Base):
+    """ Represents the label and description of a Wikidata entity in one language."""
+
+    __tablename__ = 'label'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    id = Column(Integer, primary_key=True)
+    language = Column(Text, primary_key=True)
+    label = Column(Text)
+    description = Column(Text)
+
+    @staticmethod
+    def encode_id(id):
+        """
+        Convert a QID or PID to the integer key of the database.
+
+        Parameters:
+        - id (str): The entity ID (e.g. 'Q42' or 'P31').
+
+        Returns:
+        - int: The QID number, or the negative PID number.
+        """
+        if id[0] == 'Q':
+            return int(id[1:])
+        if id[0] == 'P':
+            return -int(id[1:])
+        raise ValueError(f"Only QIDs and PIDs are supported, got '{id}'")
+
+    @staticmethod
+    def is_supported_id(id):
+        """
+        Check if an entity ID can be stored in the database (QIDs and PIDs).
+
+        Parameters:
+        - id (str): The entity ID.
+
+        Returns:
+        - bool: True if the ID is a QID or PID.
+        """
+        return (len(id) > 1) and (id[0] in 'QP') and id[1:].isdigit()
+
+    @staticmethod
+    def decode_id(key):
+        """
+        Convert an integer key of the database back to a QID or PID.
+
+        Parameters:
+        - key (int): The integer key.
+
+        Returns:
+        - str: The entity ID.
+        """
+        return f"Q{key}" if key > 0 else f"P{-key}"
+
+    @staticmethod
+    def _values_by_language(values):
+        """Accepts labels or descriptions as a dict, a JSON string, or in the dump format ({lang: {'value': ...}})."""
+        if values is None:
+            return {}
+        if isinstance(values, str):
+            values = json.loads(values)
+        return {
+            lang: value['value'] if isinstance(value, dict) else value
+            for lang, value in values.items()
+        }
+
+    @staticmethod
+    def add_bulk_items(data):
+        """
+        Insert multiple entities with their labels and descriptions in bulk. Existing (id, language) rows are ignored (no update is performed), as well as IDs that are not QIDs or PIDs.
+
+        Parameters:
+        - data (list[dict]): A list of dictionaries with an 'id' key, and optionally 'labels', 'descriptions' (dicts or JSON strings) and 'in_wikipedia'. Same format as WikidataItem.add_bulk_items.
+
+        Returns:
+        - bool: True if the operation was successful, False otherwise.
+        """
+        entity_rows = []
+        label_rows = []
+        for item in data:
+            if not WikidataLabel.is_supported_id(item['id']):
+                # e.g. lexemes, which have lemmas instead of labels
+                continue
+
+            key = WikidataLabel.encode_id(item['id'])
+            labels = WikidataLabel._values_by_language(item.get('labels'))
+            descriptions = WikidataLabel._values_by_language(
+                item.get('descriptions')
+            )
+
+            entity_rows.append({
+                'id': key,
+                'in_wikipedia': bool(item.get('in_wikipedia', False))
+            })
+            for lang in set(labels) | set(descriptions):
+                label_rows.append({
+                    'id': key,
+                    'language': lang,
+                    'label': labels.get(lang),
+                    'description': descriptions.get(lang)
+                })
+
+        # Rows in key order are appended to the B-trees instead of
+        # being inserted in the middle of them.
+        entity_rows.sort(key=lambda row: row['id'])
+        label_rows.sort(key=lambda row: (row['id'], row['language']))
+
+        worked = False
+        try:
+            with engine.begin() as connection:
+                if entity_rows:
+                    connection.execute(text(
+                        """
+                        INSERT OR IGNORE INTO entity (id, in_wikipedia)
+                        VALUES (:id, :in_wikipedia)
+                        """
+                    ), entity_rows)
+                if label_rows:
+                    connection.execute(text(
+                        """
+                        INSERT OR IGNORE INTO label (id, language, label, description)
+                        VALUES (:id, :language, :label, :description)
+                        """
+                    ), label_rows)
+            worked = True
+        except Exception as e:
+            print(e)
+
+        return worked
+
+    @staticmethod
+    def _get_value(id, language, column):
+        """Retrieve the label or description of an entity in a language, or in 'mul' if missing."""
+        if not WikidataLabel.is_supported_id(id):
+            return None
+
+        with engine.connect() as connection:
+            rows = connection.execute(text(
+                f"""
+                SELECT language, {column} FROM label
+                WHERE id = :id AND language IN (:language, 'mul')
+                """
+            ), {'id': WikidataLabel.encode_id(id), 'language': language}).all()
+
+        values = {lang: value for lang, value in rows if value is not None}
+        return values.get(language, values.get('mul'))
+
+    @staticmethod
+    def get_label(id, language):
+        """
+        Retrieve the label of an entity in a language.
+
+        Parameters:
+        - id (str): The entity ID.
+        - language (str): The language code.
+
+        Returns:
+        - str or None: The label in the language, else in 'mul', else None.
+        """
+        return WikidataLabel._get_value(id, language, 'label')
+
+    @staticmethod
+    def get_description(id, language):
+        """
+        Retrieve the description of an entity in a language.
+
+        Parameters:
+        - id (str): The entity ID.
+        - language (str): The language code.
+
+        Returns:
+        - str or None: The description in the language, else in 'mul', else None.
+        """
+        return WikidataLabel._get_value(id, language, 'description')
+
+    @staticmethod
+    def get_labels(id):
+        """
+        Retrieve the labels of an entity in all languages, same output as WikidataItem.get_labels.
+
+        Parameters:
+        - id (str): The entity ID.
+
+        Returns:
+        - dict: The labels dictionary if found, otherwise an empty dict.
+        """
+        if not WikidataLabel.is_supported_id(id):
+            return {}
+
+        with engine.connect() as connection:
+            rows = connection.execute(text(
+                "SELECT language, label FROM label WHERE id = :id"
+            ), {'id': WikidataLabel.encode_id(id)}).all()
+
+        return {lang: label for lang, label in rows if label is not None}
+
+    @staticmethod
+    def get_labels_bulk(id_list, language=None):
+        """
+        Retrieve the labels of many entities with a single query, by joining a temporary table of the IDs.
+
+        Parameters:
+        - id_list (list[str]): A list of entity IDs.
+        - language (str or None): If given, only return the label in this language (or in 'mul' if missing).
+
+        Returns:
+        - dict: A mapping of {entity_id: label} if language is given, otherwise {entity_id: labels_dict}. Every requested ID is in the mapping, missing ones with None or an empty dict.
+        """
+        labels = {id: {} for id in id_list}
+        if len(labels) > 0:
+            with engine.begin() as connection:
+                # Temporary tables are private to the connection
+                connection.execute(text(
+                    "CREATE TEMP TABLE IF NOT EXISTS label_ids (id INTEGER PRIMARY KEY)"
+                ))
+                connection.execute(text("DELETE FROM label_ids"))
+                connection.execute(
+                    text("INSERT OR IGNORE INTO label_ids (id) VALUES (:id)"),
+                    [
+                        {'id': WikidataLabel.encode_id(id)}
+                        for id in labels if WikidataLabel.is_supported_id(id)
+                    ]
+                )
+
+                language_filter = ""
+                if language is not None:
+                    language_filter = "WHERE label.language IN (:language, 'mul')"
+                rows = connection.execute(text(
+                    f"""
+                    SELECT label.id, label.language, label.label
+                    FROM label_ids JOIN label ON label.id = label_ids.id
+                    {language_filter}
+                    """
+                ), {'language': language})
+
+                for key, lang, label in rows:
+                    if label is not None:
+                        labels[WikidataLabel.decode_id(key)][lang] = label
+                connection.execute(text("DELETE FROM label_ids"))
+
+        if language is None:
+            return labels
+        return {
+            id: values.get(language, values.get('mul'))
+            for id, values in labels.items()
+        }
+
+
+# Create tables if they don't already exist.
+Base.metadata.create_all(engine)
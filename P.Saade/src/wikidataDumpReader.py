@@ -1,34 +1,120 @@
 import gzip
 import bz2
+import os
+import re
+import zlib
 import orjson
 import time
+from collections import deque
 from tqdm import tqdm
-from multiprocessing import Process, Queue, Value, cpu_count
+from multiprocessing import Pool, Process, Queue, Value, cpu_count
+from multiprocessing.connection import wait
+from queue import Full
+
+# Byte-aligned markers used to find independent compressed streams.
+# A bz2 stream starts with "BZh" + block size digit + the block magic "1AY&SY".
+# A gzip member starts with the ID bytes 0x1f 0x8b followed by CM=8 (deflate).
+BZ2_BLOCK_MAGIC = b'1AY&SY'
+GZIP_MEMBER_MAGIC = b'\x1f\x8b\x08'
+
+# Large top-level keys of an entity, in the order they appear in the dump.
+# Lines can be cut before the first of these keys that isn't needed.
+ENTITY_KEY_ORDER = ('labels', 'descriptions', 'aliases', 'claims', 'sitelinks')
+
+# A sitelink to a wiki, e.g. "site":"enwiki" or "site":"commonswiki"
+SITELINK_WIKI_PATTERN = re.compile(rb'"site":"[^"]*wiki"')
+
+def _try_decompress_piece(extension, piece):
+    """
+    Decompresses a piece like _decompress_piece, returning None instead of raising if it doesn't decode, e.g. when it was cut at a header-like sequence inside a stream.
+
+    Parameters:
+    - extension (str): 'bz2' or 'gz'.
+    - piece (bytes): Compressed data.
+
+    Returns:
+    - bytes or None: The decompressed data, or None if the piece doesn't decode.
+    """
+    try:
+        return _decompress_piece(extension, piece)
+    except (OSError, EOFError, ValueError, zlib.error):
+        return None
+
+def _decompress_piece(extension, piece):
+    """
+    Decompresses a piece of a compressed file made of one or more complete bz2 streams or gzip members.
+
+    Parameters:
+    - extension (str): 'bz2' or 'gz'.
+    - piece (bytes): Compressed data starting and ending on stream boundaries.
+
+    Returns:
+    - bytes: The decompressed data.
+    """
+    output = []
+    while piece:
+        if extension == 'bz2':
+            decompressor = bz2.BZ2Decompressor()
+        else:
+            decompressor = zlib.decompressobj(wbits=31)
+
+        output.append(decompressor.decompress(piece))
+        if not decompressor.eof:
+            raise ValueError("Compressed piece does not end on a stream boundary")
+        piece = decompressor.unused_data
+    return b''.join(output)
 
 class WikidataDumpReader:
     def __init__(
             self, file_path, num_processes=cpu_count()-1,
-            queue_size=1000, skiplines=0):
+            queue_size=1000, skiplines=0, batch_size=1,
+            decompress_processes=0, chunk_size=16*1024*1024,
+            checkpoint_path=None, line_filters=None, id_prefixes=None,
+            keys=None, line_fields=None):
         """
         Initializes the reader with the file path, number of processes, queue size, and number of lines to skip.
 
         Parameters:
         - file_path (str): Path to the dump file.
         - num_processes (int): Number of consumer processes to spawn (default=4).
-        - queue_size (int): Maximum size of the queue (default=1000).
+        - queue_size (int): Maximum number of lines buffered in the queue (default=1000).
         - skiplines (int): Number of lines to skip at the beginning of the file (default=0).
+        - batch_size (int): Number of lines sent through the queue in a single put (default=1). Larger batches reduce pickling and lock overhead on large dumps.
+        - decompress_processes (int): Number of processes decompressing a multistream .bz2 or multi-member .gz file in parallel. 0 keeps the single process decompression (default=0).
+        - chunk_size (int): Approximate number of (compressed) bytes handed to a decompression process at once, and the spacing between two checkpoints (default=16MB).
+        - checkpoint_path (str or None): Path to a checkpoint file. While reading, (byte offset, line number) pairs are appended to it, and runs with skiplines start from the nearest checkpoint instead of reading through the skipped lines (default=None).
+        - line_filters (list or None): Pre-filters applied to the raw line before parsing. A str or bytes must appear in the line, a callable takes the raw line (bytes) and returns False to skip it. Filters only need to be necessary conditions, the handler still receives the full entity (default=None).
+        - id_prefixes (tuple or None): Only parse lines whose entity ID starts with one of these prefixes, e.g. ('Q',) for items only (default=None).
+        - keys (list or None): Top-level keys to keep in the parsed entity, e.g. ['id', 'labels', 'descriptions']. Lines are cut before the first unneeded large key (labels, descriptions, aliases, claims, sitelinks) so it isn't parsed at all (default=None, keep everything).
+        - line_fields (dict or None): Fields computed from the raw line (bytes) and added to the parsed entity, e.g. {'in_wikipedia': WikidataDumpReader.has_wikipedia_sitelink}. Lets keys leave out a large key that is only needed for a flag (default=None).
         """
         self.file_path = file_path
         self.extension = file_path.split(".")[-1]
         self.num_processes = num_processes
         self.skiplines = skiplines
+        self.batch_size = max(1, batch_size)
+        self.decompress_processes = decompress_processes
+        self.chunk_size = chunk_size
+        self.checkpoint_path = checkpoint_path
+
+        # Pre-filtering and projection
+        self.line_filters = [
+            f.encode('utf-8') if isinstance(f, str) else f
+            for f in (line_filters or [])
+        ]
+        self.id_prefixes = tuple(id_prefixes) if id_prefixes else None
+        self.keys = list(keys) if keys is not None else None
+        self.cut_marker = self._get_cut_marker(self.keys)
+        self.line_fields = dict(line_fields or {})
 
         # Multiprocessing Variables:
-        # - queue: This queue is shared across all processes
+        # - queue: This queue is shared across all processes and holds lists of lines
         # - finished: 0 => not finished, 1 => finished
+        # - stopped: 1 => the producer or a consumer stopped on an error
         # - iterations: a counter for how many entities have been processed
-        self.queue = Queue(maxsize=queue_size)
+        self.queue = Queue(maxsize=max(1, queue_size // self.batch_size))
         self.finished = Value('i', 0)
+        self.stopped = Value('i', 0)
         self.iterations = Value('i', 0)
 
     def line_to_entity(self, line):
@@ -36,23 +122,142 @@ class WikidataDumpReader:
         Converts a single line of text into a Wikidata entity (a dictionary).
 
         Parameters:
-        - line (str): A single line representing a Wikidata entity in JSON format.
+        - line (str or bytes): A single line representing a Wikidata entity in JSON format.
 
         Returns:
-        - dict or None: The parsed entity if valid JSON, or None if empty or malformed.
+        - dict or None: The parsed entity if valid JSON, or None if empty, malformed, or skipped by the pre-filters.
         """
-        line = line.strip("[] ,\n")
+        if isinstance(line, bytes):
+            line = line.strip(b"[] ,\n")
+        else:
+            line = line.strip("[] ,\n").encode('utf-8')
         if not line:
             return None
 
+        if not self.matches_filters(line):
+            return None
+
         try:
-            entity = orjson.loads(line)
-            return entity
+            if self.keys is None:
+                entity = orjson.loads(line)
+            else:
+                entity = self._parse_projection(line)
         except ValueError as e:
             print("Failed to parse JSON:", e)
             return None
 
-    def run(self, handler_func, max_iterations=None, verbose=True):
+        for name, line_field in self.line_fields.items():
+            entity[name] = line_field(line)
+        return entity
+
+    def matches_filters(self, line):
+        """
+        Checks a raw line against the pre-filters without parsing it.
+
+        Parameters:
+        - line (bytes): A single line representing a Wikidata entity in JSON format.
+
+        Returns:
+        - bool: False if the line can't match the filters and should be skipped.
+        """
+        if self.id_prefixes is not None:
+            entity_id = WikidataDumpReader.line_id(line)
+            if (entity_id is None) or not entity_id.startswith(self.id_prefixes):
+                return False
+
+        for line_filter in self.line_filters:
+            if isinstance(line_filter, bytes):
+                if line_filter not in line:
+                    return False
+            elif not line_filter(line):
+                return False
+        return True
+
+    @staticmethod
+    def has_wikipedia_sitelink(line):
+        """
+        Checks a raw line for a sitelink to a wiki (site ID ending with "wiki", like src.wikidataEntityFields.is_in_wikipedia) without parsing it. The "site" key only appears in sitelinks, and quotes in string values are escaped.
+
+        Parameters:
+        - line (bytes): A single line representing a Wikidata entity in JSON format.
+
+        Returns:
+        - bool: True if the entity has such a sitelink.
+        """
+        return SITELINK_WIKI_PATTERN.search(line) is not None
+
+    @staticmethod
+    def line_id(line):
+        """
+        Extracts the entity ID from a raw line without parsing it. The top-level ID comes right after the entity type, before any nested "id" key.
+
+        Parameters:
+        - line (bytes): A single line representing a Wikidata entity in JSON format.
+
+        Returns:
+        - str or None: The entity ID (e.g. 'Q42'), or None if not found.
+        """
+        start = line.find(b'"id":"')
+        if start == -1:
+            return None
+        start += 6
+        end = line.find(b'"', start)
+        return line[start:end].decode('utf-8')
+
+    @staticmethod
+    def _get_cut_marker(keys):
+        """
+        Finds where lines can be cut when only some top-level keys are needed.
+
+        Parameters:
+        - keys (list or None): Top-level keys to keep.
+
+        Returns:
+        - bytes or None: The marker of the first large key that isn't needed, or None if the whole line must be parsed.
+        """
+        if keys is None:
+            return None
+
+        # Small keys after the large ones (pageid, lastrevid, ...) need the whole line
+        if set(keys) - {'type', 'id'} - set(ENTITY_KEY_ORDER):
+            return None
+
+        last = max(
+            [ENTITY_KEY_ORDER.index(k) for k in keys if k in ENTITY_KEY_ORDER],
+            default=-1
+        )
+        if last + 1 >= len(ENTITY_KEY_ORDER):
+            return None
+        return f',"{ENTITY_KEY_ORDER[last + 1]}":'.encode('utf-8')
+
+    def _parse_projection(self, line):
+        """
+        Parses only the needed part of a line and keeps the selected top-level keys. Falls back to parsing the whole line if a key is missing from the cut line.
+
+        Parameters:
+        - line (bytes): A single stripped line representing a Wikidata entity in JSON format.
+
+        Returns:
+        - dict: The entity restricted to self.keys.
+        """
+        entity = None
+        if self.cut_marker is not None:
+            cut = line.find(self.cut_marker)
+            if cut != -1:
+                try:
+                    entity = orjson.loads(line[:cut] + b'}')
+                except ValueError:
+                    entity = None
+                if (entity is not None) and not all(k in entity for k in self.keys):
+                    entity = None
+
+        if entity is None:
+            entity = orjson.loads(line)
+        return {k: entity[k] for k in self.keys if k in entity}
+
+    def run(
+            self, handler_func, max_iterations=None, verbose=True,
+            start_offset=None, end_offset=None):
         """
         Starts processing using a producer-consumer model with multiprocessing.
 
@@ -65,10 +270,59 @@ class WikidataDumpReader:
         - handler_func (callable): A function that takes a parsed entity (dict) as input.
         - max_iterations (int or None): Stop after this many lines (if not None).
         - verbose (bool): If True, spawns a reporter process to print stats.
+        - start_offset (int or None): Byte offset in the file where reading starts. Only lines starting at or after this offset are processed. Compressed files must be multistream, and the offset is moved to the next stream boundary (default=None, start of the file or nearest checkpoint).
+        - end_offset (int or None): Byte offset in the file where reading stops. Only lines starting before this offset are processed, so shards [start_offset, end_offset) of the same file never overlap (default=None, end of the file).
+        """
+        self._run(
+            self._consumer, (handler_func,),
+            max_iterations, verbose, start_offset, end_offset
+        )
+
+    def run_batched(
+            self, batch_handler, batch_size=1000, max_iterations=None,
+            verbose=True, start_offset=None, end_offset=None,
+            finish_handler=None):
+        """
+        Same as run, but each consumer process gathers the parsed entities in a local list and passes them to batch_handler once batch_size entities are collected. The handler runs inside the consumer process, so it can keep its own per-process sink (e.g. a SQLite connection or an output file) without sharing data across processes.
+
+        Parameters:
+        - batch_handler (callable): A function that takes a list of parsed entities (dicts) as input. It's called one last time with the remaining entities when a consumer finishes.
+        - batch_size (int): Number of entities passed to batch_handler at once (default=1000).
+        - max_iterations (int or None): Stop after this many lines (if not None).
+        - verbose (bool): If True, spawns a reporter process to print stats.
+        - start_offset (int or None): Byte offset in the file where reading starts.
+        - end_offset (int or None): Byte offset in the file where reading stops.
+        - finish_handler (callable or None): A function without arguments called once in each consumer process after its last batch (e.g. to close a per-process output file).
         """
-        producer_p = Process(target=self._producer, args=(max_iterations,))
+        self._run(
+            self._batch_consumer, (batch_handler, batch_size, finish_handler),
+            max_iterations, verbose, start_offset, end_offset
+        )
+
+    def _run(
+            self, consumer_func, consumer_args, max_iterations, verbose,
+            start_offset, end_offset):
+        """
+        Spawns the producer, consumer and reporter processes and waits for them to finish.
+
+        Parameters:
+        - consumer_func (callable): The consumer loop run by each consumer process.
+        - consumer_args (tuple): Arguments passed to consumer_func.
+        - max_iterations (int or None): Stop after this many lines (if not None).
+        - verbose (bool): If True, spawns a reporter process to print stats.
+        - start_offset (int or None): Byte offset in the file where reading starts.
+        - end_offset (int or None): Byte offset in the file where reading stops.
+
+        Raises:
+        - RuntimeError: If the producer or a consumer process stopped on an error (e.g. the SQLite writer the consumers send their rows to stopped). The other processes are stopped too.
+        """
+        self.stopped.value = 0
+        producer_p = Process(
+            target=self._producer,
+            args=(max_iterations, start_offset, end_offset)
+        )
         consumer_ps = [
-            Process(target=self._consumer, args=(handler_func,))
+            Process(target=consumer_func, args=consumer_args)
             for _ in range(self.num_processes)
         ]
 
@@ -83,13 +337,23 @@ class WikidataDumpReader:
         if reporter_p:
             reporter_p.start()
 
-        producer_p.join()
-        for cp in consumer_ps:
-            cp.join()
+        # A consumer that stopped no longer empties the queue, and the
+        # producer would block on it: the processes are watched until they
+        # all exit, and the others stop as soon as one fails.
+        processes = [producer_p] + consumer_ps
+        running = processes
+        while running:
+            wait([p.sentinel for p in running], timeout=1)
+            if any(p.exitcode not in (None, 0) for p in processes):
+                self.stopped.value = 1
+            running = [p for p in running if p.is_alive()]
 
         if reporter_p:
             reporter_p.join()
 
+        if self.stopped.value == 1:
+            raise RuntimeError("The dump reader stopped: a producer or consumer process failed")
+
     def _reporter(self, print_per_s=3):
         """
         Reports overall progress and total memory usage every few seconds, until the producer has finished and the queue is empty.
@@ -110,6 +374,8 @@ class WikidataDumpReader:
                 # If finished and queue empty, exit
                 if self.finished.value == 1 and self.queue.empty():
                     break
+                if self.stopped.value == 1:
+                    break
 
                 elapsed = time.time() - start_time
                 rate = items_processed / elapsed if elapsed > 0 else 0.0
@@ -130,99 +396,211 @@ class WikidataDumpReader:
             # Final update to ensure progress bar is complete
             pbar.update(items_processed - pbar.n)
 
-    def _producer(self, max_iterations):
+    def _producer(self, max_iterations, start_offset=None, end_offset=None):
         """
-        Reads lines from the file (plain or compressed) and puts them into the queue. Once done (or if max_iterations is reached), marks 'finished' as 1.
+        Reads lines from the file (plain or compressed) and puts them into the queue in batches of self.batch_size lines. Once done (or if max_iterations is reached), marks 'finished' as 1.
 
         Parameters:
         - max_iterations (int or None): If not None, stop reading after this many lines.
+        - start_offset (int or None): Byte offset where reading starts.
+        - end_offset (int or None): Byte offset where reading stops.
         """
         with self.finished.get_lock():
             self.finished.value = 0  # not finished
 
         iters = 0
         if self.extension == 'json':
-            lines_gen = self._read_jsonfile()
+            lines_gen = self._read_jsonfile(start_offset, end_offset)
         elif self.extension in ['gz', 'bz2']:
-            lines_gen = self._read_zipfile()
+            lines_gen = self._read_zipfile(start_offset, end_offset)
         else:
             raise ValueError(f"File extension '{self.extension}' is not supported")
 
-        # total=total_lines, 
-        # with tqdm(desc="Reading lines") as pbar:
+        batch = []
         for line in lines_gen:
-            self.queue.put(line)
+            batch.append(line)
             iters += 1
-            # pbar.update(1)  # Update progress bar
+
+            if len(batch) >= self.batch_size:
+                if not self._put_batch(batch):
+                    break
+                batch = []
 
             if max_iterations and iters >= max_iterations:
                 break
 
+        # Push the remaining lines of the last incomplete batch
+        if batch:
+            self._put_batch(batch)
+
+        if self.stopped.value == 1:
+            # Nobody reads the batches left in the queue, don't wait for
+            # them to be flushed on exit
+            self.queue.cancel_join_thread()
+
         with self.finished.get_lock():
             self.finished.value = 1 # Mark as finished
 
+    def _put_batch(self, batch):
+        """
+        Puts a batch of lines in the queue, blocking while it's full unless the processes are stopped.
+
+        Parameters:
+        - batch (list): The lines.
+
+        Returns:
+        - bool: True if the batch was queued, False if the processes were stopped.
+        """
+        while self.stopped.value == 0:
+            try:
+                self.queue.put(batch, timeout=1)
+                return True
+            except Full:
+                continue
+        return False
+
     def _consumer(self, handler_func):
         """
-        Consumes lines from the queue, parses JSON, then invokes handler_func with the entity. Exits when 'finished' is set and the queue is empty.
+        Consumes batches of lines from the queue, parses JSON, then invokes handler_func with each entity. The shared counter is updated once per batch. Exits when 'finished' is set and the queue is empty.
 
         Parameters:
         - handler_func (callable): A function that takes a parsed entity (dict) as input.
         """
+        for batch in self._queued_batches():
+            processed = 0
+            for line in batch:
+                if line:
+                    entity = self.line_to_entity(line)
+                    if entity is not None:
+                        handler_func(entity)
+                    processed += 1
+
+            with self.iterations.get_lock():
+                self.iterations.value += processed
+
+    def _batch_consumer(self, batch_handler, batch_size, finish_handler=None):
+        """
+        Consumes batches of lines from the queue, parses JSON, and gathers the entities in a local list that is passed to batch_handler every batch_size entities. Exits when 'finished' is set and the queue is empty.
+
+        Parameters:
+        - batch_handler (callable): A function that takes a list of parsed entities (dicts) as input.
+        - batch_size (int): Number of entities passed to batch_handler at once.
+        - finish_handler (callable or None): A function without arguments called once after the last batch.
+        """
+        entities = []
+        for batch in self._queued_batches():
+            processed = 0
+            for line in batch:
+                if line:
+                    entity = self.line_to_entity(line)
+                    if entity is not None:
+                        entities.append(entity)
+                    processed += 1
+
+                if len(entities) >= batch_size:
+                    batch_handler(entities)
+                    entities = []
+
+            with self.iterations.get_lock():
+                self.iterations.value += processed
+
+        if entities:
+            batch_handler(entities)
+
+        if finish_handler is not None:
+            finish_handler()
+
+    def _queued_batches(self):
+        """
+        Yields batches of lines from the queue until 'finished' is set and the queue is empty, or until the processes are stopped.
+
+        Returns:
+        - Iterator[list]: An iterator over the batches of lines put by the producer.
+        """
         while True:
             # If we are finished and the queue is empty, exit
             if self.finished.value == 1 and self.queue.empty():
                 break
+            if self.stopped.value == 1:
+                break
 
             try:
-                line = self.queue.get(timeout=1)
+                batch = self.queue.get(timeout=1)
             except Exception:
                 # Usually queue.Empty, can wait for more data unless finished
                 continue
 
-            if line:
-                entity = self.line_to_entity(line)
-                if entity is not None:
-                    handler_func(entity)
+            yield batch
 
-                with self.iterations.get_lock():
-                    self.iterations.value += 1
-
-    def _read_jsonfile(self):
+    def _read_jsonfile(self, start_offset=None, end_offset=None):
         """
         Yields lines from a .json file, skipping self.skiplines lines 
             at the start.
 
+        Parameters:
+        - start_offset (int or None): Byte offset where reading starts.
+        - end_offset (int or None): Byte offset where reading stops.
+
         Returns:
-        - Iterator[str]: An iterator over lines from the JSON file.
+        - Iterator[bytes]: An iterator over lines from the JSON file.
         """
-        file = None
-        try:
-            file = open(self.file_path, mode="r", encoding="utf-8")
-            # Skip lines if requested
-            for _ in tqdm(range(self.skiplines), desc="Skipping lines"):
-                file.readline()
+        offset, line_number, skip = self._resolve_start(start_offset)
+
+        with open(self.file_path, mode="rb") as file:
+            # Only lines starting at or after the offset are read
+            if offset > 0:
+                file.seek(offset - 1)
+                if file.read(1) != b'\n':
+                    offset += len(file.readline())
 
+            next_checkpoint = offset
             for line in file:
-                if not line:
+                if (end_offset is not None) and (offset >= end_offset):
                     break
+
+                if (line_number is not None) and (offset >= next_checkpoint):
+                    self._write_checkpoint(offset, line_number)
+                    next_checkpoint = offset + self.chunk_size
+
+                offset += len(line)
+                if line_number is not None:
+                    line_number += 1
+
+                if skip > 0:
+                    skip -= 1
+                    continue
                 yield line
-        finally:
-            if file:
-                file.close()
 
-    def _read_zipfile(self):
+    def _read_zipfile(self, start_offset=None, end_offset=None):
         """
         Yields lines from a .gz or .bz2 file, skipping self.skiplines lines at the start.
+        Multistream files are read piece by piece when decompressing in parallel, seeking to a byte offset, or recording checkpoints.
+
+        Parameters:
+        - start_offset (int or None): Byte offset where reading starts.
+        - end_offset (int or None): Byte offset where reading stops.
 
         Returns:
-        - Iterator[str]: An iterator over lines from the compressed file.
+        - Iterator[bytes]: An iterator over lines from the compressed file.
         """
+        seeking = (start_offset is not None) or (end_offset is not None)
+        use_pieces = (
+            (self.decompress_processes > 0) or seeking
+            or (self.checkpoint_path is not None)
+        )
+        if use_pieces and self._is_multistream():
+            yield from self._read_zipfile_pieces(start_offset, end_offset)
+            return
+
+        if seeking:
+            raise ValueError("Byte offsets require a multistream .bz2 or multi-member .gz file")
+
         file = None
         try:
             if self.extension == 'gz':
-                file = gzip.open(self.file_path, mode="rt", encoding="utf-8")
+                file = gzip.open(self.file_path, mode="rb")
             elif self.extension == 'bz2':
-                file = bz2.open(self.file_path, mode="rt", encoding="utf-8")
+                file = bz2.open(self.file_path, mode="rb")
             else:
                 raise ValueError(f"Unsupported extension '{self.extension}'")
 
@@ -236,3 +614,382 @@ class WikidataDumpReader:
         finally:
             if file:
                 file.close()
+
+    def _read_zipfile_pieces(self, start_offset=None, end_offset=None):
+        """
+        Yields lines from a multistream .bz2 or multi-member .gz file. The compressed pieces are decompressed (in parallel if decompress_processes is set), then re-split on line boundaries in order, skipping self.skiplines lines at the start.
+        A line belongs to the piece where it starts: a partial line at start_offset is dropped, and the last line before end_offset is completed from the following stream.
+
+        Parameters:
+        - start_offset (int or None): Byte offset where reading starts.
+        - end_offset (int or None): Byte offset where reading stops.
+
+        Returns:
+        - Iterator[bytes]: An iterator over lines from the compressed file.
+        """
+        offset, line_number, skip = self._resolve_start(start_offset)
+        offset = self._next_stream_start(offset)
+        end = self._next_stream_start(end_offset) if end_offset is not None else None
+
+        discard_head = (offset > 0) and not self._previous_stream_ends_line(offset)
+        remainder = b''
+        lines = []
+
+        for piece_offset, data in self._decompressed_pieces(offset, end):
+            if (line_number is not None) and not discard_head:
+                # The line in remainder started in the previous piece
+                self._write_checkpoint(
+                    piece_offset,
+                    line_number + (1 if remainder else 0)
+                )
+
+            data = remainder + data
+            if discard_head:
+                index = data.find(b'\n')
+                if index == -1:
+                    remainder = b''
+                    continue
+                data = data[index+1:]
+                discard_head = False
+
+            lines = data.split(b'\n')
+            remainder = lines.pop()
+
+            for line in lines:
+                if line_number is not None:
+                    line_number += 1
+                if skip > 0:
+                    skip -= 1
+                    continue
+                yield line
+
+        if discard_head or not remainder:
+            return
+
+        # Complete the last line of the shard from the streams after it
+        if end is not None:
+            for _, data in self._decompressed_pieces(end, None, parallel=False):
+                index = data.find(b'\n')
+                if index != -1:
+                    remainder += data[:index]
+                    break
+                remainder += data
+
+        if skip == 0:
+            yield remainder
+
+    def _resolve_start(self, start_offset):
+        """
+        Finds where reading starts and how many lines are left to skip from there.
+
+        Parameters:
+        - start_offset (int or None): Explicit byte offset, or None to use the nearest checkpoint.
+
+        Returns:
+        - tuple: (byte offset, line number at that offset or None if unknown, number of lines to skip)
+        """
+        if start_offset is not None:
+            # The line number is unknown when seeking to an arbitrary offset,
+            # so skiplines are relative to the offset
+            line_number = 0 if start_offset == 0 else None
+            return start_offset, line_number, self.skiplines
+
+        offset, line_number = self._nearest_checkpoint(self.skiplines)
+        return offset, line_number, self.skiplines - line_number
+
+    def _nearest_checkpoint(self, line):
+        """
+        Finds the last checkpoint at or before the given line.
+
+        Parameters:
+        - line (int): Line number to reach.
+
+        Returns:
+        - tuple: (byte offset, line number) of the checkpoint, (0, 0) if there's none.
+        """
+        best = (0, 0)
+        if (self.checkpoint_path is None) or not os.path.exists(self.checkpoint_path):
+            return best
+
+        with open(self.checkpoint_path, mode="r") as file:
+            for row in file:
+                offset, line_number = (int(x) for x in row.split())
+                if best[1] < line_number <= line:
+                    best = (offset, line_number)
+        return best
+
+    def _write_checkpoint(self, offset, line_number):
+        """
+        Appends a (byte offset, line number) pair to the checkpoint file.
+
+        Parameters:
+        - offset (int): Byte offset in the file where the line starts (a stream boundary for compressed files).
+        - line_number (int): Number of the first line starting at the offset.
+        """
+        if self.checkpoint_path is None:
+            return
+
+        with open(self.checkpoint_path, mode="a") as file:
+            file.write(f"{offset} {line_number}\n")
+
+    def _is_stream_start(self, buffer, pos):
+        """
+        Checks if a bz2 stream or gzip member starts at the given offset of the buffer.
+
+        Parameters:
+        - buffer (bytes): Raw compressed data.
+        - pos (int): Offset in the buffer.
+
+        Returns:
+        - bool: True if a stream starts at this offset.
+        """
+        if self.extension == 'bz2':
+            return (
+                buffer.startswith(b'BZh', pos)
+                and (len(buffer) > pos + 3)
+                and (0x31 <= buffer[pos+3] <= 0x39)
+                and buffer.startswith(BZ2_BLOCK_MAGIC, pos + 4)
+            )
+        return self._is_gzip_member(buffer, pos)
+
+    def _find_stream_start(self, buffer, last=False):
+        """
+        Finds the offset of the first or last bz2 stream or gzip member header in a buffer. When searching for the last one, a header at offset 0 is ignored.
+
+        Parameters:
+        - buffer (bytes): Raw compressed data.
+        - last (bool): If True, return the last stream start instead of the first.
+
+        Returns:
+        - int or None: The offset of the stream start, or None if there's none.
+        """
+        if self.extension == 'bz2':
+            magic, shift = BZ2_BLOCK_MAGIC, 4
+        else:
+            magic, shift = GZIP_MEMBER_MAGIC, 0
+
+        if last:
+            pos = buffer.rfind(magic)
+            while pos > shift:
+                if self._is_stream_start(buffer, pos - shift):
+                    return pos - shift
+                pos = buffer.rfind(magic, 0, pos)
+        else:
+            pos = buffer.find(magic, shift)
+            while pos != -1:
+                if self._is_stream_start(buffer, pos - shift):
+                    return pos - shift
+                pos = buffer.find(magic, pos + 1)
+        return None
+
+    def _is_gzip_member(self, buffer, pos):
+        """
+        Checks that a gzip magic number found in the data is an actual member header and not a coincidence inside the deflate stream.
+
+        Parameters:
+        - buffer (bytes): Raw compressed data.
+        - pos (int): Offset of the magic number.
+
+        Returns:
+        - bool: True if a member can be decompressed from this offset.
+        """
+        header = buffer[pos:pos+10]
+        if (len(header) < 10) or (not header.startswith(GZIP_MEMBER_MAGIC)) \
+                or (header[3] & 0xE0) or (header[8] not in (0, 2, 4)):
+            return False
+        try:
+            zlib.decompressobj(wbits=31).decompress(buffer[pos:pos+65536], 1024)
+        except zlib.error:
+            return False
+        return True
+
+    def _is_multistream(self):
+        """
+        Checks if the compressed file is made of several streams, which is required to decompress it in parallel or to seek in it.
+        A header-like sequence inside the first stream isn't enough: the first stream is decompressed, and a second stream must start right where it ends, within the first chunk.
+
+        Returns:
+        - bool: True if the file can be split on stream boundaries.
+        """
+        with open(self.file_path, mode="rb") as file:
+            head = file.read(self.chunk_size)
+
+        end = self._first_stream_end(head)
+        if (end is not None) and self._is_stream_start(head, end):
+            return True
+
+        print("Single-stream file (or first stream larger than chunk_size), falling back to sequential decompression")
+        return False
+
+    def _first_stream_end(self, buffer, step=65536):
+        """
+        Decompresses the first bz2 stream or gzip member of a buffer, discarding the output, to find where it ends.
+
+        Parameters:
+        - buffer (bytes): Raw compressed data starting with a stream.
+        - step (int): Number of compressed bytes decompressed at once (default=64KB).
+
+        Returns:
+        - int or None: The offset right after the first stream, or None if it doesn't end in the buffer or doesn't decode.
+        """
+        if self.extension == 'bz2':
+            decompressor = bz2.BZ2Decompressor()
+        else:
+            decompressor = zlib.decompressobj(wbits=31)
+
+        try:
+            for pos in range(0, len(buffer), step):
+                data = buffer[pos:pos+step]
+                decompressor.decompress(data)
+                if decompressor.eof:
+                    return pos + len(data) - len(decompressor.unused_data)
+        except (OSError, EOFError, zlib.error):
+            return None
+        return None
+
+    def _next_stream_start(self, offset):
+        """
+        Finds the first stream boundary at or after a byte offset.
+
+        Parameters:
+        - offset (int): Byte offset in the compressed file.
+
+        Returns:
+        - int: The offset of the next stream start, or the file size if there's none.
+        """
+        if offset <= 0:
+            return 0
+
+        buffer = b''
+        with open(self.file_path, mode="rb") as file:
+            file.seek(offset)
+            while True:
+                data = file.read(self.chunk_size)
+                buffer += data
+                start = self._find_stream_start(buffer)
+                if start is not None:
+                    return offset + start
+                if not data:
+                    return offset + len(buffer)
+
+    def _previous_stream_ends_line(self, offset):
+        """
+        Decompresses the stream right before a stream boundary to check whether the boundary is also a line boundary.
+
+        Parameters:
+        - offset (int): Byte offset of a stream start.
+
+        Returns:
+        - bool: True if the data before the offset ends with a newline.
+        """
+        window = self.chunk_size
+        with open(self.file_path, mode="rb") as file:
+            while True:
+                begin = max(0, offset - window)
+                file.seek(begin)
+                buffer = file.read(offset - begin)
+
+                start = self._find_stream_start(buffer, last=True)
+                if (start is None) and (begin == 0):
+                    start = 0
+                if start is not None:
+                    data = _decompress_piece(self.extension, buffer[start:])
+                    return data.endswith(b'\n')
+                window *= 2
+
+    def _compressed_pieces(self, start_offset=0, end_offset=None):
+        """
+        Reads the raw compressed file and yields pieces of roughly chunk_size bytes that start and end on stream boundaries.
+
+        Parameters:
+        - start_offset (int): Stream boundary where reading starts.
+        - end_offset (int or None): Stream boundary where reading stops.
+
+        Returns:
+        - Iterator[tuple]: An iterator over (byte offset, compressed piece) pairs.
+        """
+        buffer = b''
+        buffer_offset = start_offset
+        pos = start_offset
+        with open(self.file_path, mode="rb") as file:
+            file.seek(start_offset)
+            while True:
+                size = self.chunk_size
+                if end_offset is not None:
+                    size = min(size, end_offset - pos)
+                if size <= 0:
+                    break
+
+                data = file.read(size)
+                if not data:
+                    break
+                pos += len(data)
+
+                buffer += data
+                cut = self._find_stream_start(buffer, last=True)
+                if cut is not None:
+                    yield buffer_offset, buffer[:cut]
+                    buffer_offset += cut
+                    buffer = buffer[cut:]
+
+        if buffer:
+            yield buffer_offset, buffer
+
+    def _decompressed_pieces(self, start_offset=0, end_offset=None, parallel=True):
+        """
+        Decompresses the pieces of the file in order, using a pool of decompress_processes processes if set.
+
+        Parameters:
+        - start_offset (int): Stream boundary where reading starts.
+        - end_offset (int or None): Stream boundary where reading stops.
+        - parallel (bool): If False, decompress in the current process.
+
+        Returns:
+        - Iterator[tuple]: An iterator over (byte offset, decompressed data) pairs.
+        """
+        # A piece cut at a header-like sequence inside a stream doesn't
+        # decode, it's joined with the next pieces until the stream ends
+        failed = None
+        for offset, piece, data in self._decoded_pieces(start_offset, end_offset, parallel):
+            if failed is not None:
+                offset, piece = failed[0], failed[1] + piece
+                data = _try_decompress_piece(self.extension, piece)
+            if data is None:
+                failed = (offset, piece)
+                continue
+            failed = None
+            yield offset, data
+
+        if failed is not None:
+            # Corrupt or truncated file, raise the decompression error
+            _decompress_piece(self.extension, failed[1])
+
+    def _decoded_pieces(self, start_offset=0, end_offset=None, parallel=True):
+        """
+        Decompresses the pieces of the file in order, see _decompressed_pieces.
+
+        Returns:
+        - Iterator[tuple]: An iterator over (byte offset, compressed piece, decompressed data or None if the piece doesn't decode) triples.
+        """
+        pieces = self._compressed_pieces(start_offset, end_offset)
+        if (not parallel) or (self.decompress_processes <= 0):
+            for offset, piece in pieces:
+                yield offset, piece, _try_decompress_piece(self.extension, piece)
+            return
+
+        # Bound the number of pieces in flight so the file isn't read ahead into memory
+        max_pending = 2 * self.decompress_processes
+        pending = deque()
+
+        with Pool(processes=self.decompress_processes) as pool:
+            for offset, piece in pieces:
+                pending.append((offset, piece, pool.apply_async(
+                    _try_decompress_piece, (self.extension, piece)
+                )))
+                if len(pending) >= max_pending:
+                    offset, piece, result = pending.popleft()
+                    yield offset, piece, result.get()
+
+            while pending:
+                offset, piece, result = pending.popleft()
+                yield offset, piece, result.get()
@@ -1,16 +1,185 @@
-import requests
-import time
+import hashlib
 import json
+import math
 import re
+import sys
 import importlib
 
-from datetime import date, datetime
+from collections import Counter, OrderedDict
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
 from src.wikidataItemDB import WikidataItem
 
+# Version of the texts produced by WikidataTextifier, part of the key of the
+# textified chunk store (src/wikidataTextCache.py). Increase it whenever a
+# change alters the texts, so that the stored chunks are recomputed.
+TEXTIFIER_VERSION = 1
+
+# Wikidata time values, e.g. +1952-03-11T00:00:00Z
+TIME_PATTERN = re.compile(
+    r'([+-])(\d{1,16})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})Z'
+)
+JULIAN_CALENDAR = 'Q1985786'
+# Days between the Julian and Gregorian calendars,
+# i.e. from 1582-10-05 (Julian) to 1582-10-15 (Gregorian)
+JULIAN_TO_GREGORIAN_DAYS = 10
+
+
+def _round_half_up(number):
+    return math.floor(number + 0.5)
+
+
+# Year precisions of the wbformatvalue output (Wikibase MwTimeIsoFormatter):
+# precision -> (message, rounding of the year, divisor, multiplier)
+WBFORMATVALUE_YEAR_PRECISIONS = {
+    8: ('10annum', math.floor, 10, 10),
+    7: ('century', math.ceil, 100, 1),
+    6: ('millennium', math.ceil, 1000, 1),
+    5: ('annum', _round_half_up, 10000, 10000),
+    4: ('annum', _round_half_up, 100000, 100000),
+    3: ('Mannum', _round_half_up, 1000000, 1),
+    2: ('Mannum', _round_half_up, 10000000, 10),
+    1: ('Mannum', _round_half_up, 100000000, 100),
+    0: ('Gannum', _round_half_up, 1000000000, 1),
+}
+
+
+def _era(year, time_variables):
+    return time_variables['AD'] if year > 0 else time_variables['BC']
+
+
+def _year_magnitude_format(divisor, unit_key):
+    """Returns the formatting function of the precisions given in multiples of years (10^4 to 10^9 years)."""
+    return lambda year, month, day, hour, minute, second, tv: (
+        f"{abs(year) // divisor} {tv[unit_key]} {_era(year, tv)}"
+    )
+
+
+# Formatting of a parsed time per Wikidata precision. The functions take the
+# year (int), month name, day (int), hour, minute, second (str) and the
+# time_variables of the language.
+TIME_FORMATS = {
+    14: lambda year, month, day, hour, minute, second, tv: f"{year} {month} {day} {hour}:{minute}:{second}",
+    13: lambda year, month, day, hour, minute, second, tv: f"{year} {month} {day} {hour}:{minute}",
+    12: lambda year, month, day, hour, minute, second, tv: f"{year} {month} {day} {hour}:00",
+    11: lambda year, month, day, hour, minute, second, tv: f"{day} {month} {year}",
+    10: lambda year, month, day, hour, minute, second, tv: f"{month} {year}",
+    9: lambda year, month, day, hour, minute, second, tv: f"{abs(year)}" + ('' if year > 0 else f" {tv['BC']}"),
+    8: lambda year, month, day, hour, minute, second, tv: f"{abs((year // 10) * 10)}{tv['decade']} {_era(year, tv)}",
+    7: lambda year, month, day, hour, minute, second, tv: f"{(abs(year) - 1) // 100 + 1}{tv['century']} {_era(year, tv)}",
+    6: lambda year, month, day, hour, minute, second, tv: f"{(abs(year) - 1) // 1000 + 1}{tv['millennium']} {_era(year, tv)}",
+    5: _year_magnitude_format(10000, 'ten thousand years'),
+    4: _year_magnitude_format(100000, 'hundred thousand years'),
+    3: _year_magnitude_format(1000000, 'million years'),
+    2: _year_magnitude_format(10000000, 'tens of millions of years'),
+    1: _year_magnitude_format(100000000, 'hundred million years'),
+    0: _year_magnitude_format(1000000000, 'billion years'),
+}
+
+class LabelCache:
+    """Bounded LRU cache for values looked up in the SQLite database, with hit/miss statistics.
+
+    The size of the cache is accounted in bytes (estimated with sys.getsizeof on the keys and values) instead of number of entries, since labels vary a lot in length.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        Parameters:
+        - max_bytes (int): Maximum estimated memory used by the cached keys and values. Least recently used entries are evicted beyond it.
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """
+        Retrieves a value and marks it as recently used.
+
+        Parameters:
+        - key (hashable): The cache key.
+
+        Returns:
+        - tuple: (found, value). found is False on a cache miss. Cached values can be None (e.g. an ID missing from the database).
+        """
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entries if the cache exceeds max_bytes.
+
+        Parameters:
+        - key (hashable): The cache key.
+        - value (object): The value to cache.
+        """
+        if key in self.entries:
+            self.bytes -= self._entry_size(key, self.entries.pop(key))
+
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+
+        self.entries[key] = value
+        self.bytes += size
+
+        while self.bytes > self.max_bytes:
+            old_key, old_value = self.entries.popitem(last=False)
+            self.bytes -= self._entry_size(old_key, old_value)
+            self.evictions += 1
+
+    def clear(self):
+        """Removes all entries and resets the statistics."""
+        self.entries.clear()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Returns:
+        - dict: Number of hits, misses and evictions, the hit rate, the number of entries and their estimated size in bytes.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+        }
+
+    @staticmethod
+    def _entry_size(key, value):
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if isinstance(key, tuple):
+            size += sum(sys.getsizeof(k) for k in key)
+        return size
+
+
 class WikidataTextifier:
     """_summary_
     """
-    def __init__(self, language='en', langvar_filename=None):
+    def __init__(self, language='en', langvar_filename=None,
+                 label_cache_bytes=64 * 1024 * 1024,
+                 format_cache_bytes=16 * 1024 * 1024,
+                 compact_labels=False, label_map_path=None):
         """
         Initializes the WikidataTextifier with the specified language.
         Expected use cases: Hugging Face parquet or sqlite database.
@@ -18,9 +187,25 @@ class WikidataTextifier:
         Parameters:
         - language (str): The language code used by the textifier
             Default is "en".
+        - label_cache_bytes (int): Memory budget of the LRU cache in front of the label and description lookups in the SQLite database. 0 disables the cache.
+        - format_cache_bytes (int): Memory budget of the LRU cache of formatted time values, which repeat a lot across entities (birth years, founding dates...). 0 disables the cache.
+        - compact_labels (bool): If True, labels and descriptions missing from the entities are fetched from the compact database (wikidataCompactDB, one row per ID and language) instead of WikidataItem.
+        - label_map_path (str): Path to a label map of the language compiled with src/experimental_functions/compile_label_map.py. If given, labels missing from the entities are read from the memory-mapped file instead of SQLite.
         """
 
         self.language = language
+        self.label_cache = LabelCache(max_bytes=label_cache_bytes)
+        self.format_cache = LabelCache(max_bytes=format_cache_bytes)
+
+        self.compact_label_db = None
+        if compact_labels:
+            from src.wikidataCompactDB import WikidataLabel
+            self.compact_label_db = WikidataLabel
+
+        self.label_map = None
+        if label_map_path is not None:
+            from src.wikidataLabelMap import WikidataLabelMap
+            self.label_map = WikidataLabelMap(label_map_path)
         langvar_filename = (
             langvar_filename if langvar_filename is not None else language
         )
@@ -46,23 +231,20 @@ class WikidataTextifier:
         if (labels is None) or (len(labels) == 0):
             # If the labels are not provided, fetch them from the Wikidata SQLDB
             # TODO: Fetch from the Wikidata API if not found in the SQLDB
-            labels = WikidataItem.get_labels(id)
-
-        if isinstance(labels, str):
-            # If the labels are a string, return them as is
-            return labels
-
-        # Take the label from the language, if missing take it 
-        # from the multiligual class
-
-        label = labels.get(self.language)
-        if label is None:
-            label = labels.get('mul')
-
-        if isinstance(label, dict):
-            label = label.get('value')
+            if self.label_map is not None:
+                # Lookups in the memory-mapped file are cheaper than the cache
+                return self.label_map.get(id)
+
+            found, label = self.label_cache.get(('label', id))
+            if not found:
+                if self.compact_label_db is not None:
+                    label = self.compact_label_db.get_label(id, self.language)
+                else:
+                    label = self._value_in_language(WikidataItem.get_labels(id))
+                self.label_cache.put(('label', id), label)
+            return label
 
-        return label
+        return self._value_in_language(labels)
 
     def get_description(self, id, descriptions=None):
         """Retrieves the description for a Wikidata entity 
@@ -78,22 +260,82 @@ class WikidataTextifier:
         if (descriptions is None) or (len(descriptions) == 0):
             # If the descriptions are not provided, fetch them from the Wikidata SQLDB
             # TODO: Fetch from the Wikidata API if not found in the SQLDB
-            descriptions = WikidataItem.get_descriptions(id)
+            found, description = self.label_cache.get(('description', id))
+            if not found:
+                if self.compact_label_db is not None:
+                    description = self.compact_label_db.get_description(
+                        id, self.language
+                    )
+                else:
+                    description = self._value_in_language(
+                        WikidataItem.get_descriptions(id)
+                    )
+                self.label_cache.put(('description', id), description)
+            return description
 
-        if isinstance(descriptions, str):
-            return descriptions
+        return self._value_in_language(descriptions)
 
+    def _value_in_language(self, values):
+        """Picks the label or description in the textifier language.
 
-        # Take the description from the language,
-        # if missing take it from the multiligual class
-        description = descriptions.get(self.language)
-        if description is None:
-            description = descriptions.get('mul')
+        Args:
+            values (dict or str): Labels or descriptions in all available languages, or a string already in the right language.
 
-        if isinstance(description, dict):
-            description = description.get('value')
+        Returns:
+            str: The value from the specified language or mul[tilingual], None if both are missing.
+        """
+        if isinstance(values, str):
+            # If the values are a string, return them as is
+            return values
 
-        return description
+        # Take the value from the language, if missing take it
+        # from the multiligual class
+        value = values.get(self.language)
+        if value is None:
+            value = values.get('mul')
+
+        if isinstance(value, dict):
+            value = value.get('value')
+
+        return value
+
+    def prewarm_label_cache(self, ids, top_n=None, query_batch=1000):
+        """Fills the label cache with the labels of the given IDs, fetched in batches from the SQLite database.
+
+        Args:
+            ids (Iterable[str] or Counter): IDs to prewarm. A Counter, or an iterable with repeated IDs (e.g. all the property and value IDs of a sample of claims), is ranked by frequency.
+            top_n (int, optional): Only prewarm the top_n most frequent IDs. Defaults to None (all IDs).
+            query_batch (int, optional): Number of IDs fetched per query. Defaults to 1000.
+
+        Returns:
+            int: The number of IDs added to the cache.
+        """
+        if self.label_map is not None:
+            # Labels are read from the label map without the cache
+            return 0
+
+        counts = ids if isinstance(ids, Counter) else Counter(ids)
+        ids = [
+            id for id, _ in counts.most_common(top_n)
+            if ('label', id) not in self.label_cache
+        ]
+
+        for i in range(0, len(ids), query_batch):
+            id_batch = ids[i:i+query_batch]
+            if self.compact_label_db is not None:
+                labels = self.compact_label_db.get_labels_bulk(
+                    id_batch, language=self.language
+                )
+            else:
+                labels = {
+                    id: self._value_in_language(id_labels)
+                    for id, id_labels in WikidataItem.get_labels_bulk(id_batch).items()
+                }
+
+            for id in id_batch:
+                self.label_cache.put(('label', id), labels[id])
+
+        return len(ids)
 
 
     def get_aliases(self, aliases):
@@ -139,20 +381,57 @@ class WikidataTextifier:
             # If properties are not provided, fetch them from the entity
             properties = self.properties_to_dict(entity.claims)
 
-        # Get the label, description, and aliases for the entity
+        header = self._entity_header(entity)
+        return self._merge_entity_text(header, properties)
+
+    def _entity_header(self, entity):
+        """Gets the label, description, and aliases of an entity, the parts of the text that don't depend on the claims.
+
+        Args:
+            entity (obj): A Wikidata entity object.
+
+        Returns:
+            tuple: (label, description, aliases, instanceof). instanceof is the label of P31 if the description is missing, else None.
+        """
         label = self.get_label(entity.id, labels=entity.label)
 
         description = self.get_description(
             entity.id,
             descriptions=entity.description
         )
+        instanceof = None
         if (description is None) or (len(description) == 0):
-            # If the description is missing, try to get it
+            # If the description is missing, it's taken
             # from the `instance_of` property
             instanceof = self.get_label('P31')
-            description = properties.get(instanceof, '')
 
         aliases = self.get_aliases(entity.aliases)
+        return label, description, aliases, instanceof
+
+    def _merge_entity_text(self, header, properties, with_spans=False):
+        """Merges the entity header from _entity_header with a dictionary of properties.
+
+        Args:
+            header (tuple): (label, description, aliases, instanceof) as returned by _entity_header.
+            properties (dict): Properties as returned by properties_to_dict, or a subset of them.
+            with_spans (bool, optional): If True, also returns the span of each property in the text. Only for the language formats declaring a template (see src/entityTemplate.py). Defaults to False.
+
+        Returns:
+            str: The text representation of the entity with the given properties. (text, spans) if with_spans is True.
+        """
+        label, description, aliases, instanceof = header
+        if (description is None) or (len(description) == 0):
+            # If the description is missing, try to get it
+            # from the `instance_of` property
+            description = properties.get(instanceof, '')
+
+        if with_spans:
+            return self.langvar.template.render_with_spans(
+                label,
+                description,
+                aliases,
+                properties
+            )
 
         # Merge the label, description, aliases, and properties into a single
         # text string as the Data Model per language through langvar descriptors
@@ -320,11 +599,30 @@ class WikidataTextifier:
         if unit == '1':
             unit = None
         else:
-            unit_qid = unit.rsplit('/')[-1]
-            unit = self.get_label(unit_qid, quantity_data.get('unit-labels'))
+            unit = self._unit_label(unit, quantity_data.get('unit-labels'))
 
         return quantity + (f" {unit}" if unit else "")
 
+    def _unit_label(self, unit, unit_labels=None):
+        """
+        Label of the unit of a quantity.
+
+        Parameters:
+        - unit (str): The URI of the unit entity (e.g. http://www.wikidata.org/entity/Q11573).
+        - unit_labels (dict, optional): Labels of the unit in all available languages, else looked up in the SQLite database.
+
+        Returns:
+        - str: The label of the unit, or None if it has none.
+        """
+        unit_qid = unit.rsplit('/')[-1]
+        # Units are shared by many values, keep their label in the cache
+        # whether it comes from the claims or from the SQLite database.
+        found, unit_label = self.label_cache.get(('label', unit_qid))
+        if not found:
+            unit_label = self.get_label(unit_qid, unit_labels)
+            self.label_cache.put(('label', unit_qid), unit_label)
+        return unit_label
+
     def time_to_text(self, time_data):
         """
         Converts Wikidata time data into a human-readable string.
@@ -342,121 +640,347 @@ class WikidataTextifier:
         precision = time_data['precision']
         calendarmodel = time_data.get('calendarmodel', 'http://www.wikidata.org/entity/Q1985786')
 
-        # Use regex to parse the time string
-        pattern = r'([+-])(\d{1,16})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})Z'
-        match = re.match(pattern, time_value)
+        key = ('time', time_value, precision, calendarmodel)
+        found, text = self.format_cache.get(key)
+        if not found:
+            text = self._format_time(time_value, precision, calendarmodel)
+            self.format_cache.put(key, text)
+        return text
+
+    def _format_time(self, time_value, precision, calendarmodel):
+        """
+        Formats a Wikidata time value, see time_to_text.
+
+        Parameters:
+        - time_value (str): The time string (e.g. +1952-03-11T00:00:00Z).
+        - precision (int): The Wikidata precision of the time value (0 to 14).
+        - calendarmodel (str): URL of the calendar model.
 
+        Returns:
+        - str: A textual representation of the time with appropriate granularity.
+        """
+        match = TIME_PATTERN.match(time_value)
         if not match:
             raise ValueError("Malformed time string")
 
         sign, year_str, month_str, day_str, hour_str, minute_str, second_str = match.groups()
         year = int(year_str) * (1 if sign == '+' else -1)
+        month = int(month_str) if month_str != '00' else 1
+        day = int(day_str) if day_str != '00' else 1
 
         # Convert Julian to Gregorian if necessary
-        if 'Q1985786' in calendarmodel and year > 1 and len(str(abs(year))) <= 4:  # Julian calendar
+        if (JULIAN_CALENDAR in calendarmodel) and (1 < year < 10000):
             try:
-                month = 1 if month_str == '00' else int(month_str)
-                day = 1 if day_str == '00' else int(day_str)
-                julian_date = date(year, month, day)
-                gregorian_ordinal = julian_date.toordinal() + (datetime(1582, 10, 15).toordinal() - datetime(1582, 10, 5).toordinal())
-                gregorian_date = date.fromordinal(gregorian_ordinal)
+                gregorian_date = date.fromordinal(
+                    date(year, month, day).toordinal() + JULIAN_TO_GREGORIAN_DAYS
+                )
                 year, month, day = gregorian_date.year, gregorian_date.month, gregorian_date.day
             except ValueError:
                 raise ValueError("Invalid date for Julian calendar")
-        else:
-            month = int(month_str) if month_str != '00' else 1
-            day = int(day_str) if day_str != '00' else 1
-
-        month_str = self.langvar.time_variables['months'][month - 1] if month != 0 else ''
-        ad = self.langvar.time_variables['AD']
-        bc = self.langvar.time_variables['BC']
-
-        if precision == 14:
-            return f"{year} {month_str} {day} {hour_str}:{minute_str}:{second_str}"
-        elif precision == 13:
-            return f"{year} {month_str} {day} {hour_str}:{minute_str}"
-        elif precision == 12:
-            return f"{year} {month_str} {day} {hour_str}:00"
-        elif precision == 11:
-            return f"{day} {month_str} {year}"
-        elif precision == 10:
-            return f"{month_str} {year}"
+
+        time_variables = self.langvar.time_variables
+        month_name = time_variables['months'][month - 1]
+
+        time_format = TIME_FORMATS.get(precision)
+        if time_format is None:
+            raise ValueError(f"Unknown precision value {precision}")
+
+        return time_format(
+            year, month_name, day, hour_str, minute_str, second_str,
+            time_variables
+        )
+
+    def data_to_text(self, data, datatype):
+        """
+        Converts specific Wikidata data (time, quantity, globe-coordinate or monolingualtext) into a string. Time and quantity values are formatted as the wbformatvalue endpoint of the Wikidata API does in plain text (full month names, precision messages, unsigned amounts with their ± uncertainty), see src/experimental_functions/wbformatvalue_fixture.py.
+
+        Parameters:
+        - data (dict): The dictionary structure of the datavalue, with or without its 'type' and 'value' wrapper.
+        - datatype (str): The datatype ('time', 'quantity', 'globe-coordinate' or 'monolingualtext').
+
+        Returns:
+        - str: The formatted value.
+        """
+        return self.data_to_texts([(data, datatype)])[0]
+
+    def data_to_texts(self, values):
+        """
+        Batched version of data_to_text. Time and quantity texts are kept in the format cache.
+
+        Parameters:
+        - values (list[tuple]): (data, datatype) pairs as taken by data_to_text.
+
+        Returns:
+        - list[str]: The formatted values, in the same order. Values of other datatypes are returned as strings.
+        """
+        texts = []
+        for data, datatype in values:
+            if isinstance(data, dict) and ('type' in data) and ('value' in data):
+                data = data['value']
+
+            if datatype in ('time', 'quantity'):
+                key = ('wbformatvalue', datatype, json.dumps(data, sort_keys=True))
+                found, text = self.format_cache.get(key)
+                if not found:
+                    if datatype == 'time':
+                        text = self._wbformat_time(data)
+                    else:
+                        text = self._wbformat_quantity(data)
+                    self.format_cache.put(key, text)
+                texts.append(text)
+            elif datatype == 'globe-coordinate':
+                texts.append(self.coordinate_to_text(data))
+            elif datatype == 'monolingualtext':
+                texts.append(data['text'] if isinstance(data, dict) else data)
+            else:
+                texts.append(str(data))
+        return texts
+
+    def _wbformat_time(self, time_data):
+        """
+        Formats a time value as wbformatvalue does: dates in the calendar model they are given in, with full month names, and coarser precisions with the Wikibase precision messages (decade, century, millennium, years).
+
+        Parameters:
+        - time_data (dict): A dictionary containing the time string and precision.
+
+        Returns:
+        - str: The formatted time.
+        """
+        match = TIME_PATTERN.match(time_data['time'])
+        if not match:
+            raise ValueError("Malformed time string")
+
+        sign, year_str, month_str, day_str = match.groups()[:4]
+        year = int(year_str)
+        precision = time_data['precision']
+        variables = self.langvar.wbformatvalue_variables
+
+        if precision >= 10:
+            year_text = self._localize_number(str(year), grouping=False)
+            month = variables['months'][max(int(month_str), 1) - 1]
+            if precision == 10:
+                text = variables['month'].format(month=month, year=year_text)
+            else:
+                day = self._localize_number(str(max(int(day_str), 1)), grouping=False)
+                text = variables['date'].format(day=day, month=month, year=year_text)
         elif precision == 9:
-            era = '' if year > 0 else f' {bc}'
-            return f"{abs(year)}{era}"
-        elif precision == 8:
-            decade = (year // 10) * 10
-            decade_suffix = self.langvar.time_variables['decade']
-            era = ad if year > 0 else bc
-            return f"{abs(decade)}{decade_suffix} {era}"
-        elif precision == 7:
-            century = (abs(year) - 1) // 100 + 1
-            era = ad if year > 0 else bc
-            return f"{century}{self.langvar.time_variables['century']} {era}"
-        elif precision == 6:
-            millennium = (abs(year) - 1) // 1000 + 1
-            era = ad if year > 0 else bc
-            return f"{millennium}{self.langvar.time_variables['millennium']} {era}"
-        elif precision == 5:
-            tens_of_thousands = abs(year) // 10000
-            era = ad if year > 0 else bc
-            return f"{tens_of_thousands} {self.langvar.time_variables['ten thousand years']} {era}"
-        elif precision == 4:
-            hundreds_of_thousands = abs(year) // 100000
-            era = ad if year > 0 else bc
-            return f"{hundreds_of_thousands} {self.langvar.time_variables['hundred thousand years']} {era}"
-        elif precision == 3:
-            millions = abs(year) // 1000000
-            era = ad if year > 0 else bc
-            return f"{millions} {self.langvar.time_variables['million years']} {era}"
-        elif precision == 2:
-            tens_of_millions = abs(year) // 10000000
-            era = ad if year > 0 else bc
-            return f"{tens_of_millions} {self.langvar.time_variables['tens of millions of years']} {era}"
-        elif precision == 1:
-            hundreds_of_millions = abs(year) // 100000000
-            era = ad if year > 0 else bc
-            return f"{hundreds_of_millions} {self.langvar.time_variables['hundred million years']} {era}"
-        elif precision == 0:
-            billions = abs(year) // 1000000000
-            era = ad if year > 0 else bc
-            return f"{billions} {self.langvar.time_variables['billion years']} {era}"
+            text = self._localize_number(str(year), grouping=False)
+        elif precision in WBFORMATVALUE_YEAR_PRECISIONS:
+            message, rounding, divisor, multiplier = WBFORMATVALUE_YEAR_PRECISIONS[precision]
+            number = rounding(year / divisor) * multiplier
+            # Decades, centuries and millennia are not grouped (1950s, not 1,950s)
+            grouping = message in ('annum', 'Mannum', 'Gannum')
+            text = variables[message].format(
+                self._localize_number(str(number), grouping=grouping)
+            )
         else:
             raise ValueError(f"Unknown precision value {precision}")
 
-    def data_to_text(self, data, datatype):
+        if sign == '-':
+            text = variables['BCE'].format(text)
+        return text
+
+    def _wbformat_quantity(self, quantity_data):
         """
-        Converts specific Wikidata data (time or quantity) into a string using the Wikidata API. Ideally, this function should replace "time_to_text" and "quantity_to_text", however it's too slow.
+        Formats a quantity as wbformatvalue does: the amount without its + sign, rounded to the order of magnitude of its uncertainty and followed by ±uncertainty when it has bounds, then the label of its unit.
 
         Parameters:
-        - data (dict): The dictionary structure of the datavalue (time or quantity).
-        - datatype (str): The datatype (usually 'time' or 'quantity').
+        - quantity_data (dict): A dictionary with 'amount', optionally 'upperBound' and 'lowerBound', and 'unit'.
 
         Returns:
-        - str: The formatted value (as returned by the Wikidata API).
+        - str: The formatted quantity (e.g. "1,250±50 metre").
         """
-        while True:
-            try:
-                data = {
-                    'action': 'wbformatvalue',
-                    'format': 'json',
-                    'datavalue': json.dumps(data),
-                    'datatype': datatype,
-                    'uselang': self.langvar.language,
-                    'formatversion': 2
-                }
-                r = requests.get('https://www.wikidata.org/w/api.php', params=data)
-                return r.json()['result']
-            except Exception as e:
-                print(e)
-                while True:
-                    try:
-                        response = requests.get("https://www.google.com", timeout=5)
-                        if response.status_code == 200:
-                            break
-                    except Exception as e:
-                        print("Waiting for internet connection...")
-                        time.sleep(5)
+        amount = Decimal(quantity_data['amount'])
+        margin = Decimal(0)
+        if ('upperBound' in quantity_data) and ('lowerBound' in quantity_data):
+            upper_margin = Decimal(quantity_data['upperBound']) - amount
+            lower_margin = amount - Decimal(quantity_data['lowerBound'])
+            margin = max(upper_margin, lower_margin)
+
+            # The amount is rounded to the closest of its bounds
+            smallest_margin = min(upper_margin, lower_margin)
+            if smallest_margin > 0:
+                exponent = math.floor(smallest_margin.log10())
+                amount = self._round_to_exponent(amount, exponent)
+                margin = self._round_to_exponent(margin, exponent)
+
+        text = self._localize_number(f"{amount:f}")
+        if margin != 0:
+            text += '±' + self._localize_number(f"{margin:f}")
+
+        unit = quantity_data.get('unit', '1')
+        if unit != '1':
+            label = self._unit_label(unit, quantity_data.get('unit-labels'))
+            text += ' ' + (label if label else unit)
+        return text
+
+    @staticmethod
+    def _round_to_exponent(value, exponent):
+        """
+        Rounds a decimal to a power of ten, half away from zero (e.g. 1234.5 to 1230 with exponent 1, to 1234.50 with exponent -2).
+
+        Parameters:
+        - value (Decimal): The value to round.
+        - exponent (int): The power of ten of the last kept digit.
+
+        Returns:
+        - Decimal: The rounded value.
+        """
+        step = Decimal(1).scaleb(exponent)
+        return (value / step).quantize(Decimal(1), rounding=ROUND_HALF_UP) * step
+
+    def _localize_number(self, number, grouping=True):
+        """
+        Formats a number written with '.' decimals (e.g. "-1234.5") with the separators and digits of the language.
+
+        Parameters:
+        - number (str): The number.
+        - grouping (bool): Whether to group the digits of the integer part by thousands.
+
+        Returns:
+        - str: The localized number.
+        """
+        variables = self.langvar.wbformatvalue_variables
+        sign = '-' if number.startswith('-') else ''
+        integer, _, fraction = number.lstrip('+-').partition('.')
+
+        if grouping and len(integer) >= 3 + variables.get('minimum_grouping_digits', 1):
+            groups = []
+            while len(integer) > 3:
+                groups.insert(0, integer[-3:])
+                integer = integer[:-3]
+            integer = variables['thousands_separator'].join([integer] + groups)
+
+        text = sign + integer
+        if fraction:
+            text += variables['decimal_separator'] + fraction
+        return text.translate(str.maketrans('0123456789', variables['digits']))
+
+    def coordinate_to_text(self, coordinate_data):
+        """
+        Converts Wikidata globe coordinates into a human-readable string in degrees, minutes, and seconds, depending on the precision (e.g. 52°31'N, 13°24'E).
+
+        Parameters:
+        - coordinate_data (dict): A dictionary with 'latitude', 'longitude' and optionally 'precision' (in degrees).
+
+        Returns:
+        - str: A textual representation of the coordinates.
+        """
+        if coordinate_data is None:
+            return None
+
+        precision = coordinate_data.get('precision') or 1 / 3600
+        key = (
+            'globe-coordinate',
+            coordinate_data['latitude'],
+            coordinate_data['longitude'],
+            precision
+        )
+        found, text = self.format_cache.get(key)
+        if found:
+            return text
+
+        directions = getattr(
+            self.langvar,
+            'coordinate_variables',
+            {'N': 'N', 'S': 'S', 'E': 'E', 'W': 'W'}
+        )
+        latitude = self._degrees_to_text(coordinate_data['latitude'], precision)
+        longitude = self._degrees_to_text(coordinate_data['longitude'], precision)
+        text = (
+            f"{latitude}{directions['N' if coordinate_data['latitude'] >= 0 else 'S']}, "
+            f"{longitude}{directions['E' if coordinate_data['longitude'] >= 0 else 'W']}"
+        )
+
+        self.format_cache.put(key, text)
+        return text
+
+    @staticmethod
+    def _degrees_to_text(degrees, precision):
+        """
+        Formats an angle in degrees with only the units (degrees, minutes, seconds) that are significant for the precision.
+
+        Parameters:
+        - degrees (float): The angle, its sign is ignored.
+        - precision (float): The precision of the angle in degrees.
+
+        Returns:
+        - str: The formatted angle (e.g. 52°31'12").
+        """
+        degrees = abs(degrees)
+        if precision >= 1:
+            return f"{round(degrees)}°"
+
+        if precision >= 1 / 60:
+            minutes = round(degrees * 60)
+            return f"{minutes // 60}°{minutes % 60}'"
+
+        # Number of decimals of the seconds given by the precision
+        decimals = max(0, math.ceil(-math.log10(precision * 3600) - 1e-9))
+        seconds = round(degrees * 3600, decimals)
+        whole_minutes = int(seconds // 60)
+        seconds = round(seconds - whole_minutes * 60, decimals)
+        seconds = f"{seconds:.{decimals}f}" if decimals > 0 else f"{int(seconds)}"
+        return f"{whole_minutes // 60}°{whole_minutes % 60}'{seconds}\""
+
+    def cached_chunk_texts(self, entities, hashes, text_cache=None, tokenizer=None, max_length=500):
+        """
+        Textifies and chunks entities through a textified chunk store (src/wikidataTextCache.py), only computing the chunks of the entities that are missing from it or changed since.
+
+        Parameters:
+        - entities (list): The entities to be textified and chunked.
+        - hashes (list[str]): The content hash of each entity (e.g. LazyWikidataEntity.content_hash).
+        - text_cache (TextCache or None): The store from create_text_cache_db. None computes every entity (default=None).
+        - tokenizer: The tokenizer used by chunk_texts. None returns the full text of entity_to_text as a single chunk (default=None).
+        - max_length (int): The maximum number of tokens allowed per chunk (default is 500).
+
+        Returns:
+        - tuple: (chunks, md5s), the text chunks of each entity and their MD5 hex digests, in the same order as entities.
+        """
+        if tokenizer is None:
+            chunker = 'text'
+        else:
+            tokenizer_name = getattr(tokenizer, 'name_or_path', type(tokenizer).__name__)
+            chunker = f"{tokenizer_name}:{max_length}"
+        langvar = self.langvar.__name__.rsplit('.', 1)[-1]
+
+        stored = {}
+        if text_cache is not None:
+            stored = text_cache.get_chunks_bulk(
+                [(entity.id, entity_hash) for entity, entity_hash in zip(entities, hashes)],
+                self.language, langvar, TEXTIFIER_VERSION, chunker
+            )
+
+        missing = [
+            i for i, entity in enumerate(entities) if entity.id not in stored
+        ]
+        if tokenizer is None:
+            missing_chunks = [[self.entity_to_text(entities[i])] for i in missing]
+        else:
+            missing_chunks = self.chunk_texts(
+                [entities[i] for i in missing], tokenizer, max_length=max_length
+            )
+
+        new_entries = [
+            (entities[i].id, hashes[i], chunks)
+            for i, chunks in zip(missing, missing_chunks)
+        ]
+        if text_cache is not None:
+            new_md5s = text_cache.add_chunks_bulk(
+                new_entries, self.language, langvar, TEXTIFIER_VERSION, chunker
+            )
+        else:
+            new_md5s = {
+                id: [hashlib.md5(chunk.encode('utf-8')).hexdigest() for chunk in chunks]
+                for id, _, chunks in new_entries
+            }
+
+        for id, _, chunks in new_entries:
+            stored[id] = (chunks, new_md5s[id])
+        return (
+            [stored[entity.id][0] for entity in entities],
+            [stored[entity.id][1] for entity in entities]
+        )
 
     def chunk_text(self, entity, tokenizer, max_length=500):
         """
@@ -467,6 +991,236 @@ class WikidataTextifier:
         - tokenizer: A tokenizer (e.g. from Hugging Face) used to count tokens.
         - max_length (int): The maximum number of tokens allowed per chunk (default is 500).
 
+        Returns:
+        - list[str]: A list of text chunks, each within the token limit.
+        """
+        return self.chunk_texts([entity], tokenizer, max_length=max_length)[0]
+
+    def chunk_texts(self, entities, tokenizer, max_length=500):
+        """
+        Batched version of chunk_text. The tokenizer is called a fixed number of times per batch (at most four), on lists of texts, instead of once per claim and entity.
+
+        The header (label, description, aliases) and each property line are tokenized once, and the lines are packed greedily by token count. The token count of a chunk is estimated as the sum of the counts of its parts, then every chunk boundary is checked by tokenizing the chunk text itself. If a check fails (e.g. the tokenizer merges tokens across lines, or the language format is not line based) the entity is chunked with the reference algorithm, so the output is identical to it.
+
+        Parameters:
+        - entities (list): The entities to be textified and chunked.
+        - tokenizer: A fast tokenizer (e.g. from Hugging Face) used to count tokens. It must accept a list of texts and support return_offsets_mapping.
+        - max_length (int): The maximum number of tokens allowed per chunk (default is 500).
+
+        Returns:
+        - list[list[str]]: The text chunks of each entity, in the same order as entities.
+        """
+        results = [None] * len(entities)
+
+        # If the full text does not exceed the maximum tokens then we only return 1 chunk.
+        headers, properties, texts = [], [], []
+        for entity in entities:
+            properties.append(self.properties_to_dict(entity.claims))
+            headers.append(self._entity_header(entity))
+            texts.append(self._merge_entity_text(headers[-1], properties[-1]))
+
+        counts = self._token_counts(tokenizer, texts)
+        long_ids = []
+        for i, count in enumerate(counts):
+            if count < max_length:
+                results[i] = [texts[i]]
+            else:
+                long_ids.append(i)
+
+        # If the label and description already exceed the maximum tokens then we will truncate it and will not include chunks that include claims.
+        descriptions = [self._merge_entity_text(headers[i], {}) for i in long_ids]
+        tokens = self._tokenize(tokenizer, descriptions)
+        claim_ids = []
+        for i, offsets in zip(long_ids, tokens['offset_mapping']):
+            if len(offsets) >= max_length:
+                start, end = offsets[0][0], offsets[max_length - 1][1]
+                results[i] = [texts[i][start:end]]
+            else:
+                claim_ids.append(i)
+
+        # Split the remaining entities into property lines and tokenize each part once.
+        parts = {}
+        for i in claim_ids:
+            entity_parts = self._text_parts(headers[i], properties[i], texts[i])
+            if entity_parts is not None:
+                parts[i] = entity_parts
+
+        part_counts = iter(self._token_counts(
+            tokenizer,
+            [text for i in parts for text in (*parts[i][0], *parts[i][1])]
+        ))
+
+        # Pack the lines of each entity by their estimated token count.
+        plans = {}
+        for i, (header_texts, lines, instanceof_index) in parts.items():
+            header_counts = [next(part_counts) for _ in header_texts]
+            line_counts = [next(part_counts) for _ in lines]
+            plans[i] = self._plan_chunks(
+                header_counts, line_counts, instanceof_index, max_length
+            )
+
+        # Tokenize the text of every planned chunk to check and trim it.
+        checks = []
+        templated = getattr(self.langvar, 'template', None) is not None
+        for i, plan in plans.items():
+            claims = list(properties[i].items())
+            header_texts, lines, instanceof_index = parts[i]
+            for start, end, _ in plan:
+                if templated:
+                    # The template renders each property independently of the others
+                    in_chunk = (instanceof_index is not None) and (start <= instanceof_index < end)
+                    chunk_text = header_texts[int(in_chunk)] + ''.join(lines[start:end])
+                else:
+                    chunk_text = self._merge_entity_text(
+                        headers[i], dict(claims[start:end])
+                    )
+                checks.append((i, chunk_text))
+
+        tokens = self._tokenize(tokenizer, [text for _, text in checks])
+        checks = iter(zip(checks, tokens['offset_mapping']))
+        for i, plan in plans.items():
+            chunks = []
+            verified = True
+            claims = properties[i]
+            for start, end, expected in plan:
+                (_, chunk_text), offsets = next(checks)
+                if expected == 'overflow':
+                    verified = verified and len(offsets) >= max_length
+                    if len(offsets) >= max_length:
+                        chunks.append(chunk_text[offsets[0][0]:offsets[max_length - 1][1]])
+                elif (expected == 'fits') and (end < len(claims)):
+                    verified = verified and len(offsets) < max_length
+                else:
+                    # Last chunk
+                    if expected == 'fits':
+                        verified = verified and len(offsets) < max_length
+
+                    if len(offsets) >= max_length:
+                        start, end = offsets[0][0], offsets[max_length - 1][1]
+                    else:
+                        start, end = offsets[0][0], offsets[-1][1]
+                    chunks.append(chunk_text[start:end])
+
+            if verified:
+                results[i] = chunks
+
+        # Fall back to the reference algorithm for the entities that could not be verified.
+        for i in claim_ids:
+            if results[i] is None:
+                results[i] = self._chunk_text_by_claim(
+                    entities[i], tokenizer, max_length=max_length
+                )
+
+        return results
+
+    def _text_parts(self, header, properties, text):
+        """
+        Splits the text of an entity into the header and one line per property, such that concatenating the header and the lines of any subset of properties gives their text.
+
+        Parameters:
+        - header (tuple): The entity header from _entity_header.
+        - properties (dict): The properties of the entity from properties_to_dict.
+        - text (str): The text of the entity with all its properties.
+
+        Returns:
+        - tuple or None: (header_texts, lines, instanceof_index). header_texts holds the header without, then with, the instance of description (the latter only when the description is missing). instanceof_index is the position of the property giving that description, or None. Returns None if the text is not split by property.
+        """
+        claims = list(properties.items())
+        instanceof = header[3]
+        instanceof_index = None
+        header_texts = [self._merge_entity_text(header, {'': None})]
+        if (instanceof is not None) and (instanceof in properties):
+            instanceof_index = [key for key, _ in claims].index(instanceof)
+            header_texts.append(self.langvar.merge_entity_text(
+                header[0], properties[instanceof], header[2], {'': None}
+            ))
+
+        template = getattr(self.langvar, 'template', None)
+        if template is not None:
+            # The lines are cut from the full text with the spans of the template
+            merged_text, spans = self._merge_entity_text(header, properties, with_spans=True)
+            if merged_text != text:
+                return None
+            lines = [text[start:end] for start, end in spans]
+        else:
+            lines = []
+            for index, (key, value) in enumerate(claims):
+                header_text = header_texts[int(index == instanceof_index)]
+                line_text = self._merge_entity_text(header, {key: value})
+                if not line_text.startswith(header_text):
+                    return None
+                lines.append(line_text[len(header_text):])
+
+        merged_header = header_texts[int(instanceof_index is not None)]
+        if merged_header + ''.join(lines) != text:
+            return None
+
+        return header_texts, lines, instanceof_index
+
+    @staticmethod
+    def _plan_chunks(header_counts, line_counts, instanceof_index, max_length):
+        """
+        Replays the greedy packing of _chunk_text_by_claim on estimated token counts.
+
+        Parameters:
+        - header_counts (list[int]): Token counts of the header texts from _text_parts.
+        - line_counts (list[int]): Token counts of the property lines.
+        - instanceof_index (int or None): Position of the property describing the entity, from _text_parts.
+        - max_length (int): The maximum number of tokens allowed per chunk.
+
+        Returns:
+        - list[tuple]: (start, end, expected) ranges of properties to tokenize. expected is 'overflow' for a chunk that reaches max_length and is trimmed, 'fits' for a chunk that must stay under max_length (the chunk before an overflow, or the last chunk), and 'final' for a last chunk that was never compared to max_length.
+        """
+        plan = []
+        start = 0
+        count = 0
+        # The property carried over to a new chunk after an overflow
+        # is not compared to max_length until another one is added.
+        checked = True
+        for index, line_count in enumerate(line_counts):
+            in_chunk = (instanceof_index is not None) and (start <= instanceof_index <= index)
+            estimate = header_counts[int(in_chunk)] + count + line_count
+            if estimate >= max_length:
+                if (index > start) and checked:
+                    plan.append((start, index, 'fits'))
+                plan.append((start, index + 1, 'overflow'))
+
+                # A property that exceeds the maximum tokens alone is only kept in its trimmed chunk.
+                if index == start:
+                    start, count, checked = index + 1, 0, True
+                else:
+                    start, count, checked = index, line_count, False
+            else:
+                count += line_count
+                checked = True
+
+        if start < len(line_counts):
+            plan.append((start, len(line_counts), 'fits' if checked else 'final'))
+
+        return plan
+
+    @staticmethod
+    def _tokenize(tokenizer, texts):
+        if len(texts) == 0:
+            return {'input_ids': [], 'offset_mapping': []}
+        return tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)
+
+    @staticmethod
+    def _token_counts(tokenizer, texts):
+        if len(texts) == 0:
+            return []
+        tokens = tokenizer(texts, add_special_tokens=False)
+        return [len(ids) for ids in tokens['input_ids']]
+
+    def _chunk_text_by_claim(self, entity, tokenizer, max_length=500):
+        """
+        Reference implementation of chunk_text, which re-tokenizes the accumulated text for every claim. Used as a fallback when the incremental chunking cannot be verified.
+
+        Parameters:
+        - entity: The entity to be textified and chunked.
+        - tokenizer: A tokenizer (e.g. from Hugging Face) used to count tokens.
+        - max_length (int): The maximum number of tokens allowed per chunk (default is 500).
+
         Returns:
         - list[str]: A list of text chunks, each within the token limit.
         """
@@ -0,0 +1,37 @@
+"""
+Fields derived from the JSON of a Wikidata entity, shared by the stages that
+read the dump. This module has no side effects on import (unlike the database
+modules, which create their SQLite files), so any stage can use it.
+"""
+
+def clean_label_description(data):
+    """
+    Flatten the labels or descriptions of an entity to a language to text map.
+
+    Parameters:
+    - data (dict): The 'labels' or 'descriptions' of an entity, e.g. {'en': {'language': 'en', 'value': 'Douglas Adams'}}.
+
+    Returns:
+    - dict: The texts by language, e.g. {'en': 'Douglas Adams'}.
+    """
+    clean_data = {}
+    for lang, label in data.items():
+        clean_data[lang] = label['value']
+    return clean_data
+
+
+def is_in_wikipedia(entity):
+    """
+    Check if a Wikidata entity has a corresponding Wikipedia entry in any language.
+
+    Parameters:
+    - entity (dict): A Wikidata entity dictionary.
+
+    Returns:
+    - bool: True if the entity has at least one sitelink ending in 'wiki', otherwise False.
+    """
+    if ('sitelinks' in entity):
+        for s in entity['sitelinks']:
+            if s.endswith('wiki'):
+                return True
+    return False
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Text, String, Integer, create_engine, text
+from sqlalchemy import Column, Text, String, Integer, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.types import TypeDecorator, Boolean
+from src.sqliteEngine import create_sqlite_engine
+from src.wikidataEntityFields import clean_label_description, is_in_wikipedia
 import json
 import re
 
@@ -11,11 +13,7 @@ in all languages.
 """
 
 SQLITEDB_PATH = '../data/Wikidata/sqlite_wikidata_items.db'
-engine = create_engine(f'sqlite:///{SQLITEDB_PATH}',
-    pool_size=5,  # Limit the number of open connections
-    max_overflow=10,  # Allow extra connections beyond pool_size
-    pool_recycle=10  # Recycle connections every 10 seconds
-)
+engine = create_sqlite_engine(SQLITEDB_PATH)
 
 Base = declarative_base()
 Session = sessionmaker(bind=engine)
@@ -171,27 +169,13 @@ class WikidataItem(Base):
 
     @staticmethod
     def clean_label_description(data):
-        clean_data = {}
-        for lang, label in data.items():
-            clean_data[lang] = label['value']
-        return clean_data
+        """See src.wikidataEntityFields.clean_label_description."""
+        return clean_label_description(data)
 
     @staticmethod
     def is_in_wikipedia(entity):
-        """
-        Check if a Wikidata entity has a corresponding Wikipedia entry in any language.
-
-        Parameters:
-        - entity (dict): A Wikidata entity dictionary.
-
-        Returns:
-        - bool: True if the entity has at least one sitelink ending in 'wiki', otherwise False.
-        """
-        if ('sitelinks' in entity):
-            for s in entity['sitelinks']:
-                if s.endswith('wiki'):
-                    return True
-        return False
+        """See src.wikidataEntityFields.is_in_wikipedia."""
+        return is_in_wikipedia(entity)
 
     @staticmethod
     def get_labels_list(id_list):
@@ -213,6 +197,44 @@ class WikidataItem(Base):
 
         return {row_id: row_labels for row_id, row_labels in rows if row_labels is not None}
 
+    @staticmethod
+    def get_labels_bulk(id_list):
+        """
+        Retrieve labels for many entities with a single query. The IDs are loaded into a temporary table that is joined with the item table, so the query does not depend on the number of IDs.
+
+        Parameters:
+        - id_list (list[str]): A list of entity IDs.
+
+        Returns:
+        - dict: A mapping of {entity_id: labels_dict} for every requested ID. Missing IDs are mapped to an empty dict.
+        """
+        labels_dict = {id: {} for id in id_list}
+        if len(labels_dict) == 0:
+            return labels_dict
+
+        with engine.begin() as connection:
+            # Temporary tables are private to the connection
+            connection.execute(text(
+                "CREATE TEMP TABLE IF NOT EXISTS label_ids (id TEXT PRIMARY KEY)"
+            ))
+            connection.execute(text("DELETE FROM label_ids"))
+            connection.execute(
+                text("INSERT OR IGNORE INTO label_ids (id) VALUES (:id)"),
+                [{'id': id} for id in labels_dict]
+            )
+            rows = connection.execute(text(
+                """
+                SELECT item.id, item.labels
+                FROM label_ids JOIN item ON item.id = label_ids.id
+                """
+            ))
+            for row_id, row_labels in rows:
+                if row_labels is not None:
+                    labels_dict[row_id] = json.loads(row_labels)
+            connection.execute(text("DELETE FROM label_ids"))
+
+        return labels_dict
+
     @staticmethod
     def _remove_keys(data, keys_to_remove=['hash', 'property', 'numeric-id', 'qualifiers-order']):
         """
@@ -273,12 +295,10 @@ class WikidataItem(Base):
                 unit_id = data['unit'].split('/')[-1]
                 ids.add(unit_id)
 
-            datatype_in_data = 'datatype' in data
-            datavalue_in_data = 'datavalue' in data
-            data_datatype = data['datatype'] in (
-                'wikibase-item', 'wikibase-property'
-            )
-            if datatype_in_data and datavalue_in_data and data_datatype:
+            if ('datatype' in data
+                and 'datavalue' in data
+                and data['datatype'] in ('wikibase-item', 'wikibase-property')
+                and isinstance(data['datavalue'], str)):
                 ids.add(data['datavalue'])
 
             for value in data.values():
@@ -329,7 +349,7 @@ class WikidataItem(Base):
                     'unit-labels': labels
                 }
 
-            if ('datatype' in data) and ('datavalue' in data) and ((data['datatype'] == 'wikibase-item') or (data['datatype'] == 'wikibase-property')):
+            if ('datatype' in data) and ('datavalue' in data) and ((data['datatype'] == 'wikibase-item') or (data['datatype'] == 'wikibase-property')) and isinstance(data['datavalue'], str):
                 if data['datavalue'] in labels_dict:
                     labels = labels_dict[data['datavalue']]
                 else:
@@ -350,24 +370,40 @@ class WikidataItem(Base):
     @staticmethod
     def add_labels_batched(claims, query_batch=100):
         """
-        Gather all relevant IDs from claims, batch-fetch their labels, then add them to the claims structure.
+        Gather all relevant IDs from claims, fetch their labels with one query, then add them to the claims structure.
 
         Parameters:
         - claims (dict or list): The claims data structure to update.
-        - query_batch (int): The batch size for querying labels in groups. Default is 100.
+        - query_batch (int): Unused, the labels are fetched with get_labels_bulk in a single query. Kept for compatibility.
 
         Returns:
         - dict or list: The updated claims with labels inserted.
         """
-        label_ids = WikidataItem._gather_labels_ids(claims)
+        return WikidataItem.add_labels_batched_entities([claims])[0]
 
-        labels_dict = {}
-        for i in range(0, len(label_ids), query_batch):
-            temp_dict = WikidataItem.get_labels_list(label_ids[i:i+query_batch])
-            labels_dict = {**labels_dict, **temp_dict}
+    @staticmethod
+    def add_labels_batched_entities(claims_list):
+        """
+        Same as add_labels_batched for the claims of many entities at once, with a single query for all of them (e.g. a whole consumer batch of the dump reader).
+
+        Parameters:
+        - claims_list (list): The claims data structures to update.
 
-        claims = WikidataItem._add_labels_to_claims(claims, labels_dict=labels_dict)
-        return claims
+        Returns:
+        - list: The updated claims with labels inserted, in the same order.
+        """
+        label_ids = set()
+        for claims in claims_list:
+            label_ids.update(WikidataItem._gather_labels_ids(claims))
+
+        # Every gathered ID is in labels_dict, missing ones with empty labels,
+        # so _add_labels_to_claims never falls back to per ID queries.
+        labels_dict = WikidataItem.get_labels_bulk(list(label_ids))
+
+        return [
+            WikidataItem._add_labels_to_claims(claims, labels_dict=labels_dict)
+            for claims in claims_list
+        ]
 
     @staticmethod
     def clean_entity(entity):
@@ -0,0 +1,198 @@
+from array import array
+from bisect import bisect_left
+import mmap
+import os
+import struct
+import numpy as np
+
+"""
+Read-only label dictionary of one language, compiled to a single file that
+worker processes memory-map instead of querying SQLite or loading a JSON dict.
+
+File layout (little-endian):
+- header: magic (8 bytes), number of labels n (uint64), blob size (uint64)
+- ids: n sorted int64 keys (QIDs as positive and PIDs as negative numbers,
+  same keys as wikidataCompactDB)
+- offsets: n + 1 uint64 offsets of each label in the blob
+- blob: the UTF-8 encoded labels, one after the other
+
+Opening the file only maps it, lookups are a binary search on the ids, and
+all the processes mapping the same file share the same pages in memory.
+"""
+
+LABEL_MAP_MAGIC = b'WDLMAP01'
+HEADER = struct.Struct('<8sQQ')
+
+
+class WikidataLabelMap:
+    def __init__(self, path):
+        """
+        Memory-maps a compiled label map (see WikidataLabelMap.build).
+
+        Parameters:
+        - path (str): Path to the compiled file.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, size, blob_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != LABEL_MAP_MAGIC:
+            raise ValueError(f"'{path}' is not a compiled label map")
+
+        ids_start = HEADER.size
+        offsets_start = ids_start + 8 * size
+        self._blob_start = offsets_start + 8 * (size + 1)
+        if len(self._mmap) != self._blob_start + blob_size:
+            raise ValueError(f"'{path}' is truncated")
+
+        view = memoryview(self._mmap)
+        self._ids = view[ids_start:offsets_start].cast('q')
+        self._offsets = view[offsets_start:self._blob_start].cast('Q')
+        self._size = size
+
+    @staticmethod
+    def encode_id(id):
+        """
+        Convert a QID or PID to the integer key of the map.
+
+        Parameters:
+        - id (str): The entity ID (e.g. 'Q42' or 'P31').
+
+        Returns:
+        - int or None: The QID number, the negative PID number, or None for other IDs (e.g. lexemes).
+        """
+        if (len(id) < 2) or (id[0] not in 'QP') or not id[1:].isdigit():
+            return None
+        return int(id[1:]) if id[0] == 'Q' else -int(id[1:])
+
+    def get(self, id, default=None):
+        """
+        Retrieve the label of an entity.
+
+        Parameters:
+        - id (str): The entity ID.
+        - default: Value returned if the entity has no label in the map (default=None).
+
+        Returns:
+        - str: The label, or default if missing.
+        """
+        key = WikidataLabelMap.encode_id(id)
+        if key is None:
+            return default
+
+        i = bisect_left(self._ids, key)
+        if (i == self._size) or (self._ids[i] != key):
+            return default
+
+        start = self._blob_start + self._offsets[i]
+        end = self._blob_start + self._offsets[i + 1]
+        return self._mmap[start:end].decode('utf-8')
+
+    def get_labels_bulk(self, id_list):
+        """
+        Retrieve the labels of many entities.
+
+        Parameters:
+        - id_list (list[str]): A list of entity IDs.
+
+        Returns:
+        - dict: A mapping of {entity_id: label}, with None for the missing IDs.
+        """
+        return {id: self.get(id) for id in id_list}
+
+    def __contains__(self, id):
+        return self.get(id) is not None
+
+    def __len__(self):
+        return self._size
+
+    def close(self):
+        """
+        Unmaps the file.
+        """
+        self._ids.release()
+        self._offsets.release()
+        self._mmap.close()
+
+    @staticmethod
+    def build(output_path, labels):
+        """
+        Compile labels to a file. The labels can come in any order, they are sorted by ID. If an ID appears several times, its first label is kept.
+
+        Parameters:
+        - output_path (str): Path of the compiled file. It's replaced atomically, so processes mapping the previous version keep reading it.
+        - labels (Iterable[tuple[str, str]]): (entity ID, label) pairs. IDs other than QIDs and PIDs, and None labels, are skipped.
+
+        Returns:
+        - int: The number of labels in the compiled file.
+        """
+        tmp_path = f"{output_path}.tmp"
+        blob_path = f"{output_path}.blob.tmp"
+
+        # Labels are written to a temporary blob as they come,
+        # only the IDs and the lengths are kept in memory.
+        keys = array('q')
+        lengths = array('Q')
+        with open(blob_path, 'wb') as blob_file:
+            for id, label in labels:
+                key = WikidataLabelMap.encode_id(id)
+                if (key is None) or (label is None):
+                    continue
+                data = label.encode('utf-8')
+                keys.append(key)
+                lengths.append(len(data))
+                blob_file.write(data)
+
+        keys = np.frombuffer(keys, dtype=np.int64)
+        lengths = np.frombuffer(lengths, dtype=np.uint64)
+        starts = np.zeros(len(keys), dtype=np.uint64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+
+        order = np.argsort(keys, kind='stable')
+        is_sorted = np.array_equal(order, np.arange(len(keys)))
+        sorted_keys = keys[order]
+        first = np.ones(len(sorted_keys), dtype=bool)
+        first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        order = order[first]
+        is_sorted = is_sorted and bool(first.all())
+
+        sorted_keys = keys[order]
+        sorted_lengths = lengths[order]
+        sorted_starts = starts[order]
+        offsets = np.zeros(len(order) + 1, dtype=np.uint64)
+        np.cumsum(sorted_lengths, out=offsets[1:])
+
+        try:
+            with open(tmp_path, 'wb') as output:
+                output.write(HEADER.pack(
+                    LABEL_MAP_MAGIC, len(order), int(offsets[-1])
+                ))
+                output.write(sorted_keys.astype('<i8').tobytes())
+                output.write(offsets.astype('<u8').tobytes())
+
+                with open(blob_path, 'rb') as blob_file:
+                    if is_sorted:
+                        # e.g. read from the compact database in key order
+                        while True:
+                            chunk = blob_file.read(16 * 1024 * 1024)
+                            if not chunk:
+                                break
+                            output.write(chunk)
+                    elif len(order) > 0:
+                        with mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ) as blob:
+                            buffer = []
+                            for start, length in zip(sorted_starts.tolist(), sorted_lengths.tolist()):
+                                buffer.append(blob[start:start + length])
+                                if len(buffer) >= 100000:
+                                    output.write(b''.join(buffer))
+                                    buffer = []
+                            output.write(b''.join(buffer))
+
+            os.replace(tmp_path, output_path)
+        finally:
+            os.remove(blob_path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return len(order)
@@ -1,18 +1,15 @@
-from sqlalchemy import Column, Text, create_engine, text
+from sqlalchemy import Column, Text, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.types import TypeDecorator
+from src.sqliteEngine import create_sqlite_engine
 import json
 import re
 
 """
 SQLite database setup for storing Wikidata labels in all languages.
 """
-engine = create_engine(f'sqlite:///../data/Wikidata/sqlite_wikidata_labels.db',
-    pool_size=5,       # Limit the number of open connections
-    max_overflow=10,   # Allow extra connections beyond pool_size
-    pool_recycle=10    # Recycle connections every 10 seconds
-)
+engine = create_sqlite_engine('../data/Wikidata/sqlite_wikidata_labels.db')
 Base = declarative_base()
 Session = sessionmaker(bind=engine)
 
@@ -1,32 +1,119 @@
-from sqlalchemy import Column, Text, create_engine, text
+from sqlalchemy import Column, Text, text, bindparam
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.types import TypeDecorator
+from src.sqliteEngine import create_sqlite_engine
+from src.wikidataTextCache import content_hash
 import json
+import orjson
 import os
 
 """
 SQLite database setup for quick entity lookup. A database file is created per language.
 """
+
+def _loads_json(value):
+    """Decodes JSON text or bytes with orjson, falling back to json for what orjson rejects (e.g. integers over 64 bits)."""
+    try:
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return json.loads(value)
+
+def get_storage_codec(storage='json'):
+    """
+    Returns the functions encoding and decoding the aliases and claims columns.
+
+    Parameters:
+    - storage (str): 'json' (JSON text, the default), 'orjson' (JSON bytes, faster to encode) or 'msgpack' (MessagePack bytes, requires the msgpack package). 'json' and 'orjson' databases can be read with either of them.
+
+    Returns:
+    - tuple: (encode, decode) functions.
+    """
+    if storage == 'json':
+        return (lambda value: json.dumps(value, separators=(',', ':'))), _loads_json
+    if storage == 'orjson':
+        return orjson.dumps, _loads_json
+    if storage == 'msgpack':
+        import msgpack
+        return (
+            lambda value: msgpack.packb(value, use_bin_type=True),
+            lambda value: msgpack.unpackb(value, raw=False)
+        )
+    raise ValueError(f"Unknown storage '{storage}', expected 'json', 'orjson' or 'msgpack'")
+
 class JSONType(TypeDecorator):
     """Custom SQLAlchemy type for JSON storage in SQLite."""
     impl = Text
 
+    def __init__(self, storage='json', *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.encode, self.decode = get_storage_codec(storage)
+
     def process_bind_param(self, value, dialect):
         if value is not None:
-            return json.dumps(value, separators=(',', ':'))
+            return self.encode(value)
         return None
 
     def process_result_value(self, value, dialect):
         if value is not None:
-            return json.loads(value)
+            return self.decode(value)
         return None
 
+# Marks the columns of a LazyWikidataEntity that are not decoded yet
+_NOT_DECODED = object()
+
+class LazyWikidataEntity:
+    """
+    Read-only entity row whose aliases and claims are only decoded when first accessed, e.g. to skip the claims when only the label is needed. Has the same attributes as a WikidataLang row.
+    """
+    __slots__ = ('id', 'label', 'description', '_raw_aliases', '_raw_claims', '_aliases', '_claims', '_decode')
+
+    def __init__(self, id, label, description, aliases, claims, decode=_loads_json):
+        self.id = id
+        self.label = label
+        self.description = description
+        self._raw_aliases = aliases
+        self._raw_claims = claims
+        self._aliases = _NOT_DECODED
+        self._claims = _NOT_DECODED
+        self._decode = decode
+
+    @property
+    def aliases(self):
+        if self._aliases is _NOT_DECODED:
+            raw = self._raw_aliases
+            self._aliases = self._decode(raw) if raw is not None else None
+        return self._aliases
+
+    @property
+    def claims(self):
+        if self._claims is _NOT_DECODED:
+            raw = self._raw_claims
+            self._claims = self._decode(raw) if raw is not None else None
+        return self._claims
+
+    def content_hash(self):
+        """
+        Hashes the entity as stored in the database, without decoding its aliases and claims. Used as the content hash of the textified chunk store (src/wikidataTextCache.py).
+
+        Returns:
+        - str: The MD5 hex digest of the ID, label, description, and encoded aliases and claims.
+        """
+        return content_hash(
+            self.id, self.label, self.description,
+            self._raw_aliases, self._raw_claims
+        )
+
+    def __repr__(self):
+        return f"LazyWikidataEntity(id={self.id!r}, label={self.label!r})"
+
 def create_wikidatalang_db(
         db_filname,
-        table_name='wikidata'
+        table_name='wikidata',
+        profile=None,
+        storage='json'
     ):
-    """Factory function to create a dynamic WikidataLang model."""
+    """Factory function to create a dynamic WikidataLang model. The profile ('bulk_load' or 'read_serving') sets the SQLite PRAGMAs, see src.sqliteEngine. The storage ('json', 'orjson' or 'msgpack') is the encoding of the aliases and claims columns, see get_storage_codec."""
 
     data_dir = os.path.abspath("../data/Wikidata")
     sqldb_path = os.path.join(data_dir, db_filname)
@@ -34,14 +121,10 @@ def create_wikidatalang_db(
     # Safe directory creation if it's missing
     os.makedirs(data_dir, exist_ok=True)
 
-    engine = create_engine(
-        f"sqlite:///{sqldb_path}",
-        pool_size=5,       # Limit the number of open connections
-        max_overflow=10,   # Allow extra connections beyond pool_size
-        pool_recycle=10    # Recycle connections every 10 seconds
-    )
+    engine = create_sqlite_engine(sqldb_path, profile=profile)
     Base = declarative_base()
     Session = sessionmaker(bind=engine)
+    encode, decode = get_storage_codec(storage)
 
     class WikidataLang(Base):
         """Represents a Wikidata entity with label, description, aliases, and claims."""
@@ -51,8 +134,8 @@ def create_wikidatalang_db(
         id = Column(Text, primary_key=True)
         label = Column(Text)
         description = Column(Text)
-        aliases = Column(JSONType)
-        claims = Column(JSONType)
+        aliases = Column(JSONType(storage))
+        claims = Column(JSONType(storage))
 
         @staticmethod
         def get_session():
@@ -64,6 +147,16 @@ def create_wikidatalang_db(
             """
             return Session()
 
+        @staticmethod
+        def get_engine():
+            """
+            Get the SQLAlchemy engine of the database.
+
+            Returns:
+            - Engine: The SQLAlchemy engine.
+            """
+            return engine
+
         @staticmethod
         def add_bulk_entities(data):
             """
@@ -144,6 +237,225 @@ def create_wikidatalang_db(
             with Session() as session:
                 return session.query(WikidataLang).filter_by(id=id).first()
 
+        @staticmethod
+        def get_lazy_entity(id):
+            """
+            Retrieve an entity by its ID, without decoding its aliases and claims until they are accessed.
+
+            Parameters:
+            - id (str): The unique identifier of the entity.
+
+            Returns:
+            - LazyWikidataEntity or None: The entity if found, otherwise None.
+            """
+            with engine.connect() as connection:
+                row = connection.execute(text(
+                    f"""
+                    SELECT id, label, description, aliases, claims
+                    FROM {table_name} WHERE id = :id
+                    """
+                ), {'id': id}).first()
+            if row is None:
+                return None
+            return LazyWikidataEntity(*row, decode=decode)
+
+        @staticmethod
+        def get_entities(ids):
+            """
+            Retrieve many entities with one query, without decoding their aliases and claims until they are accessed.
+
+            Parameters:
+            - ids (list[str]): The IDs of the entities. Duplicates are only fetched once.
+
+            Returns:
+            - tuple: (entities, missing_ids). entities is a list of LazyWikidataEntity in the same order as ids, with None for the IDs missing from the database. missing_ids lists these IDs.
+            """
+            unique_ids = list(dict.fromkeys(ids))
+            query = text(
+                f"""
+                SELECT id, label, description, aliases, claims
+                FROM {table_name} WHERE id IN :ids
+                """
+            ).bindparams(bindparam('ids', expanding=True))
+
+            found = {}
+            with engine.connect() as connection:
+                # SQLite limits the number of variables of a query (32766)
+                for i in range(0, len(unique_ids), 30000):
+                    rows = connection.execute(
+                        query, {'ids': unique_ids[i:i + 30000]}
+                    )
+                    for row in rows:
+                        found[row[0]] = LazyWikidataEntity(*row, decode=decode)
+
+            entities = [found.get(id) for id in ids]
+            missing_ids = [id for id in unique_ids if id not in found]
+            return entities, missing_ids
+
+        @staticmethod
+        def iter_lazy_entities(offset=0, ids=None, batch_size=1000):
+            """
+            Stream the entities of the database as LazyWikidataEntity objects, fetching batch_size rows at a time.
+
+            Parameters:
+            - offset (int): Number of entities to skip (default=0).
+            - ids (list[str] or None): If given, only stream the entities with these IDs (default=None, all entities).
+            - batch_size (int): Number of rows fetched from SQLite at once (default=1000).
+
+            Yields:
+            - LazyWikidataEntity: The entities, with their aliases and claims decoded on first access.
+            """
+            if ids is not None:
+                query = text(
+                    f"""
+                    SELECT id, label, description, aliases, claims
+                    FROM {table_name} WHERE id IN :ids
+                    """
+                ).bindparams(bindparam('ids', expanding=True))
+                params = {'ids': list(ids)}
+                if len(params['ids']) == 0:
+                    return
+            else:
+                query = text(
+                    f"""
+                    SELECT id, label, description, aliases, claims
+                    FROM {table_name} LIMIT -1 OFFSET :offset
+                    """
+                )
+                params = {'offset': offset}
+
+            with engine.connect() as connection:
+                rows = connection.execution_options(
+                    yield_per=batch_size
+                ).execute(query, params)
+                for row in rows:
+                    yield LazyWikidataEntity(*row, decode=decode)
+
+        @staticmethod
+        def iter_entities_by_id(after_id=None, end_id=None, batch_size=1000, after_rowid=None):
+            """
+            Stream the entities in ID order with keyset pagination: each batch is a short query starting right after the last ID of the previous one, so resuming from any ID is an index seek instead of a scan of the skipped rows.
+
+            Parameters:
+            - after_id (str or None): Only stream the entities with an ID greater than this one, e.g. the last processed ID (default=None, from the first entity).
+            - end_id (str or None): Only stream the entities with an ID lower or equal to this one (default=None, until the last entity).
+            - batch_size (int): Number of rows fetched per query (default=1000).
+            - after_rowid (int or None): Only stream the entities stored after this row, see get_rowid_at_offset (default=None, all rows).
+
+            Yields:
+            - LazyWikidataEntity: The entities, ordered by ID (as text, i.e. 'Q10' comes before 'Q2').
+            """
+            conditions = ["id > :after_id"]
+            if end_id is not None:
+                conditions.append("id <= :end_id")
+            if after_rowid is not None:
+                conditions.append("rowid > :after_rowid")
+            query = text(
+                f"""
+                SELECT id, label, description, aliases, claims
+                FROM {table_name} WHERE {' AND '.join(conditions)}
+                ORDER BY id LIMIT :batch_size
+                """
+            )
+
+            # Every ID is greater than the empty string
+            last_id = after_id if after_id is not None else ''
+            while True:
+                with engine.connect() as connection:
+                    rows = connection.execute(query, {
+                        'after_id': last_id,
+                        'end_id': end_id,
+                        'after_rowid': after_rowid,
+                        'batch_size': batch_size
+                    }).all()
+
+                for row in rows:
+                    yield LazyWikidataEntity(*row, decode=decode)
+
+                if len(rows) < batch_size:
+                    break
+                last_id = rows[-1][0]
+
+        @staticmethod
+        def count_entities(after_id=None, end_id=None, after_rowid=None):
+            """
+            Count the entities in an ID range, see iter_entities_by_id.
+
+            Parameters:
+            - after_id (str or None): Only count the IDs greater than this one.
+            - end_id (str or None): Only count the IDs lower or equal to this one.
+            - after_rowid (int or None): Only count the entities stored after this row.
+
+            Returns:
+            - int: The number of entities.
+            """
+            conditions = ["id > :after_id"]
+            if end_id is not None:
+                conditions.append("id <= :end_id")
+            if after_rowid is not None:
+                conditions.append("rowid > :after_rowid")
+            with engine.connect() as connection:
+                return connection.execute(text(
+                    f"SELECT COUNT(*) FROM {table_name} WHERE {' AND '.join(conditions)}"
+                ), {
+                    'after_id': after_id if after_id is not None else '',
+                    'end_id': end_id,
+                    'after_rowid': after_rowid
+                }).scalar()
+
+        @staticmethod
+        def get_rowid_at_offset(offset):
+            """
+            Get the rowid of the entity at a position of the storage order, the order of iter_lazy_entities. Rows after it are the ones iter_lazy_entities streams with offset+1.
+
+            Parameters:
+            - offset (int): Number of entities before it.
+
+            Returns:
+            - int or None: The rowid, or None if the offset is past the last entity.
+            """
+            with engine.connect() as connection:
+                return connection.execute(text(
+                    f"SELECT rowid FROM {table_name} ORDER BY rowid LIMIT 1 OFFSET :offset"
+                ), {'offset': offset}).scalar()
+
+        @staticmethod
+        def get_id_at_offset(offset):
+            """
+            Get the ID of the entity at a position of the ID order, e.g. to convert an offset into a keyset position once.
+
+            Parameters:
+            - offset (int): Number of entities before it.
+
+            Returns:
+            - str or None: The ID, or None if the offset is past the last entity.
+            """
+            with engine.connect() as connection:
+                return connection.execute(text(
+                    f"SELECT id FROM {table_name} ORDER BY id LIMIT 1 OFFSET :offset"
+                ), {'offset': offset}).scalar()
+
+        @staticmethod
+        def get_shard_bounds(num_shards):
+            """
+            Split the entities into ID ranges of about the same size, to be processed by several workers.
+
+            Parameters:
+            - num_shards (int): Number of ranges.
+
+            Returns:
+            - list[tuple]: One (after_id, end_id) pair per shard, to pass to iter_entities_by_id. The first after_id and the last end_id are None, so the shards cover all the entities without overlapping.
+            """
+            total = WikidataLang.count_entities()
+            bounds = [None]
+            for shard in range(1, num_shards):
+                bounds.append(
+                    WikidataLang.get_id_at_offset(total * shard // num_shards - 1)
+                    if total * shard // num_shards > 0 else ''
+                )
+            bounds.append(None)
+            return [(bounds[i], bounds[i + 1]) for i in range(num_shards)]
+
         @staticmethod
         def is_in_wikipedia(item, language='en'):
             """
@@ -181,8 +493,8 @@ def create_wikidatalang_db(
                 'id': item['id'],
                 'label': label,
                 'description': description,
-                'aliases': json.dumps(aliases, separators=(',', ':')),
-                'claims': json.dumps(claims, separators=(',', ':')),
+                'aliases': encode(aliases),
+                'claims': encode(claims),
             }
 
         @staticmethod
@@ -1,11 +1,29 @@
 import time
 import json
+import numpy as np
+from src.backoff import call_with_backoff
 from src.wikidataCache import create_cache_embedding_db
 
+class LangChainEmbeddings:
+    def __init__(self, embedder):
+        """
+        Wraps an embedder of src.JinaAI (or an EmbeddingClient), which returns NumPy arrays, for LangChain, which expects lists of floats. This is the only place where embeddings are converted to lists.
+
+        Parameters:
+        - embedder: The embedder, with embed_documents and embed_query methods.
+        """
+        self.embedder = embedder
+
+    def embed_documents(self, texts):
+        return np.asarray(self.embedder.embed_documents(texts), dtype=np.float32).tolist()
+
+    def embed_query(self, text):
+        return np.asarray(self.embedder.embed_query(text), dtype=np.float32).tolist()
+
 class AstraDBConnect:
     def __init__(
             self, datastax_token, collection_name, model='jina', 
-            batch_size=8, cache_embeddings=None):
+            batch_size=8, cache_embeddings=None, embeddings=None):
         """
         Initialize the AstraDBConnect object with the corresponding embedding model.
 
@@ -15,6 +33,7 @@ class AstraDBConnect:
         - model (str): The embedding model to use. Default is 'jina'.
         - batch_size (int): Number of documents to accumulate before pushing to AstraDB. Default is 8.
         - cache_embeddings (str): Name of the cache table.
+        - embeddings: Embedder to use with model 'jina' instead of loading the model in this process, e.g. an EmbeddingClient of src.embeddingService. Default is None.
         """
         from langchain_astradb import AstraDBVectorStore
         from astrapy.info import CollectionVectorServiceOptions
@@ -62,13 +81,18 @@ class AstraDBConnect:
                 namespace=ASTRA_DB_KEYSPACE,
             )
         elif model == 'jina':
-            self.embeddings = JinaAIEmbedder(embedding_dim=1024)
-            self.tokenizer = self.embeddings.tokenizer
+            if embeddings is None:
+                self.embeddings = JinaAIEmbedder(embedding_dim=1024)
+                self.tokenizer = self.embeddings.tokenizer
+            else:
+                # The model runs in another process, only the tokenizer is needed for chunking
+                self.embeddings = embeddings
+                self.tokenizer = AutoTokenizer.from_pretrained("jinaai/jina-embeddings-v3", trust_remote_code=True)
             self.max_token_size = 1024
 
             self.vector_search = AstraDBVectorStore(
                 collection_name=collection_name,
-                embedding=self.embeddings,
+                embedding=LangChainEmbeddings(self.embeddings),
                 token=ASTRA_DB_APPLICATION_TOKEN,
                 api_endpoint=ASTRA_DB_API_ENDPOINT,
                 namespace=ASTRA_DB_KEYSPACE,
@@ -81,7 +105,7 @@ class AstraDBConnect:
 
             self.vector_search = AstraDBVectorStore(
                 collection_name=collection_name,
-                embedding=self.embeddings,
+                embedding=LangChainEmbeddings(self.embeddings),
                 token=ASTRA_DB_APPLICATION_TOKEN,
                 api_endpoint=ASTRA_DB_API_ENDPOINT,
                 namespace=ASTRA_DB_KEYSPACE,
@@ -121,41 +145,42 @@ class AstraDBConnect:
         docs = []
         for _ in range(self.batch_size):
             try:
-                doc = self.doc_batch.get_nowait()
-                cache = self._get_cached_embedding(doc['_id'])
-                if cache is None:
-                    docs.append(doc)
+                docs.append(self.doc_batch.get_nowait())
             except:
                 # Queue is empty
                 break
 
+        # Documents already embedded are skipped
+        cached = self._get_cached_embeddings([doc['_id'] for doc in docs])
+        docs = [doc for doc in docs if doc['_id'] not in cached]
+
         if len(docs) == 0:
             return False
 
-        while True:
-            try:
-                vectors = self.embeddings.embed_documents(
-                    [doc['content'] for doc in docs]
-                )
-                break
-            except Exception as e:
-                print(e)
-                time.sleep(3)
+        # Retried with exponential backoff, the documents are not dropped
+        vectors = call_with_backoff(
+            lambda: self.embeddings.embed_documents(
+                [doc['content'] for doc in docs]
+            )
+        )
 
-        while True:
+        def insert_many():
             try:
-                self.graph_store.insert_many(docs, vectors=vectors)
-                break
-            except self.InsertManyException as e:
-                break
-            except Exception as e:
-                print(e)
-                time.sleep(3)
+                # astrapy serializes the vectors to JSON
+                self.graph_store.insert_many(
+                    docs,
+                    vectors=np.asarray(vectors, dtype=np.float32).tolist()
+                )
+            except self.InsertManyException:
+                # Some documents were already inserted
+                pass
+        call_with_backoff(insert_many)
 
-        self.cache_model.add_bulk_cache([{
-            'id': docs[i]['_id'],
-            'embedding': vectors[i]}
-            for i in range(len(docs))])
+        if self.cache_on:
+            self.cache_model.add_bulk_cache([{
+                'id': docs[i]['_id'],
+                'embedding': vectors[i]}
+                for i in range(len(docs))])
 
         return True
 
@@ -241,11 +266,10 @@ class AstraDBConnect:
         Caches the text and its embedding in the SQLite database.
 
         Parameters:
-        - text (str): The text string.
-        - embedding (List[float]): The embedding vector for the text.
+        - id (str): The document ID.
+        - embedding (np.ndarray): The embedding vector for the text.
         """
         if self.cache_on:
-            embedding = embedding.tolist()
             self.cache_model.add_cache(id=id, embedding=embedding)
 
     def _get_cached_embedding(self, id):
@@ -256,12 +280,26 @@ class AstraDBConnect:
         - text (str): The text string.
 
         Returns:
-        - List[float] or None: The embedding if found in cache, otherwise None.
+        - np.ndarray or None: The embedding if found in cache, otherwise None.
         """
         if self.cache_on:
             return self.cache_model.get_cache(id=id)
         return None
 
+    def _get_cached_embeddings(self, ids):
+        """
+        Retrieves the cached embeddings of many documents with one query.
+
+        Parameters:
+        - ids (list[str]): The document IDs.
+
+        Returns:
+        - dict: A mapping of {id: np.ndarray} for the cached documents.
+        """
+        if self.cache_on and len(ids) > 0:
+            return self.cache_model.get_bulk_cache(ids)
+        return {}
+
 class KeywordSearchConnect:
     def __init__(self, url, index_name = 'wikidata'):
         """
@@ -0,0 +1,181 @@
+"""
+SQLite store of textified entities, so that the text chunks of an entity are
+only computed once across runs, collections, reranking and embedding models.
+
+The chunks of an entity are stored per (ID, language, language format file,
+textifier version, chunker) with the hash of the entity content they were
+computed from. A lookup is a hit only if the hash still matches, and storing
+new chunks replaces the outdated ones. The chunker identifies how the text
+was split (e.g. the tokenizer name and the maximum number of tokens), or
+'text' for the full text of WikidataTextifier.entity_to_text.
+
+The labels of the linked entities are not part of the hash: use a separate
+store per dump, or increase TEXTIFIER_VERSION when they change.
+"""
+
+from sqlalchemy import Column, Text, text, bindparam
+from sqlalchemy.ext.declarative import declarative_base
+from src.sqliteEngine import create_sqlite_engine
+
+import os
+import json
+import hashlib
+
+
+def content_hash(*values):
+    """
+    Hashes the content of an entity, e.g. its ID, label, description, and the encoded aliases and claims as stored in the database.
+
+    Parameters:
+    - values (str, bytes or None): The values to hash, in a fixed order.
+
+    Returns:
+    - str: The MD5 hex digest.
+    """
+    md5 = hashlib.md5()
+    for value in values:
+        if value is None:
+            md5.update(b'\x00')
+            continue
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        md5.update(len(value).to_bytes(8, 'little'))
+        md5.update(value)
+    return md5.hexdigest()
+
+def create_text_cache_db(
+        db_filname="wikidata_text_cache.db",
+        table_name="entity_chunks",
+        profile=None
+    ):
+    """Factory function to create a dynamic TextCache model. The profile ('bulk_load' or 'read_serving') sets the SQLite PRAGMAs, see src.sqliteEngine."""
+
+    data_dir = os.path.abspath("../data/Wikidata")
+    sqldb_path = os.path.join(data_dir, db_filname)
+
+    # Safe directory creation if it's missing
+    os.makedirs(data_dir, exist_ok=True)
+
+    engine = create_sqlite_engine(sqldb_path, profile=profile)
+    Base = declarative_base()
+
+    class TextCache(Base):
+        """Represents the text chunks of an entity for one language, language format, textifier version and chunker."""
+
+        __tablename__ = table_name
+        __table_args__ = {'sqlite_with_rowid': False}
+
+        language = Column(Text, primary_key=True)
+        langvar = Column(Text, primary_key=True)
+        version = Column(Text, primary_key=True)
+        chunker = Column(Text, primary_key=True)
+        id = Column(Text, primary_key=True)
+        content_hash = Column(Text)
+        chunks = Column(Text)
+        md5s = Column(Text)
+
+        @staticmethod
+        def get_engine():
+            """
+            Get the SQLAlchemy engine of the database.
+
+            Returns:
+            - Engine: The SQLAlchemy engine.
+            """
+            return engine
+
+        @staticmethod
+        def get_chunks_bulk(entries, language, langvar, version, chunker='text'):
+            """
+            Retrieve the stored chunks of many entities with one query.
+
+            Parameters:
+            - entries (list[tuple[str, str]]): (entity ID, content hash) pairs.
+            - language (str): The language of the textifier.
+            - langvar (str): The language format file of the textifier (src/language_variables).
+            - version (str): The textifier version (src.wikidataEmbed.TEXTIFIER_VERSION).
+            - chunker (str): How the text was split, 'text' for the full text (default='text').
+
+            Returns:
+            - dict: A mapping of {entity_id: (chunks, md5s)} for the entities stored with the same content hash. Missing or outdated entities are left out.
+            """
+            hashes = dict(entries)
+            ids = list(hashes)
+            query = text(
+                f"""
+                SELECT id, content_hash, chunks, md5s FROM {table_name}
+                WHERE language = :language AND langvar = :langvar
+                AND version = :version AND chunker = :chunker
+                AND id IN :ids
+                """
+            ).bindparams(bindparam('ids', expanding=True))
+
+            found = {}
+            with engine.connect() as connection:
+                # SQLite limits the number of variables of a query (32766)
+                for i in range(0, len(ids), 30000):
+                    rows = connection.execute(query, {
+                        'language': language,
+                        'langvar': langvar,
+                        'version': str(version),
+                        'chunker': chunker,
+                        'ids': ids[i:i + 30000],
+                    })
+                    for id, stored_hash, chunks, md5s in rows:
+                        if stored_hash == hashes[id]:
+                            found[id] = (json.loads(chunks), json.loads(md5s))
+            return found
+
+        @staticmethod
+        def add_chunks_bulk(entries, language, langvar, version, chunker='text'):
+            """
+            Store the chunks of many entities, replacing the chunks stored for the same key.
+
+            Parameters:
+            - entries (list[tuple[str, str, list[str]]]): (entity ID, content hash, chunks) tuples.
+            - language (str): The language of the textifier.
+            - langvar (str): The language format file of the textifier.
+            - version (str): The textifier version.
+            - chunker (str): How the text was split, 'text' for the full text (default='text').
+
+            Returns:
+            - dict: A mapping of {entity_id: md5s}, the MD5 of each chunk. Returned even if the chunks could not be stored.
+            """
+            md5s = {}
+            rows = []
+            for id, entity_hash, chunks in entries:
+                md5s[id] = [
+                    hashlib.md5(chunk.encode('utf-8')).hexdigest()
+                    for chunk in chunks
+                ]
+                rows.append({
+                    'language': language,
+                    'langvar': langvar,
+                    'version': str(version),
+                    'chunker': chunker,
+                    'id': id,
+                    'content_hash': entity_hash,
+                    'chunks': json.dumps(chunks, ensure_ascii=False),
+                    'md5s': json.dumps(md5s[id]),
+                })
+
+            if len(rows) == 0:
+                return md5s
+
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(
+                        f"""
+                        INSERT OR REPLACE INTO {table_name}
+                        (language, langvar, version, chunker, id, content_hash, chunks, md5s)
+                        VALUES (:language, :langvar, :version, :chunker, :id, :content_hash, :chunks, :md5s)
+                        """
+                    ), rows)
+            except Exception as e:
+                # The store is only a cache, the chunks are recomputed next time
+                print(e)
+            return md5s
+
+    Base.metadata.create_all(engine)
+
+    return TextCache